@@ -5,45 +5,49 @@ Sends a message to Slack if there are any issues detected.
 """
 import sys
 import getopt
+import signal
 import logging
+import threading
 
 from raven import Client
 from monitor.monitor_manager import MonitorManager
 
 from monitor.parse_yaml import get_yaml_config
+from monitor.logs import configure as configure_logging
 
 
-logging.basicConfig(filename='infrastructure-monitor.log',
-                    level=logging.INFO,
-                    format='%(asctime)s.%(msecs)d %(levelname)s %(module)s - '
-                           '%(funcName)s: %(message)s',
-                    datefmt="%Y-%m-%d %H:%M:%S")
+LOG_FILE = 'infrastructure-monitor.log'
 
 
 def main(argv=None):
-    logging.info("Started program.")
-
     try:
-        opts, args = getopt.getopt(argv, "hc:s:e:",
+        opts, args = getopt.getopt(argv, "hc:s:e:dj",
                                    ["configfile=", "slack-configfile=",
-                                    "error-sentry-configfile="])
+                                    "error-sentry-configfile=", "daemon",
+                                    "json-log"])
     except getopt.GetoptError as e:
+        configure_logging(LOG_FILE)
         print('main.py -c <configfile> -s <slack-configfile> '
-              '-e <error-sentry_configfile')
+              '-e <error-sentry_configfile [-d] [-j]')
 
         logging.error(u"Invalid parameters passed in: ".format(
             error=unicode(e.message)))
         sys.exit(2)
 
+    configure_logging(LOG_FILE, json_lines=any(
+        opt in ("-j", "--json-log") for opt, arg in opts))
+    logging.info("Started program.")
+
     try:
         config = "config.yaml"
         slack_config = "slack_config.yaml"
         sentry_config = "sentry_config.yaml"
+        daemon = False
 
         for opt, arg in opts:
             if opt == '-h':
                 print('main.py -c <configfile> -s <slack-configfile> '
-                      '-e <error-sentry_configfile')
+                      '-e <error-sentry_configfile [-d] [-j]')
                 sys.exit()
             elif opt in ("-c", "--config"):
                 config = arg
@@ -51,6 +55,8 @@ def main(argv=None):
                 slack_config = arg
             elif opt in ("-e", "--error-sentry-configfile"):
                 sentry_config = arg
+            elif opt in ("-d", "--daemon"):
+                daemon = True
 
         sentry_config_data = get_yaml_config(sentry_config)
 
@@ -72,13 +78,18 @@ def main(argv=None):
         manager.parse_config()
         logging.debug("Config parsed.")
 
-        logging.debug("Checking sites.")
-        manager.check_sites()
-        logging.debug("Sites checked.")
+        if daemon:
+            run_daemon(manager)
+        else:
+            logging.debug("Checking sites.")
+            manager.check_sites()
+            logging.debug("Sites checked.")
+
+            logging.debug("Checking domains.")
+            manager.check_domains()
+            logging.debug("Domains checked.")
 
-        logging.debug("Checking domains.")
-        manager.check_domains()
-        logging.debug("Domains checked.")
+        manager.close()
 
         logging.info("Finished program.")
     except KeyboardInterrupt as e:
@@ -92,5 +103,23 @@ def main(argv=None):
 
         sys.exit(e.message)
 
+
+def run_daemon(manager):
+    """Checks sites and domains on their intervals until SIGTERM or SIGINT.
+    """
+    stop = threading.Event()
+
+    def shutdown(signum, frame):
+        logging.info(u"Received signal {signum}, shutting down.".format(
+            signum=signum))
+        stop.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    logging.info("Running as a daemon.")
+    manager.run(stop)
+    logging.info("Daemon stopped.")
+
 if __name__ == '__main__':
     main(sys.argv[1:])
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+"""Tracks whether each site and domain is up or down between checks.
+
+Slack is only told when a target changes state (up to down, or down to up),
+plus an optional reminder every so often while it stays down. The state is
+kept in memory, and can also be saved to a small JSON file so that one-off
+runs from cron remember it between runs.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from monitor_domain import MonitorDomain
+
+
+class AlertState(object):
+    def __init__(self, path=None, remind_after=None, clock=time.time):
+        """`remind_after` is the number of seconds between reminders about a
+        target which is still down, or None for no reminders.
+        """
+        self.path = path
+        self.remind_after = remind_after
+        self.clock = clock
+
+        self.states = {}
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+
+        if path is not None:
+            self.load()
+
+    @staticmethod
+    def key(target):
+        """Identifies a target by what is checked as well as its url, so the
+        same url listed twice with different expectations is tracked twice.
+        """
+        if isinstance(target, MonitorDomain):
+            return u"domain:{url}:{record_type}".format(
+                url=target.url, record_type=target.record_type)
+
+        return u"site:{url}:{status_code}".format(
+            url=target.url, status_code=target.expected_status_code)
+
+    def is_down(self, target):
+        """Whether the target has been reported down and not recovered."""
+        with self._lock:
+            state = self.states.get(self.key(target))
+
+        return state is not None and not state['up']
+
+    def update(self, result):
+        """Records a check result, returning the message Slack should be sent
+        or None if it has already been told.
+        """
+        key = self.key(result.target)
+        now = self.clock()
+
+        with self._lock:
+            state = self.states.get(key)
+            was_down = state is not None and not state['up']
+
+            if result.ok:
+                self.states[key] = {'up': True, 'since': now,
+                                    'status': result.error_type,
+                                    'status_code': self._status_code(result)}
+
+                if was_down:
+                    return self.recovery_message(result.target, state, now)
+
+                return None
+
+            if not was_down:
+                self.states[key] = {'up': False, 'since': now,
+                                    'last_alert': now,
+                                    'status': result.error_type,
+                                    'status_code': self._status_code(result)}
+                return result.message
+
+            state['status'] = result.error_type
+            state['status_code'] = self._status_code(result)
+
+            if (self.remind_after is not None and
+                    now - state['last_alert'] >= self.remind_after):
+                state['last_alert'] = now
+                return u"Still failing after {minutes} minutes: {message}"\
+                    .format(minutes=int((now - state['since']) // 60),
+                            message=result.message)
+
+            return None
+
+    def recovery_message(self, target, state, now):
+        return u"Recovered at {url} after {minutes} minutes.".format(
+            url=target.url, minutes=int((now - state['since']) // 60))
+
+    def _status_code(self, result):
+        return getattr(result.target, 'status_code', None)
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as state_file:
+                self.states = json.load(state_file)
+        except IOError:
+            self.states = {}
+        except ValueError:
+            self.logger.error(u"Ignoring the unreadable alert state file "
+                              u"{path}.".format(path=self.path))
+            self.states = {}
+
+    def save(self):
+        """Writes the state file, replacing it in one step so a crash never
+        leaves it half written.
+        """
+        if self.path is None:
+            return
+
+        with self._lock:
+            data = json.dumps(self.states)
+
+        temp_path = u"{path}.tmp".format(path=self.path)
+
+        with open(temp_path, 'w') as state_file:
+            state_file.write(data)
+
+        os.rename(temp_path, self.path)
@@ -0,0 +1,454 @@
+#!/usr/bin/env python
+"""Measures how sweeps of sites and domains scale.
+
+Starts a fleet of stand-in servers on the loopback interface (HTTP servers
+with a configurable latency, error rate and share of redirects, a DNS
+responder and a Slack API endpoint), then sweeps 10, 1,000 and 10,000
+sites and as many domains against them. Prints one JSON line per size with
+the sweep times, checks per second, peak RSS and how fast the alerts were
+posted, so runs can be compared to catch regressions:
+
+    python -m monitor.benchmark -o results.jsonl
+    python -m monitor.benchmark -b results.jsonl
+
+The fleet runs in its own process, and each size is swept in a fresh one,
+so the servers don't compete with the checks for the GIL and the peak RSS
+is that of the manager alone.
+"""
+import BaseHTTPServer
+import SocketServer
+import getopt
+import json
+import logging
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import dns.message
+import dns.rcode
+import dns.rrset
+import requests
+import slacker
+
+from monitor.monitor_manager import MonitorManager
+
+
+DEFAULT_SIZES = (10, 1000, 10000)
+DEFAULT_HOSTS = 16
+DEFAULT_LATENCY = 0.01
+DEFAULT_ERROR_RATE = 0.01
+DEFAULT_REDIRECT_RATE = 0.1
+DEFAULT_WORKERS = 50
+DEFAULT_TOLERANCE = 0.2
+
+DOMAIN_SUFFIX = 'bench.test'
+DNS_ANSWER = '127.0.0.1'
+
+USAGE = ('python -m monitor.benchmark [-n <sizes>] [-H <hosts>] '
+         '[-l <latency>] [-e <error rate>] [-r <redirect rate>] '
+         '[-w <workers>] [-o <output>] [-b <baseline>] [-t <tolerance>]')
+
+
+def chosen(index, rate, salt):
+    """Whether the target with this index is one of the `rate` share picked
+    for a behaviour, the same way on every run.
+    """
+    return random.Random('{0}:{1}'.format(salt, index)).random() < rate
+
+
+class FleetServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, handler, settings):
+        BaseHTTPServer.HTTPServer.__init__(self, address, handler)
+        self.settings = settings
+        self.posted = []
+        self.lock = threading.Lock()
+
+
+class SiteHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Answers /site/<n> after the latency, failing or redirecting the
+    chosen sites.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        settings = self.server.settings
+        parts = self.path.strip('/').split('/')
+        time.sleep(settings['latency'])
+
+        try:
+            index = int(parts[1])
+        except (IndexError, ValueError):
+            return self.respond(404)
+
+        if len(parts) == 2 and chosen(index, settings['redirect_rate'],
+                                      'redirect'):
+            return self.respond(301, Location=self.path + '/final')
+
+        if chosen(index, settings['error_rate'], 'error'):
+            return self.respond(500)
+
+        self.respond(200)
+
+    def respond(self, status_code, **headers):
+        body = 'OK' if status_code == 200 else ''
+        self.send_response(status_code)
+
+        for name, value in headers.items():
+            self.send_header(name, value)
+
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SlackHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Accepts chat.postMessage calls, remembering when each arrived."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+        with self.server.lock:
+            self.server.posted.append(time.time())
+
+        self.respond('{"ok": true}')
+
+    def do_GET(self):
+        with self.server.lock:
+            self.respond(json.dumps(self.server.posted))
+
+    def respond(self, body):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class DNSHandler(SocketServer.BaseRequestHandler):
+    """Answers A queries for d<n>.bench.test with 127.0.0.1, or NXDOMAIN
+    for the chosen domains.
+    """
+    def handle(self):
+        data, sock = self.request
+        query = dns.message.from_wire(data)
+        response = dns.message.make_response(query)
+        question = query.question[0]
+
+        try:
+            index = int(question.name.labels[0][1:])
+        except (IndexError, ValueError):
+            index = None
+
+        if index is None or chosen(index, self.server.settings['error_rate'],
+                                   'error'):
+            response.set_rcode(dns.rcode.NXDOMAIN)
+        else:
+            response.answer.append(dns.rrset.from_text(
+                question.name, 0, 'IN', 'A', DNS_ANSWER))
+
+        sock.sendto(response.to_wire(), self.client_address)
+
+
+class DNSServer(SocketServer.ThreadingUDPServer):
+    daemon_threads = True
+
+    def __init__(self, address, settings):
+        SocketServer.ThreadingUDPServer.__init__(self, address, DNSHandler)
+        self.settings = settings
+
+
+def serve_fleet(settings):
+    """Starts the stand-in servers and returns them with their addresses."""
+    servers = [FleetServer(('127.0.0.{0}'.format(host + 1), 0), SiteHandler,
+                           settings) for host in range(settings['hosts'])]
+    slack = FleetServer(('127.0.0.1', 0), SlackHandler, settings)
+    dns_server = DNSServer(('127.0.0.1', 0), settings)
+
+    for server in servers + [slack, dns_server]:
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    fleet = {
+        'hosts': ['{0}:{1}'.format(*server.server_address)
+                  for server in servers],
+        'slack': slack.server_address[1],
+        'dns': dns_server.server_address[1],
+    }
+
+    return servers + [slack, dns_server], fleet
+
+
+def write_config(directory, fleet, size, workers):
+    hosts = fleet['hosts']
+    config = os.path.join(directory, 'config.yaml')
+    slack_config = os.path.join(directory, 'slack_config.yaml')
+
+    with open(config, 'w') as config_file:
+        config_file.write(
+            "---\n"
+            "workers: {workers}\n"
+            "dns_workers: {workers}\n"
+            "dns_nameservers: [127.0.0.1]\n"
+            "dns_timeout: 2\n"
+            "sites:\n".format(workers=workers))
+
+        for index in range(size):
+            config_file.write("- url: http://{host}/site/{index}\n".format(
+                host=hosts[index % len(hosts)], index=index))
+
+        config_file.write("domains:\n")
+
+        for index in range(size):
+            config_file.write(
+                "- domain: d{index}.{suffix}\n"
+                "  value: {answer}\n".format(
+                    index=index, suffix=DOMAIN_SUFFIX, answer=DNS_ANSWER))
+
+    with open(slack_config, 'w') as config_file:
+        config_file.write(
+            "---\n"
+            "slack_api_token: ''\n"
+            "slack_channel: '#bench'\n"
+            "slack_emote: ''\n"
+            "slack_shoutout: ''\n"
+            "slack_username: bench\n")
+
+    return config, slack_config
+
+
+def sweep(fleet, size, workers):
+    """Sweeps `size` sites and domains against the fleet and returns what
+    was measured.
+
+    The alerts of each sweep are posted in a burst once it finishes, so the
+    alert throughput is measured from the first post of a burst to the last.
+    """
+    slack_url = 'http://127.0.0.1:{0}/api/'.format(fleet['slack'])
+    slacker.API_BASE_URL = slack_url + '{api}'
+    directory = tempfile.mkdtemp()
+    bursts = []
+
+    def timed(check):
+        posted = len(requests.get(slack_url).json())
+        start = time.time()
+        errors = check()
+        seconds = time.time() - start
+        manager.outbox.wait()
+        bursts.append(requests.get(slack_url).json()[posted:])
+
+        return errors, seconds
+
+    try:
+        config, slack_config = write_config(directory, fleet, size, workers)
+        start = time.time()
+        manager = MonitorManager(config_file=config,
+                                 slack_config_file=slack_config)
+        manager.parse_config()
+        manager.resolver.port = fleet['dns']
+        config_seconds = time.time() - start
+
+        site_errors, site_seconds = timed(manager.check_sites)
+        domain_errors, domain_seconds = timed(manager.check_domains)
+        manager.close()
+    finally:
+        shutil.rmtree(directory)
+
+    alerts = sum(len(burst) for burst in bursts)
+    alert_seconds = sum(max(burst) - min(burst) for burst in bursts if burst)
+
+    return {
+        'targets': size,
+        'workers': workers,
+        'config_seconds': round(config_seconds, 4),
+        'site_sweep_seconds': round(site_seconds, 4),
+        'domain_sweep_seconds': round(domain_seconds, 4),
+        'checks_per_second': round(size * 2 / (site_seconds +
+                                               domain_seconds), 1),
+        'site_errors': site_errors,
+        'domain_errors': domain_errors,
+        'alerts': alerts,
+        'alerts_dropped': manager.outbox.dropped,
+        'alerts_per_second': round((alerts - len(bursts)) / alert_seconds, 1)
+        if alert_seconds else None,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Returns a line for each result which is slower or bigger than the
+    baseline result of the same size by more than the tolerance.
+    """
+    baseline = dict((result['targets'], result) for result in baseline)
+    found = []
+
+    for result in results:
+        before = baseline.get(result['targets'])
+
+        if before is None:
+            continue
+
+        if result['checks_per_second'] < \
+                before['checks_per_second'] * (1 - tolerance):
+            found.append(u"{targets} targets: {now} checks/s, was "
+                         u"{before}".format(
+                             targets=result['targets'],
+                             now=result['checks_per_second'],
+                             before=before['checks_per_second']))
+
+        if result['peak_rss_kb'] > before['peak_rss_kb'] * (1 + tolerance):
+            found.append(u"{targets} targets: peak RSS {now} KB, was "
+                         u"{before} KB".format(
+                             targets=result['targets'],
+                             now=result['peak_rss_kb'],
+                             before=before['peak_rss_kb']))
+
+    return found
+
+
+def child(options):
+    """Runs this module again in a new process with the given options and
+    returns the process.
+    """
+    return subprocess.Popen(
+        [sys.executable, '-m', 'monitor.benchmark'] + options,
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run(sizes=DEFAULT_SIZES, settings=None, workers=DEFAULT_WORKERS):
+    """Starts the fleet and sweeps each size in its own process, returning
+    the results.
+    """
+    settings = dict(settings or {})
+    fleet_process = child(['--fleet', json.dumps(settings)])
+
+    try:
+        fleet = json.loads(fleet_process.stdout.readline())
+        results = []
+
+        for size in sizes:
+            process = child(['--sweep', json.dumps(fleet), '-n', str(size),
+                             '-w', str(workers)])
+            output = process.communicate()[0]
+
+            if process.returncode:
+                raise RuntimeError(u"The sweep of {size} targets failed."
+                                   .format(size=size))
+
+            result = json.loads(output)
+            result.update(settings)
+            results.append(result)
+    finally:
+        fleet_process.stdin.close()
+        fleet_process.wait()
+
+    return results
+
+
+def main(argv=None):
+    try:
+        opts, args = getopt.getopt(
+            argv, "hn:H:l:e:r:w:o:b:t:",
+            ["sizes=", "hosts=", "latency=", "error-rate=", "redirect-rate=",
+             "workers=", "output=", "baseline=", "tolerance=", "fleet=",
+             "sweep="])
+    except getopt.GetoptError:
+        print(USAGE)
+        sys.exit(2)
+
+    sizes = DEFAULT_SIZES
+    workers = DEFAULT_WORKERS
+    settings = {
+        'hosts': DEFAULT_HOSTS,
+        'latency': DEFAULT_LATENCY,
+        'error_rate': DEFAULT_ERROR_RATE,
+        'redirect_rate': DEFAULT_REDIRECT_RATE,
+    }
+    output = baseline = fleet = None
+    tolerance = DEFAULT_TOLERANCE
+
+    for opt, arg in opts:
+        if opt == '-h':
+            print(USAGE)
+            sys.exit()
+        elif opt in ("-n", "--sizes"):
+            sizes = [int(size) for size in arg.split(',')]
+        elif opt in ("-H", "--hosts"):
+            settings['hosts'] = int(arg)
+        elif opt in ("-l", "--latency"):
+            settings['latency'] = float(arg)
+        elif opt in ("-e", "--error-rate"):
+            settings['error_rate'] = float(arg)
+        elif opt in ("-r", "--redirect-rate"):
+            settings['redirect_rate'] = float(arg)
+        elif opt in ("-w", "--workers"):
+            workers = int(arg)
+        elif opt in ("-o", "--output"):
+            output = arg
+        elif opt in ("-b", "--baseline"):
+            baseline = arg
+        elif opt in ("-t", "--tolerance"):
+            tolerance = float(arg)
+        elif opt == "--fleet":
+            # Serves until the parent closes our stdin.
+            settings = json.loads(arg)
+            fleet = serve_fleet(settings)[1]
+            print(json.dumps(fleet))
+            sys.stdout.flush()
+            sys.stdin.read()
+            return
+        elif opt == "--sweep":
+            fleet = json.loads(arg)
+
+    if fleet is not None:
+        logging.basicConfig(level=logging.CRITICAL)
+        print(json.dumps(sweep(fleet, sizes[0], workers)))
+        return
+
+    results = run(sizes, settings, workers)
+    lines = [json.dumps(result, sort_keys=True) for result in results]
+
+    if output:
+        with open(output, 'w') as output_file:
+            output_file.write('\n'.join(lines) + '\n')
+    else:
+        print('\n'.join(lines))
+
+    for result in results:
+        sys.stderr.write(
+            u"{targets} targets: sites {site_sweep_seconds}s, domains "
+            u"{domain_sweep_seconds}s, {checks_per_second} checks/s, "
+            u"{alerts} alerts at {alerts_per_second}/s, peak RSS "
+            u"{peak_rss_kb} KB\n".format(**result))
+
+    if baseline:
+        with open(baseline) as baseline_file:
+            found = regressions(results, [json.loads(line)
+                                          for line in baseline_file
+                                          if line.strip()], tolerance)
+
+        for line in found:
+            sys.stderr.write(u"Regression: {0}\n".format(line))
+
+        if found:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+"""Checks the body of a site's response as it is streamed in.
+
+The body is read in chunks and never held in memory all at once. Only the
+end of the previous chunk is kept, so that text split across two chunks is
+still found, and nothing past `max_bytes` is read.
+"""
+import hashlib
+import re
+
+
+DEFAULT_MAX_BYTES = 1024 * 1024
+CHUNK_SIZE = 16 * 1024
+
+# A regular expression must match within this many bytes of the body.
+MATCH_WINDOW = 64 * 1024
+
+
+def as_list(value):
+    if value is None:
+        return []
+
+    if isinstance(value, basestring):
+        return [value]
+
+    return list(value)
+
+
+def encode(text):
+    if isinstance(text, unicode):
+        return text.encode('utf-8')
+
+    return str(text)
+
+
+class BodyCheck(object):
+    """What a site's body must (`contains`, `matches`) or must not
+    (`lacks`) contain, and the checksum it must have, as `algorithm:digest`
+    or a bare sha256 digest.
+    """
+    def __init__(self, contains=None, lacks=None, matches=None,
+                 checksum=None, max_bytes=None):
+        self.contains = [encode(text) for text in as_list(contains)]
+        self.lacks = [encode(text) for text in as_list(lacks)]
+
+        try:
+            self.max_bytes = int(max_bytes or DEFAULT_MAX_BYTES)
+        except (TypeError, ValueError):
+            self.max_bytes = 0
+
+        if self.max_bytes <= 0:
+            raise ValueError(
+                u"ValueError: Check the body_max_bytes field in your "
+                u"config.yaml, it must be a positive number of bytes!")
+
+        self.matches = None
+
+        if matches is not None:
+            try:
+                self.matches = re.compile(encode(matches))
+            except re.error as e:
+                raise ValueError(
+                    u"ValueError: Check the body_matches field in your "
+                    u"config.yaml, it is not a valid regular expression: "
+                    u"{error}!".format(error=unicode(e)))
+
+        self.checksum = None
+        self.algorithm = None
+
+        if checksum is not None:
+            algorithm, _, digest = str(checksum).rpartition(':')
+            self.algorithm = (algorithm or 'sha256').lower()
+            self.checksum = digest.lower()
+
+            if self.algorithm not in hashlib.algorithms:
+                raise ValueError(
+                    u"ValueError: Check the body_checksum field in your "
+                    u"config.yaml, it must be one of {algorithms}!".format(
+                        algorithms=u", ".join(hashlib.algorithms)))
+
+    def check(self, chunks):
+        """Reads the body from `chunks`, returning a message saying what is
+        wrong with it, or None if it is as expected. Reading stops as soon as
+        the outcome is known.
+        """
+        missing = list(self.contains)
+        matched = self.matches is None
+        found = []
+        digest = hashlib.new(self.algorithm) if self.checksum else None
+        needs_all = bool(self.lacks) or digest is not None
+
+        longest = max([len(text) for text in self.contains + self.lacks] or
+                      [1])
+        keep = max(longest - 1, MATCH_WINDOW if self.matches else 0)
+
+        tail = ''
+        read = 0
+        truncated = False
+
+        for chunk in chunks:
+            if not chunk:
+                continue
+
+            if read + len(chunk) > self.max_bytes:
+                chunk = chunk[:self.max_bytes - read]
+                truncated = True
+
+            read += len(chunk)
+
+            if digest is not None:
+                digest.update(chunk)
+
+            window = tail + chunk
+            missing = [text for text in missing if text not in window]
+            found.extend(text for text in self.lacks
+                         if text in window and text not in found)
+
+            if not matched:
+                matched = self.matches.search(window) is not None
+
+            if found:
+                break
+
+            if not missing and matched and not needs_all:
+                break
+
+            if truncated:
+                break
+
+            tail = window[-keep:] if keep else ''
+
+        if found:
+            return u"Expected the body not to contain: {text}".format(
+                text=found[0].decode('utf-8', 'replace'))
+
+        if missing:
+            return u"Expected the body to contain: {text}".format(
+                text=missing[0].decode('utf-8', 'replace'))
+
+        if not matched:
+            return u"Expected the body to match: {pattern}".format(
+                pattern=self.matches.pattern.decode('utf-8', 'replace'))
+
+        if digest is not None:
+            if truncated:
+                return (u"Expected body checksum: {expected} | Actual body is "
+                        u"larger than {max_bytes} bytes".format(
+                            expected=self.checksum, max_bytes=self.max_bytes))
+
+            if digest.hexdigest() != self.checksum:
+                return (u"Expected body checksum: {expected} | Actual body "
+                        u"checksum: {actual}".format(
+                            expected=self.checksum,
+                            actual=digest.hexdigest()))
+
+        return None
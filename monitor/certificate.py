@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+"""Inspects the TLS certificates of https sites.
+
+A certificate is looked at with a handshake of its own, separate from the
+pooled connections used to check the sites. The result is remembered per
+host and port for `period` seconds, so any number of sites on the same host
+cost one handshake per period.
+"""
+import socket
+import ssl
+import threading
+import time
+
+from requests import certs
+
+
+DEFAULT_CERT_CACHE = 3600
+DEFAULT_CERT_TIMEOUT = 10.0
+
+
+def issuer_name(issuer):
+    """The most readable part of an issuer as returned by getpeercert()."""
+    fields = dict(field for part in issuer for field in part)
+
+    return (fields.get('commonName') or fields.get('organizationName') or
+            u", ".join(u"{0}={1}".format(*field) for part in issuer
+                       for field in part))
+
+
+class Certificate(object):
+    def __init__(self, host, port, not_after=None, issuer=None,
+                 chain_valid=False, error=None, handshake_time=None):
+        self.host = host
+        self.port = port
+        self.not_after = not_after
+        self.issuer = issuer
+        self.chain_valid = chain_valid
+        self.error = error
+        self.handshake_time = handshake_time
+
+    def days_left(self, now=None):
+        if self.not_after is None:
+            return None
+
+        if now is None:
+            now = time.time()
+
+        return int((self.not_after - now) // 86400)
+
+    def __unicode__(self):
+        return u"(Certificate: {host}:{port}, Issuer: {issuer})".format(
+            host=self.host, port=self.port, issuer=self.issuer)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return self.__unicode__().encode('utf-8')
+
+
+def inspect(host, port, timeout=DEFAULT_CERT_TIMEOUT):
+    """Connects to host:port and verifies its certificate chain and host
+    name, returning what was found. Failures are returned as a Certificate
+    with an `error` rather than raised.
+    """
+    context = ssl.create_default_context(cafile=certs.where())
+
+    try:
+        sock = socket.create_connection((host, port), timeout)
+    except (socket.error, socket.timeout) as e:
+        return Certificate(host, port, error=unicode(e) or u"Timed out.")
+
+    try:
+        start = time.time()
+        tls = context.wrap_socket(sock, server_hostname=host)
+        handshake_time = time.time() - start
+
+        try:
+            peer = tls.getpeercert()
+        finally:
+            tls.close()
+    except (ssl.SSLError, ssl.CertificateError, socket.error) as e:
+        sock.close()
+        return Certificate(host, port, error=unicode(e) or u"Timed out.")
+
+    return Certificate(host, port,
+                       not_after=ssl.cert_time_to_seconds(peer['notAfter']),
+                       issuer=issuer_name(peer.get('issuer', ())),
+                       chain_valid=True, handshake_time=handshake_time)
+
+
+class CertificateCache(object):
+    """Remembers each host and port's certificate for `period` seconds.
+
+    Sites on the same host checked at the same moment wait for one
+    inspection rather than each making their own.
+    """
+    def __init__(self, period=DEFAULT_CERT_CACHE,
+                 timeout=DEFAULT_CERT_TIMEOUT, clock=time.time):
+        self.period = period
+        self.timeout = timeout
+        self.clock = clock
+
+        self.certificates = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, host, port):
+        key = (host, port)
+
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+
+        with lock:
+            cached = self.certificates.get(key)
+
+            if cached is not None and cached[0] > self.clock():
+                return cached[1]
+
+            certificate = inspect(host, port, self.timeout)
+            self.certificates[key] = (self.clock() + self.period, certificate)
+
+            return certificate
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+"""Runs site and domain checks concurrently on a pool of worker threads.
+
+A sweep takes roughly as long as its slowest check rather than the sum of
+every check, as at most `workers` checks are in flight at once.
+"""
+from multiprocessing.pool import ThreadPool
+
+
+DEFAULT_WORKERS = 20
+
+# DNS lookups are cheap enough to run many more of at once than HTTP checks.
+DEFAULT_DNS_WORKERS = 50
+
+
+class CheckPool(object):
+    def __init__(self, workers=DEFAULT_WORKERS):
+        if workers is None:
+            workers = DEFAULT_WORKERS
+
+        self.workers = max(1, int(workers))
+        self._pool = None
+
+    def map(self, check, targets):
+        """Calls `check` on every target and returns the results in the same
+        order as `targets`.
+        """
+        targets = list(targets)
+
+        if self.workers == 1 or len(targets) <= 1:
+            return [check(target) for target in targets]
+
+        return self._get_pool().map(check, targets, chunksize=1)
+
+    def submit(self, check, target, callback):
+        """Calls `check` on the target in the background, then passes its
+        result to `callback`.
+        """
+        self._get_pool().apply_async(check, (target,), callback=callback)
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ThreadPool(self.workers)
+
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""The outcome of checking a single site or domain.
+
+Every target gets a result, whether it passed, failed its expectations or
+raised an error, so one bad target never hides the state of the others.
+"""
+from requests.exceptions import (ConnectionError, InvalidSchema, InvalidURL,
+                                 MissingSchema, RequestException, Timeout)
+from dns.exception import DNSException, Timeout as DNSTimeout
+from dns.resolver import NXDOMAIN, NoAnswer, NoNameservers
+
+
+OK = 'ok'
+UNEXPECTED = 'unexpected'
+INVALID_URL = 'invalid_url'
+CONNECTION_ERROR = 'connection_error'
+TIMEOUT = 'timeout'
+REQUEST_ERROR = 'request_error'
+NXDOMAIN_ERROR = 'nxdomain'
+NO_ANSWER = 'no_answer'
+NO_NAMESERVERS = 'no_nameservers'
+DNS_ERROR = 'dns_error'
+UNKNOWN_ERROR = 'unknown_error'
+
+# Checked in order, so subclasses must come before their parents (e.g.
+#   ConnectTimeout is both a ConnectionError and a Timeout).
+SITE_ERRORS = (
+    (Timeout, TIMEOUT),
+    ((MissingSchema, InvalidSchema, InvalidURL), INVALID_URL),
+    (ConnectionError, CONNECTION_ERROR),
+    (RequestException, REQUEST_ERROR),
+)
+
+DOMAIN_ERRORS = (
+    (NXDOMAIN, NXDOMAIN_ERROR),
+    (DNSTimeout, TIMEOUT),
+    (NoAnswer, NO_ANSWER),
+    (NoNameservers, NO_NAMESERVERS),
+    (DNSException, DNS_ERROR),
+)
+
+
+def classify_error(error, classes):
+    for error_class, error_type in classes:
+        if isinstance(error, error_class):
+            return error_type
+
+    return UNKNOWN_ERROR
+
+
+class CheckResult(object):
+    __slots__ = ('target', 'error_type', 'message')
+
+    def __init__(self, target, error_type=OK, message=None):
+        self.target = target
+        self.error_type = error_type
+        self.message = message
+
+    @property
+    def ok(self):
+        return self.error_type == OK
+
+    def __unicode__(self):
+        return u"(Target: {target}, Result: {error_type})".format(
+            target=self.target.url,
+            error_type=self.error_type)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return self.__unicode__().encode('utf-8')
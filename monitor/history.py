@@ -0,0 +1,391 @@
+#!/usr/bin/env python
+"""Keeps a history of every check in a local SQLite database.
+
+Results are queued by the checks and written in batches by a background
+thread, so the database never holds a check up. As each batch is written it
+is rolled up into per-minute, per-hour and per-day totals for each target
+(how many checks there were, how many passed, and a histogram of their
+latencies), so the uptime of a target over a month is read from a few dozen
+rows rather than every check. The database is in WAL mode so that reports
+can read it while the monitor writes to it.
+
+Raw checks, minute rollups and hour rollups are each deleted once they are
+older than their retention, and the space they took is given back to the
+file system. Day rollups are kept as long as hour ones.
+"""
+import logging
+import sqlite3
+import threading
+import time
+
+from Queue import Queue, Empty, Full
+
+from alert_state import AlertState
+from check_result import OK
+from latency import BUCKET_COUNT, bucket_index, percentile
+
+
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+RESOLUTIONS = (MINUTE, HOUR, DAY)
+
+DEFAULT_RAW_DAYS = 2
+DEFAULT_MINUTE_DAYS = 14
+DEFAULT_HOUR_DAYS = 400
+
+# The most results written in one transaction.
+BATCH_SIZE = 1000
+DEFAULT_QUEUE_SIZE = 100000
+COMPACT_INTERVAL = HOUR
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS targets ("
+    " id INTEGER PRIMARY KEY,"
+    " key TEXT NOT NULL UNIQUE)",
+    "CREATE TABLE IF NOT EXISTS checks ("
+    " time REAL NOT NULL,"
+    " target INTEGER NOT NULL,"
+    " error_type TEXT NOT NULL,"
+    " latency REAL)",
+    "CREATE INDEX IF NOT EXISTS checks_time ON checks (time)",
+    "CREATE TABLE IF NOT EXISTS rollups ("
+    " resolution INTEGER NOT NULL,"
+    " target INTEGER NOT NULL,"
+    " start INTEGER NOT NULL,"
+    " checks INTEGER NOT NULL,"
+    " up INTEGER NOT NULL,"
+    " latency_sum REAL NOT NULL,"
+    " latency_count INTEGER NOT NULL,"
+    " latency_max REAL,"
+    " latencies TEXT NOT NULL,"
+    " PRIMARY KEY (resolution, target, start))",
+    "CREATE INDEX IF NOT EXISTS rollups_start ON rollups (resolution, start)",
+)
+
+
+def connect(path):
+    """Opens the history database, creating it if it doesn't exist."""
+    connection = sqlite3.connect(path, timeout=30)
+
+    # Only takes effect on a new database, and must come before its tables.
+    connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL")
+
+    with connection:
+        for statement in SCHEMA:
+            connection.execute(statement)
+
+    return connection
+
+
+class Rollup(object):
+    """The totals of a target's checks over a period."""
+    __slots__ = ('checks', 'up', 'latency_sum', 'latency_count',
+                 'latency_max', 'latencies')
+
+    def __init__(self, checks=0, up=0, latency_sum=0.0, latency_count=0,
+                 latency_max=None, latencies=None):
+        self.checks = checks
+        self.up = up
+        self.latency_sum = latency_sum
+        self.latency_count = latency_count
+        self.latency_max = latency_max
+        # The number of latencies in each histogram bucket, by index.
+        self.latencies = latencies or {}
+
+    @classmethod
+    def from_row(cls, row):
+        """Reads a rollup stored by `row`, or the sum of several whose
+        columns have been added up and latencies joined with commas.
+        """
+        checks, up, latency_sum, latency_count, latency_max, latencies = row
+        counts = {}
+
+        for pair in latencies.split(','):
+            if pair:
+                index, count = pair.split(':')
+                counts[int(index)] = counts.get(int(index), 0) + int(count)
+
+        return cls(checks, up, latency_sum, latency_count, latency_max,
+                   counts)
+
+    def row(self):
+        return (self.checks, self.up, self.latency_sum, self.latency_count,
+                self.latency_max,
+                ','.join('{0}:{1}'.format(index, count) for index, count in
+                         sorted(self.latencies.items())))
+
+    def add(self, ok, latency):
+        self.checks += 1
+        self.up += 1 if ok else 0
+
+        if latency is not None:
+            self.latency_sum += latency
+            self.latency_count += 1
+            self.latency_max = max(self.latency_max, latency)
+            index = bucket_index(latency)
+            self.latencies[index] = self.latencies.get(index, 0) + 1
+
+    def merge(self, other):
+        self.checks += other.checks
+        self.up += other.up
+        self.latency_sum += other.latency_sum
+        self.latency_count += other.latency_count
+        self.latency_max = max(self.latency_max, other.latency_max)
+
+        for index, count in other.latencies.items():
+            self.latencies[index] = self.latencies.get(index, 0) + count
+
+    @property
+    def uptime(self):
+        """The share of checks which passed, or None if there were none."""
+        return float(self.up) / self.checks if self.checks else None
+
+    @property
+    def mean_latency(self):
+        if not self.latency_count:
+            return None
+
+        return self.latency_sum / self.latency_count
+
+    def percentile(self, percent):
+        counts = [0] * BUCKET_COUNT
+
+        for index, count in self.latencies.items():
+            counts[index] = count
+
+        return percentile(counts, percent)
+
+
+def summaries(connection, start, end, key=None):
+    """Returns the rollup of each target's checks from `start` to `end`, by
+    its AlertState key, or of just the target with `key`.
+
+    Whole days are read from the day rollups, the hours either side from
+    the hour rollups and the minutes either side of those from the minute
+    rollups. The window is accurate to the minute while the minute rollups
+    are kept and to the hour after that.
+    """
+    query = ("SELECT targets.key, SUM(checks), SUM(up), SUM(latency_sum), "
+             "SUM(latency_count), MAX(latency_max), "
+             "GROUP_CONCAT(latencies, ',') FROM rollups JOIN targets "
+             "ON targets.id = rollups.target "
+             "WHERE resolution = ? AND start >= ? AND start < ?")
+
+    if key is not None:
+        query += " AND targets.key = ?"
+
+    query += " GROUP BY rollups.target"
+
+    totals = {}
+
+    for resolution, range_start, range_end in split(start, end):
+        parameters = [resolution, int(range_start) // MINUTE * MINUTE,
+                      range_end]
+
+        if key is not None:
+            parameters.append(key)
+
+        for row in connection.execute(query, parameters):
+            rollup = Rollup.from_row(row[1:])
+
+            if row[0] in totals:
+                totals[row[0]].merge(rollup)
+            else:
+                totals[row[0]] = rollup
+
+    return totals
+
+
+def split(start, end, resolutions=(DAY, HOUR, MINUTE)):
+    """Splits a window into the fewest ranges of whole rollups, as
+    (resolution, start, end).
+    """
+    resolution = resolutions[0]
+
+    if start >= end:
+        return []
+
+    if len(resolutions) == 1:
+        return [(resolution, start, end)]
+
+    first = -(-int(start) // resolution) * resolution
+    last = int(end) // resolution * resolution
+
+    if first >= last:
+        return split(start, end, resolutions[1:])
+
+    return (split(start, first, resolutions[1:]) +
+            [(resolution, first, last)] +
+            split(last, end, resolutions[1:]))
+
+
+class History(object):
+    """Writes check results to the history database from a background
+    thread.
+
+    When the queue is full, because the disk can't keep up, results are
+    dropped and counted rather than holding up the checks.
+    """
+    def __init__(self, path, raw_days=DEFAULT_RAW_DAYS,
+                 minute_days=DEFAULT_MINUTE_DAYS, hour_days=DEFAULT_HOUR_DAYS,
+                 max_size=DEFAULT_QUEUE_SIZE, clock=time.time):
+        self.path = path
+        self.retention = {'raw': raw_days * DAY, MINUTE: minute_days * DAY,
+                          HOUR: hour_days * DAY, DAY: hour_days * DAY}
+        self.clock = clock
+
+        self.queue = Queue(max_size)
+        self.dropped = 0
+        self.logger = logging.getLogger(__name__)
+
+        self._stop = object()
+        self._compact = object()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        # Fails here, rather than in the background, if the file can't be
+        #   opened.
+        connect(path).close()
+
+    def record(self, result):
+        """Queues a check result to be written."""
+        timings = getattr(result.target, 'timings', None)
+        latency = timings['total'] if timings else None
+        self._put((self.clock(), AlertState.key(result.target),
+                   result.error_type, latency))
+
+    def compact(self):
+        """Queues the removal of everything older than its retention."""
+        self._put(self._compact)
+
+    def flush(self):
+        """Blocks until every queued result has been written."""
+        if self._thread is not None:
+            self.queue.join()
+
+    def close(self, timeout=None):
+        """Writes the remaining results, then stops the background thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+
+        if thread is not None:
+            self.queue.put(self._stop)
+            thread.join(timeout)
+
+    def _put(self, item):
+        self._start()
+
+        try:
+            self.queue.put_nowait(item)
+        except Full:
+            self.dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._drain,
+                                                name='check-history')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _drain(self):
+        connection = connect(self.path)
+        target_ids = {}
+        next_compact = self.clock() + COMPACT_INTERVAL
+
+        try:
+            while True:
+                # Whatever has queued up while the last batch was written is
+                #   written together.
+                batch = [self.queue.get()]
+
+                while len(batch) < BATCH_SIZE:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except Empty:
+                        break
+
+                try:
+                    self._write(connection, target_ids,
+                                [item for item in batch
+                                 if isinstance(item, tuple)])
+
+                    if self._compact in batch or \
+                            self.clock() >= next_compact:
+                        next_compact = self.clock() + COMPACT_INTERVAL
+                        self._remove_expired(connection)
+                except sqlite3.Error as e:
+                    self.logger.error(u"Failed to write the check history: "
+                                      u"{error}".format(error=unicode(e)))
+                finally:
+                    for _ in batch:
+                        self.queue.task_done()
+
+                if self._stop in batch:
+                    return
+        finally:
+            connection.close()
+
+    def _write(self, connection, target_ids, results):
+        if not results:
+            return
+
+        rollups = {}
+
+        with connection:
+            for key in set(result[1] for result in results):
+                if key not in target_ids:
+                    connection.execute(
+                        "INSERT OR IGNORE INTO targets (key) VALUES (?)",
+                        (key,))
+                    target_ids[key] = connection.execute(
+                        "SELECT id FROM targets WHERE key = ?",
+                        (key,)).fetchone()[0]
+
+            connection.executemany(
+                "INSERT INTO checks VALUES (?, ?, ?, ?)",
+                [(when, target_ids[key], error_type, latency)
+                 for when, key, error_type, latency in results])
+
+            for when, key, error_type, latency in results:
+                for resolution in RESOLUTIONS:
+                    rollup_key = (resolution, target_ids[key],
+                                  int(when) // resolution * resolution)
+
+                    if rollup_key not in rollups:
+                        rollups[rollup_key] = Rollup()
+
+                    rollups[rollup_key].add(error_type == OK, latency)
+
+            for rollup_key, rollup in rollups.items():
+                row = connection.execute(
+                    "SELECT checks, up, latency_sum, latency_count, "
+                    "latency_max, latencies FROM rollups "
+                    "WHERE resolution = ? AND target = ? AND start = ?",
+                    rollup_key).fetchone()
+
+                if row is not None:
+                    rollup.merge(Rollup.from_row(row))
+
+                connection.execute(
+                    "INSERT OR REPLACE INTO rollups "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rollup_key + rollup.row())
+
+    def _remove_expired(self, connection):
+        now = self.clock()
+
+        with connection:
+            connection.execute("DELETE FROM checks WHERE time < ?",
+                               (now - self.retention['raw'],))
+
+            for resolution in RESOLUTIONS:
+                connection.execute(
+                    "DELETE FROM rollups WHERE resolution = ? AND start < ?",
+                    (resolution, now - self.retention[resolution]))
+
+        connection.execute("PRAGMA incremental_vacuum").fetchall()
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""Keeps the checks of sites on the same host from hammering it.
+
+At most `limit` checks of a host run at once, and each starts at least
+`spacing` seconds after the one before it. Hosts listed in the overrides can
+be given their own limit and spacing, e.g. internal services which can take
+more load. Checks of other hosts carry on meanwhile, so one busy host
+doesn't slow the rest down.
+"""
+import itertools
+import threading
+import time
+
+from collections import OrderedDict
+from urlparse import urlparse
+
+
+DEFAULT_HOST_LIMIT = 4
+DEFAULT_HOST_SPACING = 0.0
+
+# How long to wait before asking again about a host with no free slot.
+BUSY_RETRY = 0.1
+
+
+def host_of(url):
+    return (urlparse(url).hostname or url).lower()
+
+
+def interleave(targets):
+    """Returns the indexes of `targets` ordered round robin by host, so that
+    the sites of one host are spread out rather than all started together.
+    """
+    by_host = OrderedDict()
+
+    for index, target in enumerate(targets):
+        by_host.setdefault(host_of(target.url), []).append(index)
+
+    return [index
+            for indexes in itertools.izip_longest(*by_host.values())
+            for index in indexes if index is not None]
+
+
+class HostLimits(object):
+    def __init__(self, limit=DEFAULT_HOST_LIMIT, spacing=DEFAULT_HOST_SPACING,
+                 overrides=None, clock=time.time):
+        self.clock = clock
+
+        self.in_flight = {}
+        self.last_start = {}
+        self._condition = threading.Condition()
+
+        self.configure(limit, spacing, overrides)
+
+    def configure(self, limit=DEFAULT_HOST_LIMIT,
+                  spacing=DEFAULT_HOST_SPACING, overrides=None):
+        """Changes the limits, keeping count of the checks already in
+        flight.
+        """
+        with self._condition:
+            self.limit = limit
+            self.spacing = spacing
+            self.overrides = dict(
+                (host.lower(), settings)
+                for host, settings in (overrides or {}).items())
+
+            self._condition.notify_all()
+
+    def settings(self, host):
+        override = self.overrides.get(host, {})
+
+        return (override.get('limit', self.limit),
+                override.get('spacing', self.spacing))
+
+    def try_acquire(self, host):
+        """Takes a slot for a check of the host if one is free, returning 0,
+        otherwise returns roughly how many seconds to wait before trying
+        again.
+        """
+        limit, spacing = self.settings(host)
+
+        with self._condition:
+            now = self.clock()
+
+            if limit is not None and self.in_flight.get(host, 0) >= limit:
+                return BUSY_RETRY
+
+            waited = now - self.last_start.get(host, now - spacing)
+
+            if waited < spacing:
+                return spacing - waited
+
+            self.in_flight[host] = self.in_flight.get(host, 0) + 1
+            self.last_start[host] = now
+
+            return 0
+
+    def acquire(self, host):
+        """Waits until a check of the host may start, then takes a slot."""
+        while True:
+            wait = self.try_acquire(host)
+
+            if not wait:
+                return
+
+            with self._condition:
+                self._condition.wait(wait)
+
+    def release(self, host):
+        with self._condition:
+            self.in_flight[host] -= 1
+
+            if not self.in_flight[host]:
+                del self.in_flight[host]
+
+            self._condition.notify_all()
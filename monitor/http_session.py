@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""Builds the pooled HTTP session shared by every MonitorSite.
+
+Connections are kept alive between checks and sweeps, so sites on the same
+host only pay for the TCP and TLS handshake once. The time spent connecting
+(including looking the host up) and on the TLS handshake is recorded for the
+thread which made the request.
+"""
+import threading
+import time
+
+from cookielib import DefaultCookiePolicy
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.connection import (HTTPConnection,
+                                                  VerifiedHTTPSConnection)
+from requests.packages.urllib3.connectionpool import (HTTPConnectionPool,
+                                                      HTTPSConnectionPool)
+
+
+DEFAULT_POOL_HOSTS = 100
+DEFAULT_POOL_SIZE = 10
+
+PHASES = ('connect', 'tls')
+
+_local = threading.local()
+
+
+def start_timing():
+    """Starts recording the connection phases of requests made by this
+    thread, returning the dict the times (in seconds) are added to. A request
+    over a kept-alive connection adds nothing.
+    """
+    _local.timings = dict((phase, 0.0) for phase in PHASES)
+
+    return _local.timings
+
+
+def _record(phase, seconds):
+    timings = getattr(_local, 'timings', None)
+
+    if timings is not None:
+        timings[phase] += seconds
+
+
+class TimedConnectionMixin(object):
+    def _new_conn(self):
+        """Opens the socket with urllib3's own code, timing it. This covers
+        looking the host up as well as connecting, as urllib3 does both in
+        one call.
+        """
+        start = time.time()
+
+        try:
+            return super(TimedConnectionMixin, self)._new_conn()
+        finally:
+            self._new_conn_time = time.time() - start
+            _record('connect', self._new_conn_time)
+
+
+class TimedHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnectionMixin, VerifiedHTTPSConnection):
+    def connect(self):
+        self._new_conn_time = 0.0
+        start = time.time()
+
+        try:
+            super(TimedHTTPSConnection, self).connect()
+        finally:
+            _record('tls', time.time() - start - self._new_conn_time)
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super(TimedHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool,
+            'https': TimedHTTPSConnectionPool,
+        }
+
+
+def build_session(pool_hosts=None, pool_size=None):
+    """Returns a session opening at most `pool_size` connections to each of
+    up to `pool_hosts` hosts. Checks beyond that wait for a connection to the
+    host to be free, rather than opening one which would be thrown away.
+    """
+    if pool_hosts is None:
+        pool_hosts = DEFAULT_POOL_HOSTS
+    if pool_size is None:
+        pool_size = DEFAULT_POOL_SIZE
+
+    session = Session()
+
+    # Checks must not depend on cookies set by an earlier check.
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+    for prefix in ('http://', 'https://'):
+        session.mount(prefix, TimedHTTPAdapter(
+            pool_connections=int(pool_hosts), pool_maxsize=int(pool_size),
+            pool_block=True))
+
+    return session
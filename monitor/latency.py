@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""Keeps a rolling histogram of how long a site takes to respond.
+
+Samples are counted into fixed, logarithmically sized buckets rather than
+kept, so a histogram costs the same small amount of memory however long the
+monitor runs: under 1KB, allocated when the first sample is recorded.
+Percentiles are accurate to within one bucket (about 19%), except that
+anything up to 1ms is counted in the first bucket and reported as 1ms.
+"""
+import math
+import time
+
+from array import array
+
+
+# Four buckets per doubling, from 1ms up to 65s. Anything slower lands in
+#   the last bucket.
+BUCKETS_PER_DOUBLING = 4
+MIN_LATENCY = 0.001
+BUCKET_COUNT = 16 * BUCKETS_PER_DOUBLING + 1
+
+DEFAULT_WINDOW = 3600
+DEFAULT_SLOTS = 6
+
+# Counts stop at the most a bucket can hold rather than overflowing, which
+#   would take over 100 checks a second of one site.
+MAX_COUNT = 0xFFFF
+EMPTY_SLOT = array('H', [0] * BUCKET_COUNT)
+
+
+def bucket_index(seconds):
+    if seconds <= MIN_LATENCY:
+        return 0
+
+    index = int(math.ceil(math.log(seconds / MIN_LATENCY, 2) *
+                          BUCKETS_PER_DOUBLING))
+
+    return min(index, BUCKET_COUNT - 1)
+
+
+def bucket_bound(index):
+    """The upper bound, in seconds, of the latencies counted in a bucket."""
+    return MIN_LATENCY * 2 ** (float(index) / BUCKETS_PER_DOUBLING)
+
+
+def percentile(counts, percent):
+    """The latency, in seconds, which `percent` of the samples counted in
+    each bucket were at or below, or None if there are no samples.
+    """
+    total = sum(counts)
+
+    if not total:
+        return None
+
+    rank = max(1, int(math.ceil(total * percent / 100.0)))
+    seen = 0
+
+    for index, count in enumerate(counts):
+        seen += count
+
+        if seen >= rank:
+            return bucket_bound(index)
+
+
+class LatencyHistogram(object):
+    """Counts latencies over the last `window` seconds.
+
+    The window is split into `slots`. As time moves on the oldest slot is
+    emptied and reused, so old samples age out a slot at a time. The slots
+    are kept end to end in one array, with -1 as the epoch of a slot which
+    has never been used.
+    """
+    __slots__ = ('slot_length', 'clock', '_counts', '_epochs')
+
+    def __init__(self, window=DEFAULT_WINDOW, slots=DEFAULT_SLOTS,
+                 clock=time.time):
+        self.slot_length = float(window) / slots
+        self.clock = clock
+
+        self._counts = None
+        self._epochs = array('l', [-1] * slots)
+
+    def record(self, seconds):
+        epoch = int(self.clock() // self.slot_length)
+        slot = epoch % len(self._epochs)
+        start = slot * BUCKET_COUNT
+
+        if self._counts is None:
+            self._counts = array('H', EMPTY_SLOT * len(self._epochs))
+
+        if self._epochs[slot] != epoch:
+            self._counts[start:start + BUCKET_COUNT] = EMPTY_SLOT
+            self._epochs[slot] = epoch
+
+        index = start + bucket_index(seconds)
+
+        if self._counts[index] < MAX_COUNT:
+            self._counts[index] += 1
+
+    def counts(self):
+        """The number of samples in each bucket within the window."""
+        epoch = int(self.clock() // self.slot_length)
+        oldest = epoch - len(self._epochs) + 1
+        totals = [0] * BUCKET_COUNT
+
+        if self._counts is None:
+            return totals
+
+        for slot, slot_epoch in enumerate(self._epochs):
+            if slot_epoch != -1 and slot_epoch >= oldest:
+                start = slot * BUCKET_COUNT
+
+                for index, count in enumerate(
+                        self._counts[start:start + BUCKET_COUNT]):
+                    totals[index] += count
+
+        return totals
+
+    def count(self):
+        return sum(self.counts())
+
+    def percentile(self, percent):
+        """The latency, in seconds, which `percent` of the samples within the
+        window were at or below, or None if there are no samples.
+        """
+        return percentile(self.counts(), percent)
+
+    def percentiles(self, percents=(50, 95, 99)):
+        return dict((percent, self.percentile(percent))
+                    for percent in percents)
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+"""Writes the log from a background thread, as text or as JSON lines.
+
+Records are put on a queue by the thread which logs them and written to the
+file by a listener thread, so a slow disk never holds up a check. When the
+queue is full, because the disk can't keep up, records are dropped and
+counted rather than waited on. The file is flushed once per batch of records
+rather than after every one.
+
+In JSON mode every check result is logged as one object per line, with the
+result under `check`, so it can be read without parsing messages.
+"""
+import atexit
+import json
+import logging
+import threading
+
+from Queue import Queue, Empty, Full
+
+from alert_state import AlertState
+from monitor_domain import MonitorDomain
+
+
+DEFAULT_LOG_QUEUE_SIZE = 10000
+
+# The most records written between flushes.
+BATCH_SIZE = 500
+
+TEXT_FORMAT = ('%(asctime)s.%(msecs)d %(levelname)s %(module)s - '
+               '%(funcName)s: %(message)s')
+TEXT_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Every check result is logged here, passes at INFO and failures at ERROR.
+CHECK_LOGGER = 'monitor.checks'
+
+
+def check_fields(result):
+    """Returns what a check result is logged with under `check`."""
+    target = result.target
+    timings = getattr(target, 'timings', None)
+    fields = {
+        'target': AlertState.key(target),
+        'type': 'domain' if isinstance(target, MonitorDomain) else 'site',
+        'url': target.url,
+        'result': result.error_type,
+        'ok': result.ok,
+        'latency': timings['total'] if timings else None,
+    }
+
+    if fields['type'] == 'site':
+        fields['status_code'] = getattr(target, 'status_code', None)
+
+    return fields
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as a single line of JSON."""
+    def format(self, record):
+        entry = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+
+        check = getattr(record, 'check', None)
+
+        if check is not None:
+            entry['check'] = check
+
+        return json.dumps(entry, sort_keys=True)
+
+
+class BatchFileHandler(logging.FileHandler):
+    """A file handler which leaves flushing to the QueueListener, which
+    flushes once per batch of records.
+    """
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        logging.FileHandler.flush(self)
+
+
+class QueueHandler(logging.Handler):
+    """Puts records on a queue without ever waiting for room."""
+    def __init__(self, queue):
+        logging.Handler.__init__(self)
+        self.queue = queue
+        self.dropped = 0
+
+    def emit(self, record):
+        try:
+            # The arguments are merged now, in case they change before the
+            #   listener gets to the record.
+            record.msg = record.getMessage()
+            record.args = None
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+
+class QueueListener(object):
+    """Hands the records on a queue to its handlers from a background
+    thread.
+    """
+    def __init__(self, queue, *handlers):
+        self.queue = queue
+        self.handlers = handlers
+        self._stop = object()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._drain,
+                                                name='log-writer')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def stop(self, timeout=None):
+        """Writes the remaining records, then stops the background thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+
+        if thread is not None:
+            self.queue.put(self._stop)
+            thread.join(timeout)
+
+    def _drain(self):
+        while True:
+            batch = [self.queue.get()]
+
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except Empty:
+                    break
+
+            for record in batch:
+                if record is self._stop:
+                    continue
+
+                for handler in self.handlers:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+
+            for handler in self.handlers:
+                getattr(handler, 'flush_batch', handler.flush)()
+
+            if self._stop in batch:
+                return
+
+
+def configure(filename, json_lines=False, level=logging.INFO,
+              max_size=DEFAULT_LOG_QUEUE_SIZE):
+    """Sends the root logger's records through a queue to `filename`,
+    returning the listener which writes them. It is stopped, and the queue
+    written out, when the program exits.
+
+    Passing checks are only logged in JSON mode, to keep the text log to
+    the failures.
+    """
+    handler = BatchFileHandler(filename, encoding='utf-8')
+
+    if json_lines:
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT,
+                                               TEXT_DATE_FORMAT))
+
+    queue_handler = QueueHandler(Queue(max_size))
+    listener = QueueListener(queue_handler.queue, handler)
+
+    root = logging.getLogger()
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    logging.getLogger(CHECK_LOGGER).setLevel(
+        logging.NOTSET if json_lines else logging.WARNING)
+
+    listener.start()
+    atexit.register(stop, listener, queue_handler)
+
+    return listener
+
+
+def stop(listener, queue_handler):
+    logging.getLogger().removeHandler(queue_handler)
+    listener.stop()
+
+    if queue_handler.dropped:
+        # Written directly now that the listener has stopped.
+        record = logging.LogRecord(
+            __name__, logging.WARNING, __file__, 0,
+            u"Dropped {count} log records because the log writer fell "
+            u"behind.".format(count=queue_handler.dropped), None, None)
+
+        for handler in listener.handlers:
+            handler.handle(record)
+            getattr(handler, 'flush_batch', handler.flush)()
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+"""Serves what the monitor knows in the Prometheus text format.
+
+The manager updates the counters as each check result is reported, so a
+scrape only formats numbers which are already there. It never triggers a
+check and takes the same time however often the sites are checked.
+"""
+import logging
+import threading
+import time
+
+from array import array
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+from latency import BUCKET_COUNT, BUCKETS_PER_DOUBLING, bucket_bound, \
+    bucket_index
+from monitor_domain import MonitorDomain
+
+
+DEFAULT_METRICS_HOST = '127.0.0.1'
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Only every doubling is exposed as a histogram bucket, which keeps the
+#   number of series per site down. The last bucket also counts anything
+#   slower, so it is only exposed as +Inf.
+EXPOSED_BUCKETS = frozenset(range(0, BUCKET_COUNT - 1, BUCKETS_PER_DOUBLING))
+
+
+def escape(value):
+    return unicode(value).replace(u'\\', u'\\\\').replace(
+        u'"', u'\\"').replace(u'\n', u'\\n')
+
+
+def labels(**values):
+    return u"{" + u",".join(
+        u'{name}="{value}"'.format(name=name, value=escape(values[name]))
+        for name in sorted(values)) + u"}"
+
+
+def format_value(value):
+    if value is None:
+        return u"NaN"
+
+    return repr(float(value))
+
+
+class Metrics(object):
+    """Counters and gauges kept up to date by the manager.
+
+    Extra gauges whose value is cheap to read when scraped (such as the
+    length of a queue) can be added with `add_gauge`.
+    """
+    def __init__(self, clock=time.time):
+        self.clock = clock
+
+        self.targets = {}
+        self.sweeps = {}
+        self.in_flight = 0
+        self.gauges = []
+
+        self._lock = threading.Lock()
+
+    def add_gauge(self, name, description, read):
+        self.gauges.append((name, description, read))
+
+    def check_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def check_finished(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def record_sweep(self, kind, seconds):
+        with self._lock:
+            self.sweeps[kind] = seconds
+
+    @staticmethod
+    def key(target):
+        if isinstance(target, MonitorDomain):
+            return ('domain', target.url, target.record_type)
+
+        return ('site', target.url, target.expected_status_code)
+
+    def record(self, result):
+        target = result.target
+        key = self.key(target)
+
+        with self._lock:
+            metrics = self.targets.get(key)
+
+            if metrics is None:
+                metrics = self.targets[key] = {
+                    'checks': {},
+                    'buckets': array('L', [0] * BUCKET_COUNT),
+                    'latency_sum': 0.0,
+                }
+
+            metrics['up'] = 1 if result.ok else 0
+            metrics['last_check'] = self.clock()
+            metrics['checks'][result.error_type] = \
+                metrics['checks'].get(result.error_type, 0) + 1
+
+            if key[0] == 'domain':
+                metrics['ttl'] = target.ttl
+                metrics['records'] = len(target.records or ())
+                return
+
+            metrics['status_code'] = target.status_code
+            certificate = getattr(target, 'certificate', None)
+
+            if certificate is not None:
+                metrics['certificate'] = (certificate.days_left(),
+                                          certificate.handshake_time)
+
+            timings = target.timings
+
+            if timings is not None:
+                metrics['buckets'][bucket_index(timings['total'])] += 1
+                metrics['latency_sum'] += timings['total']
+
+    def forget(self, target):
+        """Stops exposing a target which is no longer checked."""
+        with self._lock:
+            self.targets.pop(self.key(target), None)
+
+    def render(self):
+        with self._lock:
+            targets = sorted(self.targets.items())
+            sweeps = sorted(self.sweeps.items())
+            in_flight = self.in_flight
+
+        lines = []
+
+        def metric(name, kind, description, samples):
+            lines.append(u"# HELP {name} {description}".format(
+                name=name, description=description))
+            lines.append(u"# TYPE {name} {kind}".format(name=name, kind=kind))
+
+            for suffix, sample_labels, value in samples:
+                lines.append(u"{name}{suffix}{labels} {value}".format(
+                    name=name, suffix=suffix, labels=sample_labels,
+                    value=format_value(value)))
+
+        def target_labels(key, **extra):
+            kind, url, expected = key
+
+            if kind == 'domain':
+                return labels(url=url, record_type=expected, **extra)
+
+            return labels(url=url, status_code=expected, **extra)
+
+        sites = [(key, metrics) for key, metrics in targets
+                 if key[0] == 'site']
+        domains = [(key, metrics) for key, metrics in targets
+                   if key[0] == 'domain']
+
+        for kind, kind_targets in (('site', sites), ('domain', domains)):
+            metric(u"monitor_{kind}_up".format(kind=kind), u"gauge",
+                   u"1 if the last check of the {kind} passed, otherwise 0."
+                   .format(kind=kind),
+                   [(u"", target_labels(key), metrics['up'])
+                    for key, metrics in kind_targets])
+            metric(u"monitor_{kind}_last_check_timestamp_seconds".format(
+                kind=kind), u"gauge",
+                u"When the {kind} was last checked.".format(kind=kind),
+                [(u"", target_labels(key), metrics['last_check'])
+                 for key, metrics in kind_targets])
+            metric(u"monitor_{kind}_checks_total".format(kind=kind),
+                   u"counter",
+                   u"Checks of the {kind} by result.".format(kind=kind),
+                   [(u"", target_labels(key, result=result), count)
+                    for key, metrics in kind_targets
+                    for result, count in sorted(metrics['checks'].items())])
+
+        metric(u"monitor_site_status_code", u"gauge",
+               u"The status code the site last responded with.",
+               [(u"", target_labels(key), metrics['status_code'])
+                for key, metrics in sites])
+        metric(u"monitor_site_latency_seconds", u"histogram",
+               u"How long the site took to respond.",
+               [sample for key, metrics in sites
+                for sample in self._histogram(key, metrics, target_labels)])
+        certificates = [(key, metrics['certificate']) for key, metrics in sites
+                        if 'certificate' in metrics]
+        metric(u"monitor_site_certificate_expiry_days", u"gauge",
+               u"Days until the site's TLS certificate expires.",
+               [(u"", target_labels(key), days)
+                for key, (days, handshake_time) in certificates])
+        metric(u"monitor_site_certificate_handshake_seconds", u"gauge",
+               u"How long the last inspection's TLS handshake took.",
+               [(u"", target_labels(key), handshake_time)
+                for key, (days, handshake_time) in certificates])
+        metric(u"monitor_domain_ttl_seconds", u"gauge",
+               u"The TTL of the domain's records when last looked up.",
+               [(u"", target_labels(key), metrics['ttl'])
+                for key, metrics in domains])
+        metric(u"monitor_domain_records", u"gauge",
+               u"The number of records the domain last resolved to.",
+               [(u"", target_labels(key), metrics['records'])
+                for key, metrics in domains])
+        metric(u"monitor_sweep_duration_seconds", u"gauge",
+               u"How long the last pass over every site or domain took.",
+               [(u"", labels(kind=kind), seconds)
+                for kind, seconds in sweeps])
+        metric(u"monitor_checks_in_flight", u"gauge",
+               u"The number of checks running right now.",
+               [(u"", u"", in_flight)])
+
+        for name, description, read in self.gauges:
+            metric(name, u"gauge", description, [(u"", u"", read())])
+
+        return u"\n".join(lines) + u"\n"
+
+    def _histogram(self, key, metrics, target_labels):
+        counts = metrics['buckets']
+        seen = 0
+        samples = []
+
+        for index in range(BUCKET_COUNT):
+            seen += counts[index]
+
+            if index in EXPOSED_BUCKETS:
+                samples.append((u"_bucket", target_labels(
+                    key, le=format_value(bucket_bound(index))), seen))
+
+        samples.append((u"_bucket", target_labels(key, le=u"+Inf"), seen))
+        samples.append((u"_sum", target_labels(key), metrics['latency_sum']))
+        samples.append((u"_count", target_labels(key), seen))
+
+        return samples
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+
+        body = self.server.metrics.render().encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.getLogger(__name__).debug(format, *args)
+
+
+class MetricsServer(ThreadingMixIn, HTTPServer):
+    """Serves `metrics` on /metrics from a background thread."""
+    daemon_threads = True
+
+    def __init__(self, metrics, port, host=DEFAULT_METRICS_HOST):
+        HTTPServer.__init__(self, (host, int(port)), MetricsHandler)
+        self.metrics = metrics
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever,
+                                        name='metrics')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+
+        self.server_close()
@@ -1,21 +1,201 @@
 #!/usr/bin/env python
-from dns.resolver import query
+import time
+
+import dns.resolver
+import dns.exception
+import dns.reversename
+from dns.resolver import Resolver
+
+
+RECORD_TYPES = ('A', 'AAAA', 'CNAME', 'MX', 'PTR')
+
+# Record types whose values are host names rather than addresses.
+NAME_TYPES = ('CNAME', 'MX', 'PTR')
+
+
+def build_resolver(nameservers=None, timeout=None, lifetime=None):
+    """Returns a resolver shared by every MonitorDomain, using the system's
+    nameservers unless others are given.
+
+    `timeout` is how long to wait for each nameserver and `lifetime` is how
+    long to spend on a query in total.
+    """
+    resolver = Resolver()
+
+    if nameservers:
+        resolver.nameservers = [unicode(nameserver)
+                                for nameserver in nameservers]
+    if timeout is not None:
+        resolver.timeout = float(timeout)
+    if lifetime is not None:
+        resolver.lifetime = float(lifetime)
+
+    return resolver
+
+
+def query(name, rdtype='A', resolver=None):
+    """Looks up the name with the shared resolver when one is given,
+    otherwise with the default resolver.
+    """
+    if resolver is None:
+        return dns.resolver.query(name, rdtype)
+
+    return resolver.query(name, rdtype)
+
+
+def is_address(name):
+    try:
+        dns.reversename.from_address(name)
+    except dns.exception.SyntaxError:
+        return False
+
+    return True
+
+
+def normalise(record_type, value):
+    """Host names are compared in lower case without the trailing dot."""
+    if value is None:
+        return None
+
+    value = unicode(value)
+
+    if record_type in NAME_TYPES:
+        return value.rstrip(u'.').lower()
+
+    return value
+
+
+def record_text(record_type, rdata):
+    """The value of a record as written in config.yaml. An MX record's value
+    is its mail server.
+    """
+    if record_type == 'MX':
+        return normalise(record_type, rdata.exchange.to_text())
+
+    return normalise(record_type, rdata.to_text())
 
 
 class MonitorDomain(object):
-    def __init__(self, url):
+    """Class for monitoring a domain's DNS records and checking them against
+    the expected records.
+
+    An answer is reused until its TTL runs out, so checking an unchanged
+    domain again within its TTL doesn't query the nameservers at all.
+    """
+    __slots__ = ('url', 'interval', 'resolver', 'clock', 'name',
+                 'record_type', 'value', 'values', 'min_ttl', 'records', 'ttl',
+                 'expires_at', 'error')
+
+    def __init__(self, url, interval=None, resolver=None, record_type=None,
+                 value=None, values=None, min_ttl=None, clock=time.time):
         self.url = url
+        self.interval = interval
+        self.resolver = resolver
+        self.clock = clock
+
+        self.name = self.url
+        self.record_type = record_type
+
+        if is_address(url):
+            # An address can only be looked up in reverse.
+            self.name = dns.reversename.from_address(url)
+            self.record_type = record_type or 'PTR'
+
+        self.record_type = (self.record_type or 'A').upper()
+
+        if self.record_type not in RECORD_TYPES:
+            raise ValueError(
+                u"ValueError: Check the record_type field in your config.yaml,"
+                u" it must be one of {types}!".format(
+                    types=u", ".join(RECORD_TYPES)))
+
+        self.value = normalise(self.record_type, value)
+        self.values = None
+
+        if isinstance(values, basestring):
+            values = [values]
+
+        if values is not None:
+            self.values = sorted(set(normalise(self.record_type, expected)
+                                     for expected in values))
+
+        self.min_ttl = min_ttl
+
+        self.records = None
+        self.ttl = None
+        self.expires_at = None
+        self.error = None
+
+    def __unicode__(self):
+        return u"(Domain: {url}, Record Type: {record_type})".format(
+            url=self.url,
+            record_type=self.record_type)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return self.__unicode__().encode('utf-8')
+
+    def reset(self):
+        """Forgets the last answer so the next check looks the domain up
+        again, even if its TTL hasn't run out.
+        """
+        self.records = None
+        self.ttl = None
+        self.expires_at = None
+        self.error = None
+
+    def lookup(self):
+        if self.records is not None and self.clock() < self.expires_at:
+            return
+
+        answer = query(self.name, self.record_type, resolver=self.resolver)
+
+        self.records = sorted(set(record_text(self.record_type, rdata)
+                                  for rdata in answer))
+        self.ttl = answer.rrset.ttl
+        self.expires_at = self.clock() + self.ttl
 
     def check_domain(self):
-        query(self.url)
-        return True
+        self.lookup()
+        self.error = self._check_records()
+
+        return self.error is None
+
+    def _check_records(self):
+        if self.value is not None and self.value not in self.records:
+            return ("Expected {record_type} record: {expected} | Actual "
+                    "{record_type} records: {actual}".format(
+                        record_type=self.record_type, expected=self.value,
+                        actual=", ".join(self.records)))
+
+        if self.values is not None and self.values != self.records:
+            return ("Expected {record_type} records: {expected} | Actual "
+                    "{record_type} records: {actual}".format(
+                        record_type=self.record_type,
+                        expected=", ".join(self.values),
+                        actual=", ".join(self.records)))
+
+        if self.min_ttl is not None and self.ttl < self.min_ttl:
+            return ("Expected TTL of at least: {expected} | Actual TTL: "
+                    "{actual}".format(expected=self.min_ttl,
+                                      actual=self.ttl))
+
+        return None
+
+    def create_slack_message(self, error=None):
+        if error is None:
+            error = self.error or "Domain check failed."
+
+        return "Error at {url}. {error}".format(url=self.url, error=error)
 
 
 def main():
     from dns.resolver import NXDOMAIN
     try:
         domain = 'mypebble.co.uk'
-        query(domain)
+        query(domain, resolver=build_resolver())
         print("{url}")
     except NXDOMAIN:
         print "hey ho, I got me an errorrrzzzz"
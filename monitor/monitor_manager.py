@@ -3,18 +3,58 @@
 
 Sends a message to Slack if there are any issues detected.
 """
-from requests.exceptions import ConnectionError, MissingSchema, Timeout
-from dns.resolver import NXDOMAIN
-from dns.exception import SyntaxError, Timeout, FormError, TooBig
+from slack.slack import (Slack, SlackDigest, AlertQueue, DEFAULT_DIGEST_WINDOW,
+                         DEFAULT_QUEUE_SIZE, DEFAULT_RETRIES, DROP)
 
-from slack.slack import Slack
+from monitor.parse_yaml import (get_yaml_config, parse_seconds,
+                                resolve_includes, section_entries,
+                                NoConfigFound, MalformedConfig)
 
-from monitor.parse_yaml import get_yaml_config, NoConfigFound, MalformedConfig
+from monitor_site import MonitorSite, DEFAULT_TIMEOUT
+from body_check import BodyCheck
+from template import expand
+from monitor_domain import MonitorDomain, build_resolver
+from check_pool import CheckPool, DEFAULT_DNS_WORKERS
+from alert_state import AlertState
+from retry import RetryPolicy, DEFAULT_BACKOFF, DEFAULT_RETRIES
+from scheduler import Scheduler, DEFAULT_INTERVAL
+from http_session import build_session
+from metrics import Metrics, MetricsServer, DEFAULT_METRICS_HOST
+from certificate import CertificateCache, DEFAULT_CERT_CACHE
+from history import (History, DEFAULT_HOUR_DAYS, DEFAULT_MINUTE_DAYS,
+                     DEFAULT_RAW_DAYS)
+from logs import check_fields, CHECK_LOGGER
+from host_limits import (HostLimits, host_of, interleave, DEFAULT_HOST_LIMIT,
+                         DEFAULT_HOST_SPACING)
+from check_result import (CheckResult, classify_error, SITE_ERRORS,
+                          DOMAIN_ERRORS, UNEXPECTED)
 
-from monitor_site import MonitorSite
-from monitor_domain import MonitorDomain
+from collections import OrderedDict
 
+import hashlib
+import json
 import logging
+import os
+import threading
+import time
+
+
+# The longest the daemon sleeps before looking for due checks again.
+MAX_WAIT = 1.0
+
+# How often the daemon looks for changes to the config file, in seconds.
+DEFAULT_RELOAD_INTERVAL = 5
+
+# The top level settings which sites and domains fall back to, besides the
+#   timings. A target is only rebuilt on reload if its entry or one of these
+#   has changed.
+INHERITED_SETTINGS = ('max_latency', 'probe', 'cert_min_days')
+
+DEFAULT_TIMINGS = {
+    'interval': DEFAULT_INTERVAL,
+    'connect_timeout': DEFAULT_TIMEOUT,
+    'read_timeout': DEFAULT_TIMEOUT,
+}
 
 
 class MonitorManager(object):
@@ -24,40 +64,423 @@ class MonitorManager(object):
         self.slack_config_file = slack_config_file
         self.parsed_config = None
         self.parsed_slack_config = None
+        # The config file and every file and directory it includes.
+        self.config_paths = [config_file]
         self.sites = []
         self.domains = []
+        # Every site and domain built from the config, by a hash of its entry
+        #   and the settings it inherits, and the same targets as a set.
+        self.targets = OrderedDict()
+        self.active = frozenset()
+        self.site_results = []
+        self.domain_results = []
+        self.pool = CheckPool()
+        self.dns_pool = CheckPool(DEFAULT_DNS_WORKERS)
+        self.session = None
+        self.resolver = None
+        self.certificates = None
+        self.history = None
+        self.hosts = HostLimits()
+        self.retry = RetryPolicy()
+        self.timings = dict(DEFAULT_TIMINGS)
+        self.reload_interval = DEFAULT_RELOAD_INTERVAL
+        self.metrics = Metrics()
+        self.metrics_server = None
 
         self.set_config()
 
         self.slack = Slack(self.parsed_slack_config)
+        self.outbox = AlertQueue(
+            self.slack,
+            max_size=self.parsed_slack_config.get('slack_queue_size',
+                                                  DEFAULT_QUEUE_SIZE),
+            when_full=self.parsed_slack_config.get('slack_queue_full', DROP),
+            retries=self.parsed_slack_config.get('slack_retries',
+                                                 DEFAULT_RETRIES))
+        self.alerts = SlackDigest(
+            self.outbox,
+            enabled=self.parsed_slack_config.get('slack_digest', False),
+            window=self.parsed_slack_config.get('slack_digest_window',
+                                                DEFAULT_DIGEST_WINDOW))
+
+        config = self.parsed_config or {}
+        reminder = config.get('alert_reminder')
+        self.state = AlertState(
+            config.get('state_file'),
+            remind_after=None if reminder is None else reminder * 60)
+
+        # Targets which have failed but are being retried before they are
+        #   reported down, by their AlertState key, with the retries so far.
+        self.retrying = {}
+        self._retry_lock = threading.Lock()
+
+        self.metrics.add_gauge(
+            u"monitor_checks_retrying",
+            u"The number of failing targets being retried before they are "
+            u"reported down.",
+            lambda: len(self.retrying))
+        self.metrics.add_gauge(
+            u"monitor_slack_queue_depth",
+            u"The number of alerts waiting to be sent to Slack.",
+            self.outbox.queue.qsize)
+        self.metrics.add_gauge(
+            u"monitor_slack_dropped_total",
+            u"The number of alerts dropped because the queue was full.",
+            lambda: self.outbox.dropped)
+        self.metrics.add_gauge(
+            u"monitor_history_dropped_total",
+            u"The number of check results dropped because the history "
+            u"writer fell behind.",
+            lambda: self.history.dropped if self.history is not None else 0)
 
         self.logger = logging.getLogger(__name__)
+        self.check_logger = logging.getLogger(CHECK_LOGGER)
 
     def set_config(self):
+        """Reads the config files, returning whether the config has changed
+        since it was last read.
+        """
+        previous = self.parsed_config
+
         try:
-            self.parsed_config = get_yaml_config(self.config_file)
+            self.parsed_config, self.config_paths = resolve_includes(
+                get_yaml_config(self.config_file), self.config_file)
             self.parsed_slack_config = get_yaml_config(self.slack_config_file)
         except (NoConfigFound, MalformedConfig) as e:
             self.slack.post_message(unicode(e.message))
             self.logger.error(unicode(e.message))
 
+        return self.parsed_config is not previous
+
     def parse_config(self):
+        previous = self.targets
+        self.targets = OrderedDict()
         self.sites = []
         self.domains = []
 
         if self.parsed_config is not None:
-            for site in self.parsed_config.get('sites', []):
-                self.parse_site(site)
+            self.pool = self._resize(self.pool,
+                                     self.parsed_config.get('workers'))
+            self.dns_pool = self._resize(self.dns_pool, self.parsed_config.get(
+                'dns_workers', DEFAULT_DNS_WORKERS))
+
+            try:
+                self.timings = self.parse_timings(self.parsed_config,
+                                                  DEFAULT_TIMINGS)
+            except ValueError as e:
+                self.timings = dict(DEFAULT_TIMINGS)
+                self.slack.post_message(unicode(e))
+                self.logger.error(unicode(e))
+
+            self.parse_host_limits()
+            self.retry = self.parse_retry()
+
+            try:
+                self.reload_interval = parse_seconds(
+                    'reload_interval', self.parsed_config.get(
+                        'reload_interval', DEFAULT_RELOAD_INTERVAL))
+            except ValueError as e:
+                self.reload_interval = DEFAULT_RELOAD_INTERVAL
+                self.slack.post_message(unicode(e))
+                self.logger.error(unicode(e))
+
+            if self.session is None:
+                self.session = build_session(
+                    self.parsed_config.get('pool_hosts'),
+                    self.parsed_config.get('pool_size'))
+
+            if self.resolver is None:
+                self.resolver = build_resolver(
+                    self.parsed_config.get('dns_nameservers'),
+                    self.parsed_config.get('dns_timeout'),
+                    self.parsed_config.get('dns_lifetime'))
+
+            if self.certificates is None:
+                self.certificates = self.build_certificates()
+
+            if self.history is None and \
+                    self.parsed_config.get('history_file'):
+                self.history = self.build_history()
+
+            inherited = json.dumps(
+                [self.timings, [self.parsed_config.get(field)
+                                for field in INHERITED_SETTINGS]],
+                sort_keys=True, default=unicode)
+
+            for site in self.parse_entries('sites'):
+                self._compile(site, inherited, previous, self.parse_site,
+                              self.sites)
+
+            for domain in self.parse_entries('domains'):
+                self._compile(domain, inherited, previous, self.parse_domain,
+                              self.domains)
+
+        self.active = frozenset(self.targets.values())
+
+    def parse_entries(self, field):
+        """Yields the entries listed in a section of the config, expanding
+        templates as it goes, and reports any which aren't a mapping.
+        """
+        invalid = False
+
+        for entry in section_entries(self.parsed_config, field):
+            if not isinstance(entry, dict):
+                invalid = True
+            elif entry.get('each') is None:
+                yield entry
+            else:
+                try:
+                    for expanded in expand(entry):
+                        yield expanded
+                except ValueError as e:
+                    self.slack.post_message(unicode(e))
+                    self.logger.error(unicode(e))
+
+        if invalid:
+            message = (u"ValueError: Check the {field} field in your "
+                       u"config.yaml, each entry must be a mapping!".format(
+                           field=field))
+            self.slack.post_message(message)
+            self.logger.error(message)
+
+    def _compile(self, entry, inherited, previous, parse, targets):
+        """Adds the target for a config entry to the target table, reusing
+        the one built before if neither the entry nor the settings it
+        inherits have changed.
+        """
+        key = hashlib.sha1(json.dumps(
+            [parse.__name__, inherited, entry], sort_keys=True,
+            default=unicode)).hexdigest()
+
+        # The same entry listed twice is checked twice.
+        while key in self.targets:
+            key += '+'
+
+        target = previous.get(key)
+
+        if target is None:
+            target = parse(entry)
+        else:
+            targets.append(target)
+
+        if target is not None:
+            self.targets[key] = target
+
+    def _resize(self, pool, workers):
+        """Returns a pool with the given number of workers, keeping the
+        current one if it's already that size.
+        """
+        resized = CheckPool(workers)
+
+        if resized.workers == pool.workers:
+            return pool
+
+        pool.close()
+
+        return resized
+
+    def reload(self):
+        """Reads the config again, returning the targets added if it has
+        changed. Targets whose entries haven't changed are kept as they are,
+        along with their state and any check of them in flight.
+        """
+        before = self.active
+
+        if not self.set_config():
+            return []
+
+        self.parse_config()
+        removed = before - self.active
+        kept = set(Metrics.key(target) for target in self.active)
+
+        for target in removed:
+            if Metrics.key(target) not in kept:
+                self.metrics.forget(target)
+
+        added = [target for target in self.targets.values()
+                 if target not in before]
+        self.logger.info(
+            u"Reloaded the config: {added} targets added and {removed} "
+            u"removed.".format(added=len(added), removed=len(removed)))
+
+        return added
 
-            for domain in self.parsed_config.get('domains', []):
-                self.parse_domain(domain)
+    def parse_retry(self):
+        retries = self.parsed_config.get('confirm_retries')
+
+        try:
+            retries = int(DEFAULT_RETRIES if retries is None else retries)
+        except (TypeError, ValueError):
+            retries = -1
+
+        try:
+            if retries < 0:
+                raise ValueError(
+                    u"ValueError: Check the confirm_retries field in your "
+                    u"config.yaml, it must be a whole number!")
+
+            backoff = parse_seconds('retry_backoff', self.parsed_config.get(
+                'retry_backoff', DEFAULT_BACKOFF))
+        except ValueError as e:
+            self.slack.post_message(unicode(e))
+            self.logger.error(unicode(e))
+
+            return RetryPolicy()
+
+        return RetryPolicy(retries, backoff)
+
+    def parse_host_limits(self):
+        """Sets the limits on checking each host, falling back to the
+        defaults if they are invalid.
+        """
+        try:
+            overrides = dict(
+                (host, self._host_settings(settings or {}, 'limit',
+                                           'spacing'))
+                for host, settings in
+                (self.parsed_config.get('hosts') or {}).items())
+            defaults = self._host_settings(self.parsed_config, 'host_limit',
+                                           'host_spacing')
+
+            self.hosts.configure(
+                defaults.get('limit', DEFAULT_HOST_LIMIT),
+                defaults.get('spacing', DEFAULT_HOST_SPACING), overrides)
+        except ValueError as e:
+            self.slack.post_message(unicode(e))
+            self.logger.error(unicode(e))
+
+            self.hosts.configure()
+
+    def _host_settings(self, settings, limit_field, spacing_field):
+        """Returns the limit and spacing which are set, as `limit` (None for
+        no limit) and `spacing`.
+        """
+        parsed = {}
+
+        if limit_field in settings:
+            limit = settings[limit_field]
+
+            try:
+                limit = None if limit is None else int(limit)
+            except (TypeError, ValueError):
+                limit = 0
+
+            if limit is not None and limit < 1:
+                raise ValueError(
+                    u"ValueError: Check the {field} field in your "
+                    u"config.yaml, it must be at least 1!".format(
+                        field=limit_field))
+
+            parsed['limit'] = limit
+
+        if settings.get(spacing_field) is not None:
+            try:
+                spacing = float(settings[spacing_field])
+            except (TypeError, ValueError):
+                spacing = -1
+
+            if spacing < 0:
+                raise ValueError(
+                    u"ValueError: Check the {field} field in your "
+                    u"config.yaml, it must be a number of seconds!".format(
+                        field=spacing_field))
+
+            parsed['spacing'] = spacing
+
+        return parsed
+
+    def build_certificates(self):
+        try:
+            period = parse_seconds('cert_cache', self.parsed_config.get(
+                'cert_cache', DEFAULT_CERT_CACHE))
+        except ValueError as e:
+            period = DEFAULT_CERT_CACHE
+            self.slack.post_message(unicode(e))
+            self.logger.error(unicode(e))
+
+        return CertificateCache(period,
+                                timeout=self.timings['connect_timeout'])
+
+    def build_history(self):
+        """Returns the store the check results are written to, or None if it
+        can't be opened.
+        """
+        try:
+            retention = dict(
+                (field, self.parse_days('history_' + field, default))
+                for field, default in (('raw_days', DEFAULT_RAW_DAYS),
+                                       ('minute_days', DEFAULT_MINUTE_DAYS),
+                                       ('hour_days', DEFAULT_HOUR_DAYS)))
+
+            return History(self.parsed_config['history_file'], **retention)
+        except ValueError as e:
+            message = unicode(e)
+        except Exception as e:
+            message = u"Failed to open the history_file: {error}".format(
+                error=unicode(e))
+
+        self.slack.post_message(message)
+        self.logger.error(message)
+
+        return None
+
+    def parse_days(self, field, default):
+        value = self.parsed_config.get(field)
+
+        try:
+            value = float(default if value is None else value)
+        except (TypeError, ValueError):
+            value = 0
+
+        if value <= 0:
+            raise ValueError(
+                u"ValueError: Check the {field} field in your config.yaml, "
+                u"it must be a positive number of days!".format(field=field))
+
+        return value
+
+    def parse_timings(self, target, defaults):
+        """Returns the interval and timeouts set on a target, falling back to
+        the defaults for any that are missing or blank.
+        """
+        timings = {}
+
+        for field, default in defaults.items():
+            value = target.get(field)
+
+            if value is None:
+                value = default
+
+            timings[field] = parse_seconds(field, value)
+
+        return timings
 
     def parse_site(self, site):
         try:
             if site['url'] is not None:
+                timings = self.parse_timings(site, self.timings)
+                max_latency = site.get('max_latency',
+                                       self.parsed_config.get('max_latency'))
+
+                if max_latency is not None:
+                    max_latency = parse_seconds('max_latency', max_latency)
+
                 _site = MonitorSite(site['url'], site.get(
-                    'status_code', 200), self.slack)
+                    'status_code', 200), session=self.session,
+                    keep_alive=site.get('keep_alive', True),
+                    max_latency=max_latency,
+                    probe=site.get('probe', self.parsed_config.get('probe')),
+                    body=self.parse_body(site),
+                    redirects=site.get('redirects'),
+                    max_redirects=site.get('max_redirects'),
+                    certificates=self.certificates,
+                    cert_min_days=site.get(
+                        'cert_min_days',
+                        self.parsed_config.get('cert_min_days')),
+                    **timings)
                 self.sites.append(_site)
+
+                return _site
             else:
                 raise KeyError
         except KeyError:
@@ -65,50 +488,341 @@ class MonitorManager(object):
                                     "config.utils, it appears to be missing!")
             self.logger.error("KeyError: Check the url field in your "
                               "config.utils, it appears to be missing!")
+        except ValueError as e:
+            self.slack.post_message(unicode(e))
+            self.logger.error(unicode(e))
+
+    def parse_body(self, site):
+        """Returns what the site's body is checked for, or None if it isn't.
+        """
+        fields = dict((field, site.get('body_' + field)) for field in
+                      ('contains', 'lacks', 'matches', 'checksum'))
+
+        if all(value is None for value in fields.values()):
+            return None
+
+        return BodyCheck(max_bytes=site.get('body_max_bytes'), **fields)
 
     def parse_domain(self, domain):
         try:
             if domain['domain'] is not None:
-                _domain = MonitorDomain(domain.get('domain'))
+                timings = self.parse_timings(
+                    domain, {'interval': self.timings['interval']})
+                min_ttl = domain.get('min_ttl')
+
+                if min_ttl is not None:
+                    min_ttl = parse_seconds('min_ttl', min_ttl)
+
+                _domain = MonitorDomain(
+                    domain.get('domain'), resolver=self.resolver,
+                    record_type=domain.get('record_type'),
+                    value=domain.get('value'), values=domain.get('values'),
+                    min_ttl=min_ttl, **timings)
                 self.domains.append(_domain)
+
+                return _domain
         except KeyError:
             self.slack.post_message("KeyError: Check the domain field in your "
                                     "config.utils, it appears to be missing!")
             self.logger.error("KeyError: Check the domain field in your "
                               "config.utils, it appears to be missing!")
+        except ValueError as e:
+            self.slack.post_message(unicode(e))
+            self.logger.error(unicode(e))
 
     def check_sites(self):
-        errors = []
+        start = time.time()
+
+        # Sites are started round robin by host, and put back in config order
+        #   afterwards.
+        order = interleave(self.sites)
+        results = self.pool.map(self.check_site_politely,
+                                [self.sites[index] for index in order])
+        self.site_results = [None] * len(results)
+
+        for index, result in zip(order, results):
+            self.site_results[index] = result
+
+        self.site_results = self._confirm(self.site_results, self.pool,
+                                          self.check_site_politely)
+        self.metrics.record_sweep('sites', time.time() - start)
+        error_count = self._report(self.site_results)
+        self.state.save()
+        self.alerts.flush()
+
+        return error_count
+
+    def check_site_politely(self, site):
+        """Checks a site once its host's limits allow it."""
+        host = host_of(site.url)
+        self.hosts.acquire(host)
 
         try:
-            errors = [site.create_slack_message() for site in self.sites
-                      if not site.check_status_code()]
-        except (ConnectionError, MissingSchema, Timeout) as e:
-            self.slack.post_message(unicode(e.message))
-            self.logger.error(unicode(e.message))
+            return self.check_site(site)
+        finally:
+            self.hosts.release(host)
+
+    def check_site(self, site):
+        site.reset()
+        self.metrics.check_started()
 
-        for error in errors:
-            self.slack.post_message(error)
-            self.logger.error(error)
+        try:
+            if site.check_status_code():
+                return CheckResult(site)
 
-        return len(errors)
+            return CheckResult(site, UNEXPECTED, site.create_slack_message())
+        except Exception as e:
+            return self._error_result(site, e, SITE_ERRORS)
+        finally:
+            self.metrics.check_finished()
 
     def check_domains(self):
-        errors = []
+        start = time.time()
+        self.domain_results = self._confirm(
+            self.dns_pool.map(self.check_domain, self.domains),
+            self.dns_pool, self.check_domain)
+        self.metrics.record_sweep('domains', time.time() - start)
+        error_count = self._report(self.domain_results)
+        self.state.save()
+        self.alerts.flush()
+
+        return error_count
+
+    def check_domain(self, domain):
+        self.metrics.check_started()
 
         try:
-            errors = [domain.create_slack_message() for domain in self.domains
-                      if not domain.check_domain()]
-        except (NXDOMAIN.DNSException, SyntaxError, Timeout, FormError,
-                TooBig) as e:
-            self.slack.post_message(unicode(e.message))
-            self.logger.error(unicode(e.message))
+            if domain.check_domain():
+                return CheckResult(domain)
+
+            return CheckResult(domain, UNEXPECTED,
+                               domain.create_slack_message())
+        except Exception as e:
+            return self._error_result(domain, e, DOMAIN_ERRORS)
+        finally:
+            self.metrics.check_finished()
+
+    def _error_result(self, target, error, error_classes):
+        error_type = classify_error(error, error_classes)
+        message = target.create_slack_message(unicode(error) or error_type)
+
+        return CheckResult(target, error_type, message)
+
+    def _confirm(self, results, pool, check):
+        """Retries the targets which failed, after their backoff, until they
+        pass or run out of retries. Retries which are due at the same time
+        run together, and none of them hold up the first checks.
+        """
+        results = list(results)
+        due = {}
+
+        for index, result in enumerate(results):
+            delay = self._retry_delay(result)
+
+            if delay is not None:
+                due[index] = time.time() + delay
+
+        while due:
+            time.sleep(max(0.0, min(due.values()) - time.time()))
+
+            now = time.time()
+            ready = [index for index, when in due.items() if when <= now]
+
+            for index, result in zip(ready, pool.map(
+                    check, [results[index].target for index in ready])):
+                del due[index]
+                results[index] = result
+                delay = self._retry_delay(result)
+
+                if delay is not None:
+                    due[index] = time.time() + delay
+
+        return results
+
+    def _retry_delay(self, result):
+        """Returns how long to wait before checking a failing target again,
+        or None if its result should be reported now. Targets already known
+        to be down aren't retried.
+        """
+        key = AlertState.key(result.target)
+
+        with self._retry_lock:
+            if result.ok or self.state.is_down(result.target):
+                self.retrying.pop(key, None)
+                return None
+
+            attempt = self.retrying.get(key, 0)
+
+            if attempt >= self.retry.retries:
+                self.retrying.pop(key, None)
+                return None
+
+            self.retrying[key] = attempt + 1
+
+        delay = self.retry.delay(attempt)
+        self.logger.warning(u"Retrying in {delay:.1f}s: {message}".format(
+            delay=delay, message=result.message))
+
+        return delay
+
+    def _report(self, results):
+        """Logs every failure, and every pass when the log is JSON, but only
+        alerts Slack when a target goes down, comes back up or is due a
+        reminder.
+        """
+        error_count = 0
+
+        for result in results:
+            self.metrics.record(result)
+
+            if self.history is not None:
+                self.history.record(result)
+
+            level = logging.INFO if result.ok else logging.ERROR
+
+            if not result.ok:
+                error_count += 1
+
+            if self.check_logger.isEnabledFor(level):
+                self.check_logger.log(
+                    level, result.message or unicode(result),
+                    extra={'check': check_fields(result)})
+
+            message = self.state.update(result)
+
+            if message is not None:
+                self.alerts.post_message(message)
+
+        return error_count
+
+    def run(self, stop):
+        """Keeps checking every site and domain on its own interval until the
+        `stop` event is set, then waits for the checks in flight to finish.
+        """
+        scheduler = Scheduler()
+        self.start_metrics()
+        stamp = self._config_stamp()
+        next_reload = time.time() + self.reload_interval
+
+        for target in self.sites + self.domains:
+            scheduler.add(target, target.interval)
+
+        def submit(target):
+            # Targets removed from the config are dropped when next due.
+            if target not in self.active:
+                return
+
+            if isinstance(target, MonitorDomain):
+                self.dns_pool.submit(self.check_domain, target, on_result)
+                return
+
+            # A site whose host is busy waits its turn without holding up
+            #   the sites of other hosts.
+            wait = self.hosts.try_acquire(host_of(target.url))
+
+            if wait:
+                scheduler.push(target, scheduler.clock() + wait)
+            else:
+                self.pool.submit(self.check_site, target, on_result)
+
+        def on_result(result):
+            if not isinstance(result.target, MonitorDomain):
+                self.hosts.release(host_of(result.target.url))
+
+            if result.target not in self.active:
+                with self._retry_lock:
+                    self.retrying.pop(AlertState.key(result.target), None)
+
+                return
+
+            try:
+                delay = self._retry_delay(result)
+
+                if delay is not None:
+                    scheduler.push(result.target, scheduler.clock() + delay)
+                    return
+
+                self._report([result])
+            except Exception:
+                self.logger.exception("Failed to report a check result.")
+
+            scheduler.reschedule(result.target, result.target.interval)
+
+        while not stop.is_set():
+            if time.time() >= next_reload:
+                next_reload = time.time() + self.reload_interval
+                changed = self._config_stamp()
+
+                if changed != stamp:
+                    stamp = changed
+
+                    for target in self.reload():
+                        scheduler.add(target, target.interval)
+
+            for target in scheduler.pop_due():
+                submit(target)
+
+            self.alerts.flush_due()
+
+            wait = scheduler.time_until_next()
+            stop.wait(MAX_WAIT if wait is None else min(wait, MAX_WAIT))
+
+        self.pool.close()
+        self.dns_pool.close()
+        self.state.save()
+        self.alerts.flush()
+
+    def _config_stamp(self):
+        """Returns the modification time and size of the config file and
+        everything it includes, which change whenever one is edited, added
+        or removed.
+        """
+        stamp = []
+
+        for path in self.config_paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stamp.append((path, None))
+            else:
+                stamp.append((path, stat.st_mtime, stat.st_size))
+
+        return stamp
+
+    def start_metrics(self):
+        """Serves the metrics over HTTP if a metrics_port is configured."""
+        config = self.parsed_config or {}
+        port = config.get('metrics_port')
+
+        if port is None or self.metrics_server is not None:
+            return
+
+        try:
+            self.metrics_server = MetricsServer(
+                self.metrics, port,
+                config.get('metrics_host', DEFAULT_METRICS_HOST))
+        except Exception as e:
+            self.logger.error(u"Failed to serve metrics on port {port}: "
+                              u"{error}".format(port=port, error=unicode(e)))
+            return
+
+        self.metrics_server.start()
+
+    def close(self):
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+            self.metrics_server = None
+
+        self.pool.close()
+        self.dns_pool.close()
+        self.outbox.close()
 
-        for error in errors:
-            self.slack.post_message(error)
-            self.logger.error(error)
+        if self.history is not None:
+            self.history.close()
 
-        return len(errors)
+        if self.session is not None:
+            self.session.close()
+            self.session = None
 
 
 def main():
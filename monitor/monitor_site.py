@@ -1,17 +1,147 @@
 #!/usr/bin/env python
-from requests import get
-from requests.exceptions import ReadTimeout
+import time
+
+from datetime import timedelta
+from urlparse import urljoin, urlparse
+
+from body_check import CHUNK_SIZE
+from http_session import build_session, start_timing
+from latency import LatencyHistogram
+
+
+DEFAULT_TIMEOUT = 10.0
+
+# How a site is fetched. STREAM sends a GET but stops once the headers have
+#   arrived, HEAD asks for the headers alone, RANGE asks for the first byte of
+#   the body and GET downloads the whole body.
+STREAM = 'stream'
+HEAD = 'head'
+RANGE = 'range'
+GET = 'get'
+PROBES = (STREAM, HEAD, RANGE, GET)
+
+# A body no longer than this is read rather than thrown away, so that its
+#   connection can go back to the pool.
+DRAIN_LIMIT = 64 * 1024
+
+DEFAULT_MAX_REDIRECTS = 10
+
+
+def get(url, session=None, **kwargs):
+    """GETs the url over the shared session when one is given, otherwise
+    over a new connection.
+    """
+    return request('GET', url, session, **kwargs)
+
+
+def head(url, session=None, **kwargs):
+    kwargs.setdefault('allow_redirects', True)
+
+    return request('HEAD', url, session, **kwargs)
+
+
+def request(method, url, session=None, **kwargs):
+    if session is None:
+        session = build_session(1, 1)
+
+        try:
+            return session.request(method, url, **kwargs)
+        finally:
+            session.close()
+
+    return session.request(method, url, **kwargs)
 
 
 class MonitorSite(object):
     """Class for monitoring the status of a website and checking it against an
      expected status.
+
+    Sites are slotted, as a large config holds tens of thousands of them. A
+    site costs about 500 bytes, plus under 1KB for its latency histogram once
+    it has been checked. `slack` is no longer used, and is only accepted so
+    that existing callers keep working.
     """
-    def __init__(self, url, expected_status_code=200, slack=None):
+    __slots__ = ('url', 'expected_status_code', 'interval', 'timeout',
+                 'session', 'probe', 'max_latency', 'body', 'redirects',
+                 'max_redirects', 'certificates', 'cert_min_days',
+                 'status_code', 'status_code_history', 'timings', 'latency',
+                 'body_error', 'hops', 'redirect_error', 'certificate',
+                 'cert_error')
+
+    def __init__(self, url, expected_status_code=200, slack=None,
+                 session=None, keep_alive=True, interval=None,
+                 connect_timeout=DEFAULT_TIMEOUT,
+                 read_timeout=DEFAULT_TIMEOUT, max_latency=None,
+                 probe=None, body=None, redirects=None, max_redirects=None,
+                 certificates=None, cert_min_days=None):
         self.status_code_history = None
         self.status_code = None
         self.url = url
-        self.slack = slack
+        self.interval = interval
+        self.timeout = (connect_timeout, read_timeout)
+
+        # The time spent on each phase of the last check, and how long
+        #   recent checks took overall.
+        self.timings = None
+        self.latency = LatencyHistogram()
+        self.max_latency = max_latency
+
+        # Sites which must be probed cold never use the shared session.
+        self.session = session if keep_alive else None
+
+        self.probe = (probe or STREAM).lower()
+
+        if self.probe not in PROBES:
+            raise ValueError(
+                u"ValueError: Check the probe field in your config.yaml, it "
+                u"must be one of {probes}!".format(probes=u", ".join(PROBES)))
+
+        # What the body must contain, checked as it streams in.
+        self.body = body
+        self.body_error = None
+
+        if body is not None and self.probe not in (STREAM, GET):
+            raise ValueError(
+                u"ValueError: Check the probe field in your config.yaml, it "
+                u"must be stream or get to check the body!")
+
+        # With a redirect chain or limit set, redirects are followed here one
+        #   hop at a time instead of by requests.
+        self.redirects = None
+        self.max_redirects = None
+        self.hops = None
+        self.redirect_error = None
+
+        if redirects is not None or max_redirects is not None:
+            self.redirects = [self._parse_hop(hop) for hop in redirects or []]
+
+            try:
+                self.max_redirects = int(
+                    max_redirects or max(DEFAULT_MAX_REDIRECTS,
+                                         len(self.redirects)))
+            except (TypeError, ValueError):
+                self.max_redirects = -1
+
+            if self.max_redirects < len(self.redirects):
+                raise ValueError(
+                    u"ValueError: Check the max_redirects field in your "
+                    u"config.yaml, it must be a whole number no smaller than "
+                    u"the number of redirects!")
+
+        # An https site's certificate is looked up in the shared cache and
+        #   must be valid for at least `cert_min_days`.
+        self.certificates = certificates
+        self.cert_min_days = None
+
+        if cert_min_days is not None:
+            try:
+                self.cert_min_days = int(cert_min_days)
+            except (TypeError, ValueError):
+                raise ValueError(
+                    u"ValueError: Check the cert_min_days field in your "
+                    u"config.yaml, it must be a whole number of days!")
+        self.certificate = None
+        self.cert_error = None
 
         if expected_status_code is not None:
             self.expected_status_code = expected_status_code
@@ -29,22 +159,208 @@ class MonitorSite(object):
     def __str__(self):
         return self.__unicode__().encode('utf-8')
 
+    def reset(self):
+        """Forgets the last result so the next check fetches the site again.
+        """
+        self.status_code = None
+        self.status_code_history = None
+        self.timings = None
+        self.body_error = None
+        self.hops = None
+        self.redirect_error = None
+        self.certificate = None
+        self.cert_error = None
+
+    @staticmethod
+    def _parse_hop(hop):
+        """A hop of the expected redirect chain, as a status code and the
+        url it redirects to. Either may be None to accept any.
+        """
+        if isinstance(hop, dict):
+            return hop.get('status_code'), hop.get('location')
+
+        if isinstance(hop, int):
+            return hop, None
+
+        if isinstance(hop, basestring):
+            return None, hop
+
+        raise ValueError(
+            u"ValueError: Check the redirects field in your config.yaml, "
+            u"each redirect must be a status code, a location or both!")
+
     def get_status_code(self):
         if self.status_code is None:
+            timings = start_timing()
+            start = time.time()
 
-            try:
-                response = get(url=self.url, timeout=10.0)
-            except ReadTimeout as e:
-                error = self.create_slack_message(e.message)
-                self.slack.post_message(error)
-                return None
+            if self.redirects is not None:
+                waited = self._follow_redirects()
+                self._record_timings(timings, start, waited)
+                return self.status_code
 
-            self.status_code = response.status_code
+            response = self._fetch(self.url)
 
-            self._expected_redirect(response)
+            try:
+                self._record_timings(timings, start, self._elapsed(response))
+                self._read(response)
+            finally:
+                self._release(response)
 
         return self.status_code
 
+    def _read(self, response):
+        self.status_code = response.status_code
+
+        # A server which honours the range answers with part of the body
+        #   instead of all of it.
+        if self.probe == RANGE and self.status_code == 206:
+            self.status_code = 200
+
+        self._expected_redirect(response)
+
+        if self.body is not None and self._status_code_matches():
+            self.body_error = self.body.check(
+                response.iter_content(CHUNK_SIZE))
+
+    def _follow_redirects(self):
+        """Follows the redirects one at a time, checking each hop against the
+        expected chain and stopping at the first which doesn't match. Returns
+        the time spent waiting for responses.
+        """
+        url = self.url
+        self.hops = []
+        waited = 0.0
+
+        for index in range(self.max_redirects + 1):
+            hop_start = time.time()
+            response = self._fetch(url, allow_redirects=False)
+
+            try:
+                location = response.headers.get('Location')
+                location = urljoin(url, location) if location else None
+                seconds = time.time() - hop_start
+
+                self.hops.append({'url': url, 'location': location,
+                                  'status_code': response.status_code,
+                                  'seconds': seconds})
+                elapsed = self._elapsed(response)
+                waited += seconds if elapsed is None else elapsed
+
+                if index < len(self.redirects):
+                    self.redirect_error = self._hop_error(index)
+
+                    if self.redirect_error is not None:
+                        self.status_code = response.status_code
+                        return waited
+                elif self.redirects or not self._is_redirect(index):
+                    self._read(response)
+                    return waited
+            finally:
+                self._release(response)
+
+            url = location
+
+        self.status_code = self.hops[-1]['status_code']
+        self.redirect_error = (
+            u"Expected at most {count} redirects | Actual redirects: more"
+            .format(count=self.max_redirects))
+
+        return waited
+
+    def _is_redirect(self, index):
+        hop = self.hops[index]
+
+        return (300 <= hop['status_code'] < 400 and
+                hop['location'] is not None)
+
+    def _hop_error(self, index):
+        status_code, location = self.redirects[index]
+        hop = self.hops[index]
+
+        if (self._is_redirect(index) and
+                status_code in (None, hop['status_code']) and
+                location in (None, hop['location'])):
+            return None
+
+        def describe(status_code, location):
+            if location is None:
+                return unicode(status_code or u"any redirect")
+
+            return u"{status_code} to {location}".format(
+                status_code=status_code or u"redirect", location=location)
+
+        return (u"Expected redirect {number}: {expected} | Actual redirect "
+                u"{number}: {actual}".format(
+                    number=index + 1,
+                    expected=describe(status_code, location),
+                    actual=describe(hop['status_code'], hop['location'])))
+
+    def _fetch(self, url, **kwargs):
+        if self.probe == HEAD:
+            return head(url=url, session=self.session, timeout=self.timeout,
+                        **kwargs)
+
+        if self.probe == GET and self.body is None:
+            return get(url=url, session=self.session, timeout=self.timeout,
+                       **kwargs)
+
+        if self.probe == RANGE:
+            return get(url=url, session=self.session, timeout=self.timeout,
+                       stream=True, headers={'Range': 'bytes=0-0'}, **kwargs)
+
+        return get(url=url, session=self.session, timeout=self.timeout,
+                   stream=True, **kwargs)
+
+    def _release(self, response):
+        """Finishes with a streamed response without downloading a large body.
+        A small body is read so its connection can be reused, anything else is
+        closed.
+        """
+        if self.body is not None:
+            # Returns the connection to the pool if the whole body was read.
+            response.close()
+            return
+
+        if self.probe in (HEAD, GET):
+            return
+
+        try:
+            length = int(response.headers.get('Content-Length'))
+        except (TypeError, ValueError):
+            length = None
+
+        if length is not None and length <= DRAIN_LIMIT:
+            response.content
+        else:
+            response.close()
+
+    @staticmethod
+    def _elapsed(response):
+        elapsed = getattr(response, 'elapsed', None)
+
+        if isinstance(elapsed, timedelta):
+            return elapsed.total_seconds()
+
+        return None
+
+    def _record_timings(self, timings, start, waited=None):
+        total = time.time() - start
+
+        timings['total'] = total
+
+        # requests measures from before connecting until the response headers
+        #   arrive, so take off the connection setup to leave the time to the
+        #   first byte once the request was sent.
+        if waited is None:
+            waited = total
+
+        timings['ttfb'] = max(0.0, waited - timings['connect'] -
+                              timings['tls'])
+
+        self.timings = timings
+        self.latency.record(total)
+
     def _expected_redirect(self, response):
         if str(self.expected_status_code).startswith('3'):
             try:
@@ -56,6 +372,36 @@ class MonitorSite(object):
         if not self.status_code:
             self.get_status_code()
 
+        self._check_certificate()
+
+        return (self.redirect_error is None and self._status_code_matches()
+                and self.body_error is None and self.cert_error is None and
+                not self._too_slow())
+
+    def _check_certificate(self):
+        url = urlparse(self.url)
+
+        if (self.cert_min_days is None or self.certificates is None or
+                url.scheme != 'https' or self.certificate is not None):
+            return
+
+        self.certificate = self.certificates.get(url.hostname,
+                                                 url.port or 443)
+        days_left = self.certificate.days_left()
+
+        if not self.certificate.chain_valid:
+            self.cert_error = (
+                u"Certificate for {host}:{port} is not valid: {error}".format(
+                    host=self.certificate.host, port=self.certificate.port,
+                    error=self.certificate.error))
+        elif days_left < self.cert_min_days:
+            self.cert_error = (
+                u"Expected certificate valid for at least: {expected} days | "
+                u"Actual: {actual} days (issued by {issuer})".format(
+                    expected=self.cert_min_days, actual=days_left,
+                    issuer=self.certificate.issuer))
+
+    def _status_code_matches(self):
         if (self.expected_status_code == self.status_code_history and
                 200 == self.status_code):
             return True
@@ -64,14 +410,34 @@ class MonitorSite(object):
         else:
             return False
 
+    def _too_slow(self):
+        return (self.max_latency is not None and self.timings is not None and
+                self.timings['total'] > self.max_latency)
+
     def create_slack_message(self, error=None):
-        if error is None:
+        if error is None and self.redirect_error is not None:
+            message = (u"Error at {url}. {error}".format(
+                url=self.url, error=self.redirect_error))
+        elif error is None and not self._status_code_matches():
             message = ("Error at {url}. Expected status code expected: "
                        "{expected} | Actual status code: {actual}"
                        .format(url=self.url,
                                expected=self.expected_status_code,
                                actual=self.status_code)
                        )
+        elif error is None and self.cert_error is not None:
+            message = (u"Error at {url}. {error}".format(
+                url=self.url, error=self.cert_error))
+        elif error is None and self.body_error is not None:
+            message = (u"Error at {url}. {error}".format(
+                url=self.url, error=self.body_error))
+        elif error is None:
+            message = ("Error at {url}. Expected response time within: "
+                       "{expected:.2f}s | Actual response time: {actual:.2f}s"
+                       .format(url=self.url,
+                               expected=self.max_latency,
+                               actual=self.timings['total'])
+                       )
         else:
             message = ("Error at {url}. {error}".format(url=self.url,
                                                         error=error))
@@ -1,19 +1,168 @@
 #!/usr/bin/env python
+"""Reads the yaml config files.
+
+Files are parsed with libyaml's loader when PyYAML was built with it, which
+is many times faster than the pure Python one on a large config. The parsed
+config is kept against a hash of the file's contents, so reading a file
+which hasn't changed returns the same config without parsing it again.
+
+The monitor config may `include` other files, whose sites and domains are
+added to its own.
+"""
+import glob
+import hashlib
+import os
+import threading
+
 from yaml import load
 from yaml.composer import ComposerError
 from yaml.scanner import ScannerError
 from yaml.parser import ParserError
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+# Files in an included directory with these suffixes are read.
+INCLUDE_SUFFIXES = ('.yaml', '.yml')
+
+# The sections of an included file which are added to the config.
+INCLUDED_SECTIONS = ('sites', 'domains')
+
+# The last config parsed from each file, by path, as (hash, config).
+_parsed = {}
+# The last config merged with its includes, by path, as (parts, config).
+_merged = {}
+_parsed_lock = threading.Lock()
+
 
 def get_yaml_config(config_file=None):
     try:
-        with open(config_file, 'r') as yaml_file:
-            return load(yaml_file)
+        with open(config_file, 'rb') as yaml_file:
+            content = yaml_file.read()
     except IOError:
         raise NoConfigFound
+
+    digest = hashlib.sha1(content).hexdigest()
+
+    with _parsed_lock:
+        parsed = _parsed.get(config_file)
+
+    if parsed is not None and parsed[0] == digest:
+        return parsed[1]
+
+    try:
+        config = load(content, Loader=SafeLoader)
     except (ComposerError, ParserError, ScannerError):
         raise MalformedConfig
 
+    if config is not None and not isinstance(config, dict):
+        raise MalformedConfig
+
+    with _parsed_lock:
+        _parsed[config_file] = (digest, config)
+
+    return config
+
+
+def include_paths(pattern, directory):
+    """Returns the files an include names, in order, and the directory to
+    watch for files being added, if any. An include is a file, a directory
+    of yaml files or a glob, relative to the including file's directory.
+    """
+    path = os.path.join(directory, os.path.expanduser(pattern))
+
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path)
+                      if name.endswith(INCLUDE_SUFFIXES)), path
+
+    if glob.has_magic(path):
+        return sorted(glob.glob(path)), os.path.dirname(path)
+
+    return [path], None
+
+
+def resolve_includes(config, config_file):
+    """Returns the config with the sites and domains of every file it
+    includes (and they include) added after its own, and the paths to watch
+    for changes to any of them. Returns the same config as last time if none
+    of the files have changed.
+    """
+    if not config or not config.get('include'):
+        return config, [config_file]
+
+    parts = []
+    watched = [config_file]
+    seen = set([os.path.realpath(config_file)])
+
+    def visit(part, part_file):
+        parts.append(part)
+        includes = part.get('include') or []
+
+        if isinstance(includes, basestring):
+            includes = [includes]
+
+        for pattern in includes:
+            paths, directory = include_paths(
+                pattern, os.path.dirname(part_file))
+
+            if directory is not None:
+                watched.append(directory)
+
+            for path in paths:
+                if os.path.realpath(path) in seen:
+                    continue
+
+                seen.add(os.path.realpath(path))
+                watched.append(path)
+                visit(get_yaml_config(path) or {}, path)
+
+    visit(config, config_file)
+
+    with _parsed_lock:
+        merged = _merged.get(config_file)
+
+    if merged is not None and len(merged[0]) == len(parts) and all(
+            old is new for old, new in zip(merged[0], parts)):
+        return merged[1], watched
+
+    config = dict((field, value) for field, value in config.items()
+                  if field != 'include')
+
+    for section in INCLUDED_SECTIONS:
+        config[section] = [entry for part in parts
+                           for entry in section_entries(part, section)]
+
+    with _parsed_lock:
+        _merged[config_file] = (parts, config)
+
+    return config, watched
+
+
+def section_entries(config, section):
+    entries = config.get(section) or []
+
+    return entries if isinstance(entries, list) else [entries]
+
+
+def parse_seconds(field, value):
+    """Returns a config value as a positive number of seconds, or raises a
+    ValueError explaining which field is wrong.
+    """
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        value = 0
+
+    if value <= 0:
+        raise ValueError(
+            u"ValueError: Check the {field} field in your config.yaml, it "
+            u"must be a positive number of seconds!".format(field=field))
+
+    return value
+
 
 class MalformedConfig(Exception):
     def __init__(self):
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+"""Reports the availability of each site and domain from the check history.
+
+For every target checked within the window it shows the share of checks
+which passed, how much of the error budget that used against the `slo`, and
+its 50th, 95th and 99th latency percentiles. Only the minute, hour and day
+rollups are read, so a report over months of history for thousands of
+targets takes about as long as one over a day.
+"""
+import getopt
+import json
+import os
+import sys
+import time
+
+from history import connect, summaries
+from parse_yaml import get_yaml_config, NoConfigFound, MalformedConfig
+
+
+DEFAULT_WINDOW = 30 * 86400
+DEFAULT_SLO = 99.9
+PERCENTILES = (50, 95, 99)
+
+UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+
+USAGE = ('report.py [-c <configfile>] [-f <historyfile>] [-w <window>] '
+         '[-o <slo>] [-j]')
+
+
+def parse_window(window):
+    """Returns a window such as 90m, 12h or 30d in seconds."""
+    try:
+        if window[-1:].lower() in UNITS:
+            seconds = float(window[:-1]) * UNITS[window[-1:].lower()]
+        else:
+            seconds = float(window)
+    except ValueError:
+        seconds = 0
+
+    if seconds <= 0:
+        raise ValueError(u"The window must be a positive number of seconds, "
+                         u"or of minutes, hours, days or weeks, e.g. 30d.")
+
+    return seconds
+
+
+def build_report(connection, start, end, slo=DEFAULT_SLO):
+    """Returns a row for each target checked between `start` and `end`,
+    least available first.
+    """
+    budget = 1 - slo / 100.0
+    rows = []
+
+    for key, rollup in summaries(connection, start, end).items():
+        row = {
+            'target': key,
+            'checks': rollup.checks,
+            'failures': rollup.checks - rollup.up,
+            'availability': round(rollup.uptime * 100, 4),
+            # The share of the failures the SLO allows which were used, so
+            #   more than 100 means the SLO was missed.
+            'error_budget_used': round((1 - rollup.uptime) / budget * 100, 1)
+            if budget > 0 else None,
+        }
+
+        for percent in PERCENTILES:
+            latency = rollup.percentile(percent)
+            row['latency_p{0}'.format(percent)] = \
+                None if latency is None else round(latency, 4)
+
+        rows.append(row)
+
+    return sorted(rows, key=lambda row: (row['availability'], row['target']))
+
+
+def format_text(rows, start, end, slo):
+    lines = [u"Availability from {start} to {end} against an SLO of "
+             u"{slo}%".format(start=format_time(start), end=format_time(end),
+                              slo=slo), u""]
+
+    if not rows:
+        return u"\n".join(lines + [u"No checks were recorded."])
+
+    width = max(len(u"Target"), max(len(row['target']) for row in rows))
+    columns = [u"Checks", u"Up %", u"Budget %", u"p50 ms", u"p95 ms",
+               u"p99 ms"]
+    lines.append(u"  ".join([u"Target".ljust(width)] +
+                            [column.rjust(9) for column in columns]))
+
+    for row in rows:
+        values = [row['checks'], u"{0:.3f}".format(row['availability']),
+                  format_number(row['error_budget_used'], u"{0:.1f}")] + [
+            format_number(row['latency_p{0}'.format(percent)], u"{0:.0f}",
+                          1000) for percent in PERCENTILES]
+        lines.append(u"  ".join([row['target'].ljust(width)] +
+                                [unicode(value).rjust(9)
+                                 for value in values]))
+
+    return u"\n".join(lines)
+
+
+def format_number(value, pattern, scale=1):
+    return u"-" if value is None else pattern.format(value * scale)
+
+
+def format_time(when):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(when))
+
+
+def main(argv=None, out=sys.stdout):
+    try:
+        opts, args = getopt.getopt(argv, "hc:f:w:o:j",
+                                   ["configfile=", "history-file=",
+                                    "window=", "slo=", "json"])
+    except getopt.GetoptError:
+        print(USAGE)
+        sys.exit(2)
+
+    config = "config.yaml"
+    history_file = None
+    window = DEFAULT_WINDOW
+    slo = None
+    as_json = False
+
+    try:
+        for opt, arg in opts:
+            if opt == '-h':
+                print(USAGE)
+                sys.exit()
+            elif opt in ("-c", "--configfile"):
+                config = arg
+            elif opt in ("-f", "--history-file"):
+                history_file = arg
+            elif opt in ("-w", "--window"):
+                window = parse_window(arg)
+            elif opt in ("-o", "--slo"):
+                slo = float(arg)
+            elif opt in ("-j", "--json"):
+                as_json = True
+
+        if history_file is None or slo is None:
+            parsed_config = get_yaml_config(config) or {}
+            history_file = history_file or parsed_config.get('history_file')
+            slo = slo if slo is not None else float(
+                parsed_config.get('slo', DEFAULT_SLO))
+    except (ValueError, NoConfigFound, MalformedConfig) as e:
+        sys.exit(unicode(e))
+
+    if not history_file or not os.path.exists(history_file):
+        sys.exit(u"No history has been found. Please set the history_file "
+                 u"field in your config.yaml, or pass one with -f.")
+
+    end = time.time()
+    start = end - window
+    connection = connect(history_file)
+
+    try:
+        rows = build_report(connection, start, end, slo)
+    finally:
+        connection.close()
+
+    if as_json:
+        out.write(json.dumps({'start': start, 'end': end, 'slo': slo,
+                              'targets': rows}, sort_keys=True) + '\n')
+    else:
+        out.write(format_text(rows, start, end, slo).encode('utf-8') + '\n')
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+"""Decides how long to wait before checking a failing target again.
+
+A target which was up and then fails is retried up to `retries` times
+before it is reported down, waiting `backoff` seconds before the first
+retry and twice as long before each one after that. Every wait is varied by
+up to `jitter` either way so that targets which failed together aren't all
+retried at the same moment.
+"""
+import random
+
+
+DEFAULT_RETRIES = 0
+DEFAULT_BACKOFF = 1.0
+DEFAULT_JITTER = 0.1
+
+
+class RetryPolicy(object):
+    def __init__(self, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+                 jitter=DEFAULT_JITTER, rand=random.random):
+        self.retries = retries
+        self.backoff = backoff
+        self.jitter = jitter
+        self.rand = rand
+
+    def delay(self, attempt):
+        """Seconds to wait before retry number `attempt`, counting from 0."""
+        delay = self.backoff * 2 ** attempt
+
+        return delay + (self.rand() * 2 - 1) * self.jitter * delay
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""Schedules sites and domains to be checked again on their own intervals.
+
+Targets are kept in a priority queue ordered by when they are next due. The
+first check of each target is spread randomly across its interval so that a
+large config doesn't fire every check at the same moment.
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+
+
+DEFAULT_INTERVAL = 60
+DEFAULT_JITTER = 0.1
+
+
+class Scheduler(object):
+    def __init__(self, jitter=DEFAULT_JITTER, clock=time.time,
+                 rand=random.random):
+        self.jitter = jitter
+        self.clock = clock
+        self.rand = rand
+
+        self._queue = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def add(self, target, interval=DEFAULT_INTERVAL):
+        """Schedules the first check of a target somewhere within its
+        interval.
+        """
+        self.push(target, self.clock() + self.rand() * interval)
+
+    def reschedule(self, target, interval=DEFAULT_INTERVAL):
+        """Schedules the next check of a target one interval from now, give or
+        take the jitter.
+        """
+        jitter = (self.rand() * 2 - 1) * self.jitter * interval
+        self.push(target, self.clock() + interval + jitter)
+
+    def push(self, target, due):
+        with self._lock:
+            heapq.heappush(self._queue, (due, next(self._counter), target))
+
+    def pop_due(self):
+        """Removes and returns every target whose check is due."""
+        now = self.clock()
+        due = []
+
+        with self._lock:
+            while self._queue and self._queue[0][0] <= now:
+                due.append(heapq.heappop(self._queue)[2])
+
+        return due
+
+    def time_until_next(self):
+        """Seconds until the next check is due, or None if nothing is
+        scheduled.
+        """
+        with self._lock:
+            if not self._queue:
+                return None
+
+            return max(0.0, self._queue[0][0] - self.clock())
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""Expands a template entry in the config into one entry per value.
+
+An entry with an `each` field maps names to lists of values, and stands for
+one entry for every combination of them, with the values filled into its url
+(or domain) wherever the name appears in braces, e.g.
+
+    - url: https://{tenant}.example.com/health
+      each:
+        tenant: [acme, globex, initech]
+
+The entries are made one at a time as they are asked for, so a template over
+thousands of values never holds them all at once.
+"""
+import itertools
+
+
+# The fields which values are filled into.
+TEMPLATE_FIELDS = ('url', 'domain')
+
+
+def expand(entry):
+    """Yields the entries a template entry stands for, or raises a
+    ValueError explaining what is wrong with it.
+    """
+    each = entry['each']
+
+    if not isinstance(each, dict) or not each or not all(
+            isinstance(values, list) for values in each.values()):
+        raise ValueError(
+            u"ValueError: Check the each field in your config.yaml, it must "
+            u"map names to lists of values!")
+
+    names = sorted(each)
+    template = dict((field, value) for field, value in entry.items()
+                    if field != 'each')
+
+    for values in itertools.product(*[each[name] for name in names]):
+        expanded = dict(template)
+
+        for field in TEMPLATE_FIELDS:
+            if isinstance(expanded.get(field), basestring):
+                expanded[field] = fill(field, expanded[field],
+                                       dict(zip(names, values)))
+
+        yield expanded
+
+
+def fill(field, pattern, values):
+    try:
+        return pattern.format(**values)
+    except (KeyError, IndexError, ValueError):
+        raise ValueError(
+            u"ValueError: Check the {field} field in your config.yaml, every "
+            u"name in braces must be listed under each!".format(field=field))
@@ -0,0 +1,146 @@
+import os
+import shutil
+import tempfile
+import unittest
+import yaml
+
+from mock import patch
+from monitor.alert_state import AlertState
+from monitor.check_result import CheckResult, OK, TIMEOUT, UNEXPECTED
+from monitor.monitor_domain import MonitorDomain
+from monitor.monitor_manager import MonitorManager
+from monitor.monitor_site import MonitorSite
+
+
+class FakeClock(object):
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestAlertState(unittest.TestCase):
+    slack_config = {
+        'slack_api_token': '',
+        'slack_channel': '',
+        'slack_emote': '',
+        'slack_shoutout': '',
+        'slack_username': ''}
+
+    def setUp(self):
+        self.site = MonitorSite("http://example.com")
+        self.down = CheckResult(self.site, TIMEOUT,
+                                "Error at http://example.com. Timed out.")
+        self.up = CheckResult(self.site, OK)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_only_alerts_on_transitions(self):
+        clock = FakeClock()
+        state = AlertState(clock=clock)
+
+        self.assertEqual(None, state.update(self.up))
+        self.assertEqual(self.down.message, state.update(self.down))
+
+        clock.now += 600
+        self.assertEqual(None, state.update(self.down))
+
+        clock.now += 600
+        self.assertEqual(u"Recovered at http://example.com after 20 minutes.",
+                         state.update(self.up))
+        self.assertEqual(None, state.update(self.up))
+
+    def test_reminders_while_down(self):
+        clock = FakeClock()
+        state = AlertState(remind_after=3600, clock=clock)
+
+        self.assertEqual(self.down.message, state.update(self.down))
+
+        clock.now += 3599
+        self.assertEqual(None, state.update(self.down))
+
+        clock.now += 1
+        self.assertEqual(u"Still failing after 60 minutes: Error at "
+                         u"http://example.com. Timed out.",
+                         state.update(self.down))
+
+        clock.now += 60
+        self.assertEqual(None, state.update(self.down))
+
+    def test_sites_and_domains_are_tracked_separately(self):
+        state = AlertState()
+        domain = MonitorDomain("http://example.com")
+
+        state.update(self.down)
+
+        self.assertEqual("Error", state.update(
+            CheckResult(domain, UNEXPECTED, "Error")))
+        self.assertEqual(2, len(state.states))
+
+    def test_same_url_with_different_expectations(self):
+        state = AlertState()
+        redirect = MonitorSite("http://example.com", 301)
+
+        state.update(self.down)
+
+        self.assertEqual("Error", state.update(
+            CheckResult(redirect, UNEXPECTED, "Error")))
+        self.assertTrue(state.update(CheckResult(redirect, OK)).startswith(
+            u"Recovered at http://example.com"))
+        self.assertEqual(None, state.update(self.down))
+        self.assertEqual(2, len(state.states))
+
+    def test_state_file_survives_between_runs(self):
+        path = os.path.join(self.directory, 'state.json')
+
+        state = AlertState(path)
+        self.assertEqual(self.down.message, state.update(self.down))
+        state.save()
+
+        state = AlertState(path)
+        self.assertEqual(None, state.update(self.down))
+        self.assertEqual(TIMEOUT,
+                         state.states[u"site:http://example.com:200"]['status'])
+
+    def test_unreadable_state_file_is_ignored(self):
+        path = os.path.join(self.directory, 'state.json')
+
+        with open(path, 'w') as state_file:
+            state_file.write("{not json")
+
+        self.assertEqual({}, AlertState(path).states)
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    @patch('monitor.monitor_manager.get_yaml_config')
+    @patch('monitor.monitor_site.get')
+    def test_repeated_sweeps_alert_once(self, mock_requests,
+                                        mock_get_yaml_config,
+                                        mock_slack_post_message):
+        mock_get_yaml_config.side_effect = [yaml.load(
+            "---\n"
+            "sites:\n"
+            "- url: http://example.com\n"), self.slack_config]
+        mock_requests.return_value.status_code = 500
+
+        manager = MonitorManager()
+        manager.parse_config()
+
+        self.assertEqual(1, manager.check_sites())
+        self.assertEqual(1, manager.check_sites())
+        manager.outbox.wait()
+        self.assertEqual(1, mock_slack_post_message.call_count)
+
+        mock_requests.return_value.status_code = 200
+
+        self.assertEqual(0, manager.check_sites())
+        manager.outbox.wait()
+        self.assertEqual(2, mock_slack_post_message.call_count)
+        self.assertTrue(mock_slack_post_message.call_args[0][0].startswith(
+            u"Recovered at http://example.com"))
+
+
+if __name__ == '__main__':
+    unittest.main()
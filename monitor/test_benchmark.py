@@ -0,0 +1,48 @@
+import unittest
+
+from monitor.benchmark import chosen, regressions, run
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_chosen_is_repeatable(self):
+        picked = [index for index in range(1000) if chosen(index, 0.1, 'a')]
+
+        self.assertEqual(picked, [index for index in range(1000)
+                                  if chosen(index, 0.1, 'a')])
+        self.assertTrue(50 < len(picked) < 150)
+        self.assertEqual([], [index for index in range(100)
+                              if chosen(index, 0, 'a')])
+
+    def test_regressions(self):
+        baseline = [{'targets': 10, 'checks_per_second': 100.0,
+                     'peak_rss_kb': 1000}]
+
+        self.assertEqual([], regressions(
+            [{'targets': 10, 'checks_per_second': 90.0, 'peak_rss_kb': 1100},
+             {'targets': 1000, 'checks_per_second': 1.0, 'peak_rss_kb': 1}],
+            baseline))
+        self.assertEqual(
+            [u"10 targets: 70.0 checks/s, was 100.0",
+             u"10 targets: peak RSS 1300 KB, was 1000 KB"],
+            regressions([{'targets': 10, 'checks_per_second': 70.0,
+                          'peak_rss_kb': 1300}], baseline))
+
+    def test_sweep_against_local_fleet(self):
+        settings = {'hosts': 2, 'latency': 0, 'error_rate': 0.5,
+                    'redirect_rate': 0.5}
+
+        result = run([20], settings, workers=5)[0]
+
+        self.assertEqual(20, result['targets'])
+        expected = len([index for index in range(20)
+                        if chosen(index, 0.5, 'error')])
+        self.assertEqual(expected, result['site_errors'])
+        self.assertEqual(expected, result['domain_errors'])
+        self.assertEqual(expected * 2, result['alerts'])
+        self.assertTrue(result['checks_per_second'] > 0)
+        self.assertTrue(result['peak_rss_kb'] > 0)
+        self.assertEqual(0.5, result['error_rate'])
+
+
+if __name__ == '__main__':
+    unittest.main()
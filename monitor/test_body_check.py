@@ -0,0 +1,141 @@
+import hashlib
+import threading
+import unittest
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from monitor.body_check import BodyCheck
+from monitor.http_session import build_session
+from monitor.monitor_site import MonitorSite
+
+
+def chunks(body, size):
+    """Yields the body in pieces, counting how many were taken."""
+    for start in range(0, len(body), size):
+        chunks.taken += 1
+        yield body[start:start + size]
+
+
+class LargePageHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    size = 8 * 1024 * 1024
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(self.size))
+        self.end_headers()
+
+        try:
+            self.wfile.write('<title>Welcome</title>')
+            block = 'x' * 65536
+
+            for _ in range(self.size // len(block)):
+                self.wfile.write(block)
+        except Exception:
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class TestBodyCheck(unittest.TestCase):
+    body = "<html><title>Welcome</title>" + "x" * 10000 + "</html>"
+
+    def setUp(self):
+        chunks.taken = 0
+
+    def test_contains_across_chunks(self):
+        check = BodyCheck(contains=["Welcome", "</html>"])
+
+        self.assertEqual(None, check.check(chunks(self.body, 10)))
+        self.assertEqual(u"Expected the body to contain: Goodbye",
+                         BodyCheck(contains="Goodbye").check(
+                             chunks(self.body, 10)))
+
+    def test_stops_once_found(self):
+        self.assertEqual(None, BodyCheck(contains="Welcome").check(
+            chunks(self.body, 10)))
+        self.assertEqual(2, chunks.taken)
+
+    def test_lacks(self):
+        self.assertEqual(u"Expected the body not to contain: Welcome",
+                         BodyCheck(lacks="Welcome").check(
+                             chunks(self.body, 7)))
+        self.assertEqual(None, BodyCheck(lacks=u"Error").check(
+            chunks(self.body, 7)))
+
+    def test_matches(self):
+        self.assertEqual(None, BodyCheck(matches=r"<title>\w+</").check(
+            chunks(self.body, 5)))
+        self.assertEqual(u"Expected the body to match: <h1>",
+                         BodyCheck(matches="<h1>").check(
+                             chunks(self.body, 5)))
+
+    def test_checksum(self):
+        digest = hashlib.sha256(self.body).hexdigest()
+
+        self.assertEqual(None, BodyCheck(checksum=digest).check(
+            chunks(self.body, 100)))
+        self.assertEqual(None, BodyCheck(
+            checksum="md5:" + hashlib.md5(self.body).hexdigest()).check(
+                chunks(self.body, 100)))
+        self.assertEqual(
+            u"Expected body checksum: {expected} | Actual body checksum: "
+            u"{actual}".format(expected='0' * 64, actual=digest),
+            BodyCheck(checksum='0' * 64).check(chunks(self.body, 100)))
+
+    def test_reads_at_most_max_bytes(self):
+        check = BodyCheck(contains="</html>", max_bytes=1000)
+
+        self.assertEqual(u"Expected the body to contain: </html>",
+                         check.check(chunks(self.body, 100)))
+        self.assertEqual(11, chunks.taken)
+
+        check = BodyCheck(checksum='0' * 64, max_bytes=1000)
+        self.assertEqual(u"Expected body checksum: {zeros} | Actual body is "
+                         u"larger than 1000 bytes".format(zeros='0' * 64),
+                         check.check(chunks(self.body, 100)))
+
+    def test_invalid_settings(self):
+        for settings in ({'matches': '('}, {'checksum': 'crc:1'},
+                         {'contains': 'a', 'max_bytes': 'lots'}):
+            self.assertRaises(ValueError, BodyCheck, **settings)
+
+    def test_site_body_on_large_page(self):
+        """A keyword near the start of a large page is found without
+        downloading the rest of it.
+        """
+        server = ThreadedHTTPServer(('127.0.0.1', 0), LargePageHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        session = build_session()
+        url = "http://127.0.0.1:{port}/".format(port=server.server_port)
+
+        try:
+            site = MonitorSite(url, session=session,
+                               body=BodyCheck(contains="Welcome"))
+            self.assertTrue(site.check_status_code())
+
+            site = MonitorSite(url, session=session,
+                               body=BodyCheck(lacks="xxx"))
+            self.assertFalse(site.check_status_code())
+            self.assertEqual(
+                u"Error at {url}. Expected the body not to contain: xxx"
+                .format(url=url), site.create_slack_message())
+        finally:
+            session.close()
+            server.shutdown()
+            server.server_close()
+
+    def test_body_needs_a_get(self):
+        self.assertRaises(ValueError, MonitorSite, "http://example.com",
+                          probe='head', body=BodyCheck(contains="a"))
+
+
+if __name__ == '__main__':
+    unittest.main()
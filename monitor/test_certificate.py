@@ -0,0 +1,174 @@
+import socket
+import threading
+import unittest
+
+from mock import MagicMock, patch
+from monitor.certificate import (Certificate, CertificateCache, inspect,
+                                 issuer_name)
+from monitor.monitor_site import MonitorSite
+
+
+class FakeClock(object):
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestCertificate(unittest.TestCase):
+    peer = {
+        'notAfter': 'Jun  1 12:00:00 2027 GMT',
+        'issuer': ((('countryName', u'US'),),
+                   (('organizationName', u"Let's Encrypt"),),
+                   (('commonName', u'R3'),)),
+    }
+
+    def test_issuer_name(self):
+        self.assertEqual(u'R3', issuer_name(self.peer['issuer']))
+        self.assertEqual(u"Let's Encrypt",
+                         issuer_name(self.peer['issuer'][:2]))
+        self.assertEqual(u"countryName=US",
+                         issuer_name(self.peer['issuer'][:1]))
+
+    def test_days_left(self):
+        certificate = Certificate('example.com', 443, not_after=86400 * 10)
+
+        self.assertEqual(10, certificate.days_left(0))
+        self.assertEqual(9, certificate.days_left(1))
+        self.assertEqual(-1, certificate.days_left(86400 * 10 + 1))
+        self.assertEqual(None, Certificate('example.com', 443).days_left())
+
+    @patch('monitor.certificate.socket.create_connection')
+    @patch('monitor.certificate.ssl.create_default_context')
+    def test_inspect(self, mock_context, mock_connect):
+        tls = mock_context.return_value.wrap_socket.return_value
+        tls.getpeercert.return_value = self.peer
+
+        certificate = inspect('example.com', 443)
+
+        mock_connect.assert_called_once_with(('example.com', 443), 10.0)
+        mock_context.return_value.wrap_socket.assert_called_once_with(
+            mock_connect.return_value, server_hostname='example.com')
+        self.assertTrue(certificate.chain_valid)
+        self.assertEqual(u'R3', certificate.issuer)
+        self.assertEqual(1811851200, certificate.not_after)
+        self.assertTrue(certificate.handshake_time >= 0)
+        tls.close.assert_called_once_with()
+
+    def test_inspect_failure(self):
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        port = listener.getsockname()[1]
+        listener.close()
+
+        certificate = inspect('127.0.0.1', port, timeout=1)
+
+        self.assertFalse(certificate.chain_valid)
+        self.assertTrue(certificate.error)
+
+    @patch('monitor.certificate.inspect')
+    def test_cache_per_host_and_port(self, mock_inspect):
+        clock = FakeClock()
+        cache = CertificateCache(period=3600, clock=clock)
+
+        for _ in range(5):
+            cache.get('example.com', 443)
+
+        self.assertEqual(1, mock_inspect.call_count)
+
+        cache.get('example.com', 8443)
+        self.assertEqual(2, mock_inspect.call_count)
+
+        clock.now += 3600
+        cache.get('example.com', 443)
+        self.assertEqual(3, mock_inspect.call_count)
+
+    @patch('monitor.certificate.inspect')
+    def test_concurrent_lookups_share_one_inspection(self, mock_inspect):
+        started = threading.Event()
+        release = threading.Event()
+        lock = threading.Lock()
+        calls = []
+
+        def slow_inspect(host, port, timeout):
+            with lock:
+                calls.append((host, port))
+            started.set()
+            release.wait(5)
+            return Certificate(host, port)
+
+        mock_inspect.side_effect = slow_inspect
+        cache = CertificateCache()
+        threads = [threading.Thread(target=cache.get,
+                                    args=('example.com', 443))
+                   for _ in range(5)]
+
+        for thread in threads:
+            thread.start()
+
+        self.assertTrue(started.wait(5))
+        release.set()
+
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual([('example.com', 443)], calls)
+
+    @patch('monitor.monitor_site.get')
+    def test_site_certificate_expiring(self, mock_requests):
+        mock_requests.return_value.status_code = 200
+        certificates = MagicMock()
+        certificates.get.return_value = Certificate(
+            'example.com', 443, not_after=1e12, issuer=u'R3',
+            chain_valid=True)
+        certificates.get.return_value.days_left = lambda: 5
+
+        site = MonitorSite("https://example.com/login",
+                           certificates=certificates, cert_min_days=14)
+
+        self.assertFalse(site.check_status_code())
+        certificates.get.assert_called_once_with('example.com', 443)
+        self.assertEqual(
+            u"Error at https://example.com/login. Expected certificate valid "
+            u"for at least: 14 days | Actual: 5 days (issued by R3)",
+            site.create_slack_message())
+
+        site.reset()
+        site.cert_min_days = 5
+        self.assertTrue(site.check_status_code())
+
+    @patch('monitor.monitor_site.get')
+    def test_site_certificate_invalid(self, mock_requests):
+        mock_requests.return_value.status_code = 200
+        certificates = MagicMock()
+        certificates.get.return_value = Certificate(
+            'example.com', 8443, error=u"certificate verify failed")
+
+        site = MonitorSite("https://example.com:8443/",
+                           certificates=certificates, cert_min_days=14)
+
+        self.assertFalse(site.check_status_code())
+        self.assertEqual(
+            u"Error at https://example.com:8443/. Certificate for "
+            u"example.com:8443 is not valid: certificate verify failed",
+            site.create_slack_message())
+
+    @patch('monitor.monitor_site.get')
+    def test_site_certificate_only_checked_for_https(self, mock_requests):
+        mock_requests.return_value.status_code = 200
+        certificates = MagicMock()
+
+        self.assertTrue(MonitorSite(
+            "http://example.com", certificates=certificates,
+            cert_min_days=14).check_status_code())
+        self.assertTrue(MonitorSite(
+            "https://example.com",
+            certificates=certificates).check_status_code())
+        certificates.get.assert_not_called()
+        self.assertRaises(ValueError, MonitorSite, "https://example.com",
+                          cert_min_days='soon')
+
+
+if __name__ == '__main__':
+    unittest.main()
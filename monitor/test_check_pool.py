@@ -0,0 +1,92 @@
+import threading
+import time
+import unittest
+import yaml
+
+from mock import patch
+from monitor.check_pool import CheckPool, DEFAULT_WORKERS
+from monitor.monitor_manager import MonitorManager
+
+
+class TestCheckPool(unittest.TestCase):
+    slack_config = {
+        'slack_api_token': '',
+        'slack_channel': '',
+        'slack_emote': '',
+        'slack_shoutout': '',
+        'slack_username': ''}
+
+    yaml_config_many_sites = (
+        "---\n"
+        "workers: 10\n"
+        "sites:\n" +
+        "".join("- url: http://example{0}.com\n"
+                "  status_code: 200\n".format(i) for i in range(10)))
+
+    def test_default_workers(self):
+        self.assertEqual(DEFAULT_WORKERS, CheckPool().workers)
+        self.assertEqual(DEFAULT_WORKERS, CheckPool(None).workers)
+        self.assertEqual(1, CheckPool(0).workers)
+
+    def test_results_keep_target_order(self):
+        """Results come back in the order of the targets, however long each
+        check takes.
+        """
+        pool = CheckPool(workers=5)
+
+        def check(target):
+            time.sleep(0.01 * (5 - target))
+            return target * 2
+
+        self.assertEqual([0, 2, 4, 6, 8], pool.map(check, range(5)))
+        pool.close()
+
+    def test_single_worker_runs_inline(self):
+        pool = CheckPool(workers=1)
+
+        self.assertEqual([1, 2], pool.map(lambda target: target, [1, 2]))
+        self.assertEqual(None, pool._pool)
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    @patch('monitor.monitor_manager.get_yaml_config')
+    @patch('monitor.monitor_site.get')
+    def test_sweep_bounded_by_slowest_site(self, mock_requests,
+                                           mock_get_yaml_config,
+                                           mock_slack_post_message):
+        """Ten sites that each take 0.2s should be checked in far less than
+        the 2s it would take one after another.
+        """
+        lock = threading.Lock()
+        called = []
+
+        def slow_get(url, **kwargs):
+            with lock:
+                called.append(url)
+            time.sleep(0.2)
+            return response
+
+        response = mock_requests.return_value
+        response.status_code = 200
+        mock_requests.side_effect = slow_get
+        mock_get_yaml_config.side_effect = [
+            yaml.load(self.yaml_config_many_sites), self.slack_config]
+
+        manager = MonitorManager()
+        manager.parse_config()
+
+        self.assertEqual(10, manager.pool.workers)
+
+        start = time.time()
+        self.assertEqual(0, manager.check_sites())
+        elapsed = time.time() - start
+        manager.close()
+
+        # Mock's own call_count isn't safe to update from many threads.
+        self.assertEqual(10, len(set(called)))
+        self.assertEqual(10, len(manager.site_results))
+        self.assertLess(elapsed, 1.0)
+        mock_slack_post_message.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import sys
+import unittest
+
+from monitor.check_result import CheckResult
+from monitor.monitor_domain import MonitorDomain
+from monitor.monitor_site import MonitorSite
+
+
+def footprint(site):
+    """The bytes a site holds on its own, leaving out what it shares with
+    other sites, such as its url and the session.
+    """
+    latency = site.latency
+    size = (sys.getsizeof(site) + sys.getsizeof(site.timeout) +
+            sys.getsizeof(latency) + sys.getsizeof(latency._epochs))
+
+    if latency._counts is not None:
+        size += sys.getsizeof(latency._counts)
+
+    return size
+
+
+class TestFootprint(unittest.TestCase):
+    def test_targets_are_slotted(self):
+        site = MonitorSite("http://example.com")
+        domain = MonitorDomain("example.com")
+
+        for target in (site, site.latency, domain, CheckResult(site)):
+            self.assertFalse(hasattr(target, '__dict__'))
+
+        self.assertRaises(AttributeError, setattr, site, 'slack', None)
+
+    def test_site_footprint(self):
+        site = MonitorSite("http://example.com")
+
+        self.assertLess(footprint(site), 600)
+
+        site.latency.record(0.1)
+
+        self.assertLess(footprint(site), 1500)
+
+    def test_domain_footprint(self):
+        self.assertLess(sys.getsizeof(MonitorDomain("example.com")), 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+import os
+import shutil
+import tempfile
+import unittest
+import yaml
+
+from mock import MagicMock, patch
+from monitor.check_result import CheckResult, TIMEOUT
+from monitor.history import (DAY, HOUR, MINUTE, History, Rollup, connect,
+                             split, summaries)
+from monitor.monitor_domain import MonitorDomain
+from monitor.monitor_manager import MonitorManager
+from monitor.monitor_site import MonitorSite
+
+
+class FakeClock(object):
+    def __init__(self, now=1000 * DAY):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestHistory(unittest.TestCase):
+    slack_config = {
+        'slack_api_token': '',
+        'slack_channel': '',
+        'slack_emote': '',
+        'slack_shoutout': '',
+        'slack_username': ''}
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'history.db')
+        self.clock = FakeClock()
+        self.site = MonitorSite("http://example.com")
+        self.domain = MonitorDomain("example.com")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def result(self, target, latency=None, error_type='ok'):
+        if latency is not None:
+            target.timings = {'total': latency}
+
+        return CheckResult(target, error_type)
+
+    def test_rollup_round_trip(self):
+        rollup = Rollup()
+        rollup.add(True, 0.1)
+        rollup.add(True, 0.1)
+        rollup.add(False, None)
+
+        stored = Rollup.from_row(rollup.row())
+
+        self.assertEqual((3, 2, 2), (stored.checks, stored.up,
+                                     stored.latency_count))
+        self.assertAlmostEqual(2.0 / 3, stored.uptime)
+        self.assertAlmostEqual(0.1, stored.mean_latency)
+        self.assertAlmostEqual(0.1, stored.percentile(99), delta=0.02)
+        self.assertEqual(None, Rollup().uptime)
+
+    def test_split(self):
+        start = 10 * DAY
+
+        self.assertEqual([(MINUTE, start + 90, start + 2 * MINUTE)],
+                         split(start + 90, start + 2 * MINUTE))
+        self.assertEqual(
+            [(MINUTE, start - 30 * MINUTE, start),
+             (DAY, start, start + 2 * DAY),
+             (HOUR, start + 2 * DAY, start + 2 * DAY + 3 * HOUR),
+             (MINUTE, start + 2 * DAY + 3 * HOUR,
+              start + 2 * DAY + 3 * HOUR + 5)],
+            split(start - 30 * MINUTE, start + 2 * DAY + 3 * HOUR + 5))
+
+    def test_results_are_rolled_up(self):
+        history = History(self.path, clock=self.clock)
+        start = self.clock.now
+
+        # A day of checks every minute, down for the last hour.
+        for minute in range(24 * 60):
+            self.clock.now = start + minute * MINUTE
+            down = minute >= 23 * 60
+            history.record(self.result(
+                self.site, 0.2, TIMEOUT if down else 'ok'))
+            history.record(self.result(self.domain))
+
+        history.close()
+        connection = connect(self.path)
+
+        self.assertEqual(u'wal', connection.execute(
+            "PRAGMA journal_mode").fetchone()[0])
+        self.assertEqual(24 * 60 * 2, connection.execute(
+            "SELECT COUNT(*) FROM checks").fetchone()[0])
+        self.assertEqual(24 * 2, connection.execute(
+            "SELECT COUNT(*) FROM rollups WHERE resolution = ?",
+            (HOUR,)).fetchone()[0])
+
+        totals = summaries(connection, start, start + DAY)
+
+        self.assertEqual(set([u"site:http://example.com:200",
+                              u"domain:example.com:A"]), set(totals))
+        site = totals[u"site:http://example.com:200"]
+        self.assertEqual(24 * 60, site.checks)
+        self.assertAlmostEqual(23.0 / 24, site.uptime)
+        self.assertAlmostEqual(0.2, site.percentile(50), delta=0.04)
+        self.assertEqual(1.0, totals[u"domain:example.com:A"].uptime)
+        self.assertEqual(None, totals[u"domain:example.com:A"].mean_latency)
+
+        # A window which starts and ends partway through an hour.
+        last_hours = summaries(connection, start + 22 * HOUR + 30 * MINUTE,
+                               start + DAY, u"site:http://example.com:200")
+        self.assertEqual([u"site:http://example.com:200"], list(last_hours))
+        self.assertEqual(90, last_hours.values()[0].checks)
+        self.assertEqual(30, last_hours.values()[0].up)
+        connection.close()
+
+    def test_expired_rows_are_removed(self):
+        history = History(self.path, raw_days=1, minute_days=2, hour_days=3,
+                          clock=self.clock)
+        start = self.clock.now
+
+        for day in range(4):
+            self.clock.now = start + day * DAY
+            history.record(self.result(self.site, 0.1))
+
+        history.compact()
+        history.close()
+        connection = connect(self.path)
+
+        def count(query):
+            return connection.execute(query).fetchone()[0]
+
+        self.assertEqual(2, count("SELECT COUNT(*) FROM checks"))
+        self.assertEqual(3, count("SELECT COUNT(*) FROM rollups "
+                                  "WHERE resolution = 60"))
+        self.assertEqual(4, count("SELECT COUNT(*) FROM rollups "
+                                  "WHERE resolution = 3600"))
+        connection.close()
+
+    def test_full_queue_drops_results(self):
+        history = History(self.path, max_size=1, clock=self.clock)
+
+        with patch.object(history, '_start'):
+            history.record(self.result(self.site))
+            history.record(self.result(self.site))
+
+        self.assertEqual(1, history.dropped)
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    @patch('monitor.monitor_manager.get_yaml_config')
+    @patch('monitor.monitor_site.get')
+    def test_manager_records_results(self, mock_requests,
+                                     mock_get_yaml_config, mock_slack):
+        mock_requests.return_value = MagicMock(status_code=500, history=[])
+        config = yaml.load("sites:\n- url: http://example.com\n")
+        config['history_file'] = self.path
+        mock_get_yaml_config.side_effect = [config, self.slack_config]
+
+        manager = MonitorManager()
+        manager.parse_config()
+        manager.check_sites()
+        manager.close()
+
+        connection = connect(self.path)
+        self.assertEqual([(u"unexpected",)], connection.execute(
+            "SELECT error_type FROM checks").fetchall())
+        connection.close()
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    @patch('monitor.monitor_manager.get_yaml_config')
+    def test_invalid_retention(self, mock_get_yaml_config, mock_slack):
+        config = {'history_file': self.path, 'history_hour_days': 'forever'}
+        mock_get_yaml_config.side_effect = [config, self.slack_config]
+
+        manager = MonitorManager()
+        manager.parse_config()
+        manager.close()
+
+        self.assertEqual(None, manager.history)
+        mock_slack.assert_called_once_with(
+            u"ValueError: Check the history_hour_days field in your "
+            u"config.yaml, it must be a positive number of days!")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,203 @@
+import threading
+import time
+import unittest
+import yaml
+
+from collections import namedtuple
+from mock import patch
+from monitor.host_limits import BUSY_RETRY, HostLimits, host_of, interleave
+from monitor.monitor_manager import MonitorManager
+
+
+Target = namedtuple('Target', 'url')
+
+
+class FakeClock(object):
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class ConcurrencyCounter(object):
+    """Stands in for the request, recording the most requests to each host
+    that were running at once.
+    """
+    def __init__(self, response, seconds=0.05):
+        self.response = response
+        self.seconds = seconds
+        self.running = {}
+        self.most = {}
+        self.urls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, url, **kwargs):
+        host = host_of(url)
+
+        with self._lock:
+            self.urls.append(url)
+            self.running[host] = self.running.get(host, 0) + 1
+            self.most[host] = max(self.most.get(host, 0), self.running[host])
+
+        time.sleep(self.seconds)
+
+        with self._lock:
+            self.running[host] -= 1
+
+        return self.response
+
+
+class TestHostLimits(unittest.TestCase):
+    slack_config = {
+        'slack_api_token': '',
+        'slack_channel': '',
+        'slack_emote': '',
+        'slack_shoutout': '',
+        'slack_username': ''}
+
+    yaml_config = (
+        "---\n"
+        "workers: 10\n"
+        "host_limit: 2\n"
+        "hosts:\n"
+        "  internal.example.com:\n"
+        "    limit: 5\n"
+        "sites:\n" +
+        "".join("- url: http://example.com/{0}\n".format(i)
+                for i in range(6)) +
+        "".join("- url: http://internal.example.com/{0}\n".format(i)
+                for i in range(6)))
+
+    def test_interleave(self):
+        targets = [Target(url) for url in (
+            "http://a.com/1", "http://a.com/2", "http://a.com/3",
+            "https://B.com/1", "http://c.com:8080/", "http://b.com/2")]
+
+        self.assertEqual([0, 3, 4, 1, 5, 2], interleave(targets))
+
+    def test_limit(self):
+        hosts = HostLimits(limit=2, overrides={'Big.example.com':
+                                               {'limit': None}})
+
+        self.assertEqual(0, hosts.try_acquire('example.com'))
+        self.assertEqual(0, hosts.try_acquire('example.com'))
+        self.assertEqual(BUSY_RETRY, hosts.try_acquire('example.com'))
+        self.assertEqual(0, hosts.try_acquire('example.org'))
+
+        hosts.release('example.com')
+        self.assertEqual(0, hosts.try_acquire('example.com'))
+
+        for _ in range(10):
+            self.assertEqual(0, hosts.try_acquire('big.example.com'))
+
+    def test_spacing(self):
+        clock = FakeClock()
+        hosts = HostLimits(limit=None, spacing=2,
+                           overrides={'fast.example.com': {'spacing': 0}},
+                           clock=clock)
+
+        self.assertEqual(0, hosts.try_acquire('example.com'))
+        clock.now += 0.5
+        self.assertEqual(1.5, hosts.try_acquire('example.com'))
+        self.assertEqual(0, hosts.try_acquire('fast.example.com'))
+        self.assertEqual(0, hosts.try_acquire('fast.example.com'))
+
+        clock.now += 1.5
+        self.assertEqual(0, hosts.try_acquire('example.com'))
+
+    def test_acquire_waits_for_release(self):
+        hosts = HostLimits(limit=1)
+        hosts.acquire('example.com')
+        acquired = threading.Event()
+
+        def acquire():
+            hosts.acquire('example.com')
+            acquired.set()
+
+        waiter = threading.Thread(target=acquire)
+        waiter.start()
+
+        self.assertFalse(acquired.wait(0.2))
+        hosts.release('example.com')
+        self.assertTrue(acquired.wait(5))
+        waiter.join(5)
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    @patch('monitor.monitor_manager.get_yaml_config')
+    @patch('monitor.monitor_site.get')
+    def test_sweep_respects_host_limits(self, mock_requests,
+                                        mock_get_yaml_config,
+                                        mock_slack_post_message):
+        mock_requests.return_value.status_code = 200
+        counter = ConcurrencyCounter(mock_requests.return_value)
+        mock_requests.side_effect = counter
+        mock_get_yaml_config.side_effect = [yaml.load(self.yaml_config),
+                                            self.slack_config]
+
+        manager = MonitorManager()
+        manager.parse_config()
+
+        self.assertEqual(0, manager.check_sites())
+        manager.close()
+
+        self.assertEqual(2, counter.most['example.com'])
+        self.assertEqual(5, counter.most['internal.example.com'])
+        self.assertEqual([site.url for site in manager.sites],
+                         [result.target.url
+                          for result in manager.site_results])
+        mock_slack_post_message.assert_not_called()
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    @patch('monitor.monitor_manager.get_yaml_config')
+    @patch('monitor.monitor_site.get')
+    def test_daemon_respects_host_limits(self, mock_requests,
+                                         mock_get_yaml_config,
+                                         mock_slack_post_message):
+        config = yaml.load(self.yaml_config)
+        config.update({'interval': 0.05, 'host_limit': 1})
+        mock_requests.return_value.status_code = 200
+        counter = ConcurrencyCounter(mock_requests.return_value, 0.02)
+        stop = threading.Event()
+
+        def check(url, **kwargs):
+            response = counter(url, **kwargs)
+
+            if len(set(counter.urls)) == 12:
+                stop.set()
+
+            return response
+
+        mock_requests.side_effect = check
+        mock_get_yaml_config.side_effect = [config, self.slack_config]
+
+        manager = MonitorManager()
+        manager.parse_config()
+        timer = threading.Timer(10, stop.set)
+        timer.start()
+        manager.run(stop)
+        manager.close()
+        timer.cancel()
+
+        self.assertEqual(12, len(set(counter.urls)))
+        self.assertEqual(1, counter.most['example.com'])
+        self.assertLessEqual(counter.most['internal.example.com'], 5)
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    @patch('monitor.monitor_manager.get_yaml_config')
+    def test_invalid_host_limits(self, mock_get_yaml_config, mock_slack):
+        config = yaml.load(self.yaml_config)
+        config['hosts']['internal.example.com']['spacing'] = 'often'
+        mock_get_yaml_config.side_effect = [config, self.slack_config]
+
+        manager = MonitorManager()
+        manager.parse_config()
+
+        self.assertEqual(4, manager.hosts.limit)
+        mock_slack.assert_called_once_with(
+            u"ValueError: Check the spacing field in your config.yaml, it "
+            u"must be a number of seconds!")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+import os
+import shutil
+import tempfile
+import types
+import unittest
+
+from mock import patch
+from monitor.monitor_manager import MonitorManager
+from monitor.parse_yaml import NoConfigFound, get_yaml_config, \
+    resolve_includes
+from monitor.template import expand
+
+
+class TestInclude(unittest.TestCase):
+    slack_config = (
+        "---\n"
+        "slack_api_token: ''\n"
+        "slack_channel: ''\n"
+        "slack_emote: ''\n"
+        "slack_shoutout: ''\n"
+        "slack_username: ''\n")
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.config_file = self.path('config.yaml')
+        self.write('slack_config.yaml', self.slack_config)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, *names):
+        return os.path.join(self.directory, *names)
+
+    def write(self, name, content):
+        if not os.path.isdir(os.path.dirname(self.path(name))):
+            os.makedirs(os.path.dirname(self.path(name)))
+
+        with open(self.path(name), 'w') as config_file:
+            config_file.write(content)
+
+    def resolve(self):
+        return resolve_includes(get_yaml_config(self.config_file),
+                                self.config_file)
+
+    def manager(self):
+        manager = MonitorManager(
+            config_file=self.config_file,
+            slack_config_file=self.path('slack_config.yaml'))
+        manager.parse_config()
+        manager.close()
+
+        return manager
+
+    def test_include_file_directory_and_glob(self):
+        self.write('config.yaml', (
+            "---\n"
+            "interval: 30\n"
+            "include:\n"
+            "- tenants\n"
+            "- extra-*.yaml\n"
+            "- domains.yaml\n"
+            "sites:\n"
+            "- url: http://example.com\n"))
+        self.write('tenants/b.yaml', "sites:\n- url: http://b.example.com\n")
+        self.write('tenants/a.yml', "sites:\n- url: http://a.example.com\n")
+        self.write('tenants/notes.txt', "sites: []\n")
+        self.write('extra-1.yaml', (
+            "interval: 5\n"
+            "sites:\n"
+            "- url: http://extra.example.com\n"))
+        self.write('domains.yaml', (
+            "include: config.yaml\n"
+            "domains:\n"
+            "- domain: example.com\n"))
+
+        config, watched = self.resolve()
+
+        self.assertEqual(30, config['interval'])
+        self.assertNotIn('include', config)
+        self.assertEqual(
+            ["http://example.com", "http://a.example.com",
+             "http://b.example.com", "http://extra.example.com"],
+            [site['url'] for site in config['sites']])
+        self.assertEqual([{'domain': 'example.com'}], config['domains'])
+        self.assertEqual(
+            [self.config_file, self.path('tenants'),
+             self.path('tenants', 'a.yml'), self.path('tenants', 'b.yaml'),
+             self.directory, self.path('extra-1.yaml'),
+             self.path('domains.yaml')],
+            watched)
+
+    def test_unchanged_includes_give_the_same_config(self):
+        self.write('config.yaml', "include: sites.yaml\n")
+        self.write('sites.yaml', "sites:\n- url: http://example.com\n")
+
+        first = self.resolve()[0]
+
+        self.assertIs(first, self.resolve()[0])
+
+        self.write('sites.yaml', "sites:\n- url: http://example.org\n")
+
+        self.assertEqual([{'url': "http://example.org"}],
+                         self.resolve()[0]['sites'])
+
+    def test_missing_include(self):
+        self.write('config.yaml', "include: missing.yaml\n")
+
+        self.assertRaises(NoConfigFound, self.resolve)
+
+    def test_expand(self):
+        entries = expand({
+            'url': "https://{tenant}.example.com/{page}",
+            'status_code': 200,
+            'each': {'tenant': ['acme', 'globex'], 'page': ['', 'login']}})
+
+        self.assertIsInstance(entries, types.GeneratorType)
+        self.assertEqual(
+            [{'url': "https://acme.example.com/", 'status_code': 200},
+             {'url': "https://globex.example.com/", 'status_code': 200},
+             {'url': "https://acme.example.com/login", 'status_code': 200},
+             {'url': "https://globex.example.com/login",
+              'status_code': 200}],
+            list(entries))
+        self.assertEqual(
+            [{'domain': "a.example.com"}],
+            list(expand({'domain': "{x}.example.com", 'each': {'x': ['a']}})))
+
+    def test_expand_invalid(self):
+        self.assertRaises(ValueError, list, expand({
+            'url': "https://example.com", 'each': ['acme']}))
+        self.assertRaises(ValueError, list, expand({
+            'url': "https://{tenant}.example.com", 'each': {'x': ['a']}}))
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    def test_templated_sites(self, mock_slack):
+        self.write('config.yaml', (
+            "---\n"
+            "sites:\n"
+            "- url: http://example.com\n"
+            "- url: https://{tenant}.example.com/health\n"
+            "  status_code: 204\n"
+            "  each:\n"
+            "    tenant: [acme, globex, initech]\n"
+            "- url: https://{tenant}.example.com/\n"
+            "  each: acme\n"
+            "domains:\n"
+            "- domain: '{tenant}.example.com'\n"
+            "  each:\n"
+            "    tenant: [acme]\n"))
+
+        manager = self.manager()
+
+        self.assertEqual(
+            ["http://example.com", "https://acme.example.com/health",
+             "https://globex.example.com/health",
+             "https://initech.example.com/health"],
+            [site.url for site in manager.sites])
+        self.assertEqual([200, 204, 204, 204],
+                         [site.expected_status_code for site in manager.sites])
+        self.assertEqual(["acme.example.com"],
+                         [domain.url for domain in manager.domains])
+        mock_slack.assert_called_once_with(
+            u"ValueError: Check the each field in your config.yaml, it must "
+            u"map names to lists of values!")
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    def test_reload_picks_up_included_changes(self, mock_slack):
+        self.write('config.yaml', "include: tenants\n")
+        self.write('tenants/a.yaml', "sites:\n- url: http://a.example.com\n")
+
+        manager = self.manager()
+        stamp = manager._config_stamp()
+        site = manager.sites[0]
+
+        self.write('tenants/b.yaml', "sites:\n- url: http://b.example.com\n")
+        self.assertNotEqual(stamp, manager._config_stamp())
+
+        added = manager.reload()
+        manager.close()
+
+        self.assertEqual(["http://b.example.com"],
+                         [target.url for target in added])
+        self.assertEqual([site, added[0]], manager.sites)
+        mock_slack.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import threading
+import unittest
+import yaml
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from mock import patch
+from monitor.http_session import build_session
+from monitor.latency import (LatencyHistogram, MAX_COUNT, bucket_bound,
+                             bucket_index)
+from monitor.monitor_manager import MonitorManager
+from monitor.monitor_site import MonitorSite
+
+
+class FakeClock(object):
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class OkHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write('ok')
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    slack_config = {
+        'slack_api_token': '',
+        'slack_channel': '',
+        'slack_emote': '',
+        'slack_shoutout': '',
+        'slack_username': ''}
+
+    def test_buckets_bound_their_samples(self):
+        for seconds in (0.001, 0.0123, 0.25, 1.0, 9.9):
+            index = bucket_index(seconds)
+            self.assertLessEqual(seconds, bucket_bound(index) * 1.0000001)
+            self.assertGreater(seconds * 1.2, bucket_bound(index))
+
+        self.assertEqual(0, bucket_index(0.0005))
+        self.assertEqual(bucket_index(1000), bucket_index(100000))
+
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+
+        self.assertEqual(None, histogram.percentile(50))
+
+        for _ in range(90):
+            histogram.record(0.05)
+        for _ in range(9):
+            histogram.record(0.5)
+        histogram.record(5.0)
+
+        self.assertEqual(100, histogram.count())
+        percentiles = histogram.percentiles()
+        self.assertAlmostEqual(0.05, percentiles[50], delta=0.01)
+        self.assertAlmostEqual(0.5, percentiles[95], delta=0.1)
+        self.assertAlmostEqual(0.5, percentiles[99], delta=0.1)
+        self.assertAlmostEqual(5.0, histogram.percentile(100), delta=1.0)
+
+    def test_old_samples_age_out(self):
+        clock = FakeClock()
+        histogram = LatencyHistogram(window=60, slots=6, clock=clock)
+
+        histogram.record(5.0)
+        clock.now += 30
+        histogram.record(0.1)
+        self.assertEqual(2, histogram.count())
+
+        clock.now += 35
+        self.assertEqual(1, histogram.count())
+        self.assertAlmostEqual(0.1, histogram.percentile(99), delta=0.02)
+
+        clock.now += 600
+        histogram.record(0.2)
+        self.assertEqual(1, histogram.count())
+
+    def test_counts_saturate(self):
+        histogram = LatencyHistogram()
+
+        for _ in range(MAX_COUNT + 10):
+            histogram.record(0.05)
+
+        self.assertEqual(MAX_COUNT, histogram.count())
+
+    def test_site_records_timings(self):
+        """A real request records each phase, and a kept-alive connection
+        skips connecting the second time.
+        """
+        server = ThreadedHTTPServer(('127.0.0.1', 0), OkHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        session = build_session()
+
+        try:
+            site = MonitorSite("http://localhost:{port}/".format(
+                port=server.server_port), session=session)
+
+            self.assertTrue(site.check_status_code())
+            timings = site.timings
+            self.assertGreater(timings['connect'], 0)
+            self.assertEqual(0, timings['tls'])
+            self.assertGreaterEqual(timings['total'], timings['ttfb'])
+
+            site.reset()
+            self.assertTrue(site.check_status_code())
+            self.assertEqual(0, site.timings['connect'])
+            self.assertEqual(2, site.latency.count())
+        finally:
+            session.close()
+            server.shutdown()
+            server.server_close()
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    @patch('monitor.monitor_manager.get_yaml_config')
+    @patch('monitor.monitor_site.time')
+    @patch('monitor.monitor_site.get')
+    def test_slow_site_alerts(self, mock_requests, mock_time,
+                              mock_get_yaml_config, mock_slack_post_message):
+        mock_get_yaml_config.side_effect = [yaml.load(
+            "---\n"
+            "max_latency: 2\n"
+            "sites:\n"
+            "- url: http://example.com\n"
+            "- url: http://example.org\n"
+            "  max_latency: 5\n"), self.slack_config]
+        mock_requests.return_value.status_code = 200
+        mock_time.time.side_effect = [0.0, 3.0, 10.0, 13.0]
+
+        manager = MonitorManager()
+        manager.parse_config()
+        manager.pool.workers = 1
+
+        self.assertEqual(1, manager.check_sites())
+        manager.outbox.wait()
+        mock_slack_post_message.assert_called_once_with(
+            "Error at http://example.com. Expected response time within: "
+            "2.00s | Actual response time: 3.00s")
+
+
+if __name__ == '__main__':
+    unittest.main()
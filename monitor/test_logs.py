@@ -0,0 +1,138 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from Queue import Queue
+from mock import MagicMock, patch
+from monitor.check_result import CheckResult, TIMEOUT
+from monitor.logs import (BatchFileHandler, JsonFormatter, QueueHandler,
+                          QueueListener, CHECK_LOGGER, check_fields)
+from monitor.monitor_domain import MonitorDomain
+from monitor.monitor_manager import MonitorManager
+from monitor.monitor_site import MonitorSite
+
+
+class TestLogs(unittest.TestCase):
+    slack_config = {
+        'slack_api_token': '',
+        'slack_channel': '',
+        'slack_emote': '',
+        'slack_shoutout': '',
+        'slack_username': ''}
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'monitor.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def record(self, message, level=logging.INFO, **extra):
+        record = logging.LogRecord('monitor', level, __file__, 1, message,
+                                   None, None)
+        record.__dict__.update(extra)
+
+        return record
+
+    def test_check_fields(self):
+        site = MonitorSite("http://example.com")
+        site.timings = {'total': 0.25}
+        site.status_code = 503
+
+        self.assertEqual({
+            'target': u"site:http://example.com:200",
+            'type': 'site',
+            'url': "http://example.com",
+            'result': TIMEOUT,
+            'ok': False,
+            'latency': 0.25,
+            'status_code': 503}, check_fields(CheckResult(site, TIMEOUT)))
+
+        domain = check_fields(CheckResult(MonitorDomain("example.com")))
+
+        self.assertEqual(('domain', True, None),
+                         (domain['type'], domain['ok'], domain['latency']))
+        self.assertNotIn('status_code', domain)
+
+    def test_json_formatter(self):
+        line = JsonFormatter().format(self.record(
+            u"Down", logging.ERROR, check={'ok': False}))
+        entry = json.loads(line)
+
+        self.assertNotIn('\n', line)
+        self.assertEqual(u"ERROR", entry['level'])
+        self.assertEqual(u"Down", entry['message'])
+        self.assertEqual({'ok': False}, entry['check'])
+        self.assertIn('time', entry)
+
+    def test_full_queue_drops_records(self):
+        handler = QueueHandler(Queue(1))
+        handler.handle(self.record(u"first"))
+        handler.handle(self.record(u"second"))
+
+        self.assertEqual(1, handler.dropped)
+        self.assertEqual(u"first", handler.queue.get_nowait().msg)
+
+    def test_listener_writes_the_queue(self):
+        handler = BatchFileHandler(self.path, encoding='utf-8')
+        handler.setFormatter(JsonFormatter())
+        queue_handler = QueueHandler(Queue())
+        listener = QueueListener(queue_handler.queue, handler)
+        listener.start()
+
+        for index in range(3):
+            queue_handler.handle(self.record(u"Check",
+                                             check={'index': index}))
+
+        queue_handler.handle(self.record(u"Check \u2713"))
+        listener.stop()
+        handler.close()
+
+        with open(self.path) as log_file:
+            entries = [json.loads(line) for line in log_file]
+
+        self.assertEqual([0, 1, 2], [entry['check']['index']
+                                     for entry in entries[:3]])
+        self.assertEqual(u"Check \u2713", entries[3]['message'])
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    @patch('monitor.monitor_manager.get_yaml_config')
+    @patch('monitor.monitor_site.get')
+    def test_manager_logs_every_result(self, mock_requests,
+                                       mock_get_yaml_config, mock_slack):
+        mock_requests.return_value = MagicMock(status_code=200, history=[])
+        mock_get_yaml_config.side_effect = [
+            {'sites': [{'url': "http://example.com"},
+                       {'url': "http://example.org", 'status_code': 301}]},
+            self.slack_config]
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        check_logger = logging.getLogger(CHECK_LOGGER)
+        check_logger.addHandler(handler)
+        check_logger.setLevel(logging.INFO)
+
+        try:
+            manager = MonitorManager()
+            manager.parse_config()
+            manager.check_sites()
+            manager.close()
+        finally:
+            check_logger.removeHandler(handler)
+            check_logger.setLevel(logging.NOTSET)
+
+        by_url = dict((record.check['url'], record) for record in records)
+
+        self.assertEqual(2, len(records))
+        self.assertEqual(logging.INFO, by_url["http://example.com"].levelno)
+        self.assertTrue(by_url["http://example.com"].check['ok'])
+        self.assertEqual(logging.ERROR, by_url["http://example.org"].levelno)
+        self.assertEqual(u"unexpected",
+                         by_url["http://example.org"].check['result'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import unittest
+import urllib2
+import yaml
+
+from mock import MagicMock, patch
+from monitor.check_result import CheckResult, TIMEOUT, UNEXPECTED
+from monitor.metrics import Metrics, MetricsServer, labels
+from monitor.monitor_domain import MonitorDomain
+from monitor.monitor_manager import MonitorManager
+from monitor.monitor_site import MonitorSite
+
+
+class TestMetrics(unittest.TestCase):
+    slack_config = {
+        'slack_api_token': '',
+        'slack_channel': '',
+        'slack_emote': '',
+        'slack_shoutout': '',
+        'slack_username': ''}
+
+    def setUp(self):
+        self.site = MonitorSite("http://example.com")
+        self.site.status_code = 200
+        self.site.timings = {'connect': 0.0, 'tls': 0.0, 'ttfb': 0.1,
+                             'total': 0.1}
+
+    def test_labels_are_escaped(self):
+        self.assertEqual(u'{a="1",b="say \\"hi\\"\\n"}',
+                         labels(b=u'say "hi"\n', a=1))
+
+    def test_site_results(self):
+        metrics = Metrics(clock=lambda: 1000.0)
+
+        metrics.record(CheckResult(self.site))
+        self.site.timings['total'] = 3.0
+        metrics.record(CheckResult(self.site, UNEXPECTED, "Slow"))
+        text = metrics.render()
+
+        site = u'status_code="200",url="http://example.com"'
+        self.assertIn(u'monitor_site_up{' + site + u'} 0.0', text)
+        self.assertIn(u'monitor_site_status_code{' + site + u'} 200.0', text)
+        self.assertIn(u'monitor_site_checks_total{result="ok",' + site +
+                      u'} 1.0', text)
+        self.assertIn(u'monitor_site_checks_total{result="unexpected",' +
+                      site + u'} 1.0', text)
+        self.assertIn(u'monitor_site_last_check_timestamp_seconds{' + site +
+                      u'} 1000.0', text)
+        self.assertIn(u'monitor_site_latency_seconds_bucket{le="0.128",' +
+                      site + u'} 1.0', text)
+        self.assertIn(u'monitor_site_latency_seconds_bucket{le="+Inf",' +
+                      site + u'} 2.0', text)
+        self.assertIn(u'monitor_site_latency_seconds_sum{' + site + u'} 3.1',
+                      text)
+        self.assertIn(u'monitor_site_latency_seconds_count{' + site +
+                      u'} 2.0', text)
+
+    def test_domain_results(self):
+        metrics = Metrics()
+        domain = MonitorDomain("example.com")
+        domain.records = ['93.184.216.34']
+        domain.ttl = 300
+
+        metrics.record(CheckResult(domain))
+        metrics.record(CheckResult(domain, TIMEOUT, "Timed out"))
+        text = metrics.render()
+
+        domain = u'record_type="A",url="example.com"'
+        self.assertIn(u'monitor_domain_up{' + domain + u'} 0.0', text)
+        self.assertIn(u'monitor_domain_ttl_seconds{' + domain + u'} 300.0',
+                      text)
+        self.assertIn(u'monitor_domain_records{' + domain + u'} 1.0', text)
+        self.assertIn(u'monitor_domain_checks_total{record_type="A",'
+                      u'result="timeout",url="example.com"} 1.0', text)
+
+    def test_gauges_and_in_flight(self):
+        metrics = Metrics()
+        metrics.add_gauge(u"monitor_queue_depth", u"Queued.", lambda: 7)
+        metrics.check_started()
+        metrics.check_started()
+        metrics.check_finished()
+        metrics.record_sweep('sites', 1.5)
+        text = metrics.render()
+
+        self.assertIn(u'\nmonitor_queue_depth 7.0\n', text)
+        self.assertIn(u'\nmonitor_checks_in_flight 1.0\n', text)
+        self.assertIn(u'\nmonitor_sweep_duration_seconds{kind="sites"} 1.5\n',
+                      text)
+
+    def test_server(self):
+        metrics = Metrics()
+        metrics.record(CheckResult(self.site))
+        server = MetricsServer(metrics, 0)
+        server.start()
+        url = "http://127.0.0.1:{port}".format(port=server.server_port)
+
+        try:
+            response = urllib2.urlopen(url + "/metrics", timeout=5)
+
+            self.assertTrue(response.info()['Content-Type'].startswith(
+                'text/plain; version=0.0.4'))
+            self.assertIn('monitor_site_up{', response.read())
+
+            with self.assertRaises(urllib2.HTTPError) as raised:
+                urllib2.urlopen(url + "/", timeout=5)
+
+            self.assertEqual(404, raised.exception.code)
+        finally:
+            server.close()
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    @patch('monitor.monitor_manager.get_yaml_config')
+    @patch('monitor.monitor_site.get')
+    def test_scraping_never_checks(self, mock_requests, mock_get_yaml_config,
+                                   mock_slack_post_message):
+        mock_get_yaml_config.side_effect = [yaml.load(
+            "---\n"
+            "sites:\n"
+            "- url: http://example.com\n"
+            "- url: http://example.org\n"), self.slack_config]
+        mock_requests.return_value = MagicMock(status_code=200, history=[])
+
+        manager = MonitorManager()
+        manager.parse_config()
+
+        self.assertEqual(0, manager.check_sites())
+        self.assertEqual(2, mock_requests.call_count)
+
+        text = manager.metrics.render()
+        manager.metrics.render()
+        manager.close()
+
+        self.assertEqual(2, mock_requests.call_count)
+        self.assertIn(u'monitor_site_up{status_code="200",'
+                      u'url="http://example.org"} 1.0', text)
+        self.assertIn(u'\nmonitor_checks_in_flight 0.0\n', text)
+        self.assertIn(u'\nmonitor_slack_queue_depth 0.0\n', text)
+        self.assertIn(u'monitor_sweep_duration_seconds{kind="sites"}', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
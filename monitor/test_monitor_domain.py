@@ -0,0 +1,122 @@
+import unittest
+
+import dns.rrset
+from mock import patch
+from monitor.monitor_domain import MonitorDomain, build_resolver
+
+
+class FakeClock(object):
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeAnswer(object):
+    def __init__(self, record_type, ttl, *values):
+        self.rrset = dns.rrset.from_text('example.com.', ttl, 'IN',
+                                         record_type, *values)
+
+    def __iter__(self):
+        return iter(self.rrset)
+
+
+class TestMonitorDomain(unittest.TestCase):
+    @patch('monitor.monitor_domain.query')
+    def test_a_records_default(self, mock_query):
+        mock_query.return_value = FakeAnswer('A', 300, '93.184.216.34')
+        resolver = build_resolver()
+
+        domain = MonitorDomain('example.com', resolver=resolver)
+
+        self.assertTrue(domain.check_domain())
+        self.assertEqual('A', domain.record_type)
+        self.assertEqual([u'93.184.216.34'], domain.records)
+        self.assertEqual(300, domain.ttl)
+        mock_query.assert_called_once_with('example.com', 'A',
+                                           resolver=resolver)
+
+    @patch('monitor.monitor_domain.query')
+    def test_address_is_looked_up_in_reverse(self, mock_query):
+        mock_query.return_value = FakeAnswer('PTR', 300, 'dns.google.')
+
+        domain = MonitorDomain('8.8.8.8', value='DNS.google.')
+
+        self.assertTrue(domain.check_domain())
+        self.assertEqual('PTR', domain.record_type)
+        self.assertEqual('8.8.8.8.in-addr.arpa.',
+                         mock_query.call_args[0][0].to_text())
+
+    @patch('monitor.monitor_domain.query')
+    def test_expected_value(self, mock_query):
+        mock_query.return_value = FakeAnswer('AAAA', 300, '2001:db8::1',
+                                             '2001:db8::2')
+
+        domain = MonitorDomain('example.com', record_type='aaaa',
+                               value='2001:db8::2')
+        self.assertTrue(domain.check_domain())
+
+        domain = MonitorDomain('example.com', record_type='AAAA',
+                               value='2001:db8::3')
+        self.assertFalse(domain.check_domain())
+        self.assertEqual(
+            "Error at example.com. Expected AAAA record: 2001:db8::3 | "
+            "Actual AAAA records: 2001:db8::1, 2001:db8::2",
+            domain.create_slack_message())
+
+    @patch('monitor.monitor_domain.query')
+    def test_expected_value_set(self, mock_query):
+        mock_query.return_value = FakeAnswer('MX', 300,
+                                             '10 mx1.example.com.',
+                                             '20 mx2.example.com.')
+
+        domain = MonitorDomain('example.com', record_type='MX',
+                               values=['mx2.example.com', 'mx1.example.com'])
+        self.assertTrue(domain.check_domain())
+        self.assertEqual([u'mx1.example.com', u'mx2.example.com'],
+                         domain.records)
+
+        domain = MonitorDomain('example.com', record_type='MX',
+                               values=['mx1.example.com'])
+        self.assertFalse(domain.check_domain())
+
+    @patch('monitor.monitor_domain.query')
+    def test_cname_and_ttl_floor(self, mock_query):
+        mock_query.return_value = FakeAnswer('CNAME', 60, 'www.example.net.')
+
+        domain = MonitorDomain('example.com', record_type='CNAME',
+                               value='www.example.net', min_ttl=300)
+
+        self.assertFalse(domain.check_domain())
+        self.assertEqual("Error at example.com. Expected TTL of at least: "
+                         "300 | Actual TTL: 60",
+                         domain.create_slack_message())
+
+    def test_unsupported_record_type(self):
+        self.assertRaises(ValueError, MonitorDomain, 'example.com',
+                          record_type='SRV')
+
+    @patch('monitor.monitor_domain.query')
+    def test_answer_cached_within_ttl(self, mock_query):
+        mock_query.return_value = FakeAnswer('A', 300, '93.184.216.34')
+        clock = FakeClock()
+
+        domain = MonitorDomain('example.com', clock=clock)
+
+        self.assertTrue(domain.check_domain())
+        clock.now += 299
+        self.assertTrue(domain.check_domain())
+        self.assertEqual(1, mock_query.call_count)
+
+        clock.now += 1
+        self.assertTrue(domain.check_domain())
+        self.assertEqual(2, mock_query.call_count)
+
+        domain.reset()
+        self.assertTrue(domain.check_domain())
+        self.assertEqual(3, mock_query.call_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
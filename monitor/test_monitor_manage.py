@@ -1,13 +1,18 @@
 import unittest
 import yaml
 
-from mock import patch
+from mock import MagicMock, patch
 from monitor.monitor_manager import (MonitorManager, MalformedConfig,
                                      NoConfigFound)
 from monitor.monitor_site import MonitorSite
 from monitor.monitor_domain import MonitorDomain
 from monitor.parse_yaml import get_yaml_config
-from requests.exceptions import ConnectionError, MissingSchema
+from monitor.check_result import (OK, UNEXPECTED, CONNECTION_ERROR,
+                                  INVALID_URL, TIMEOUT, NXDOMAIN_ERROR)
+from dns.exception import Timeout as DNSTimeout
+from dns.resolver import NXDOMAIN
+from requests.exceptions import (ConnectionError, ConnectTimeout,
+                                 MissingSchema, ReadTimeout)
 from yaml.composer import ComposerError
 from yaml.parser import ParserError
 from yaml.scanner import ScannerError
@@ -153,6 +158,7 @@ class TestMonitorManager(unittest.TestCase):
         manager.parse_config()
 
         manager.check_domains()
+        manager.outbox.wait()
 
         sites = manager.sites
 
@@ -213,6 +219,7 @@ class TestMonitorManager(unittest.TestCase):
         manager = MonitorManager()
         manager.parse_config()
         manager.check_sites()
+        manager.outbox.wait()
 
         # Called twice because yaml_config4 has two sites in it
         self.assertEqual(2, mock_slack.call_count)
@@ -224,6 +231,7 @@ class TestMonitorManager(unittest.TestCase):
         manager = MonitorManager()
         manager.parse_config()
         manager.check_sites()
+        manager.outbox.wait()
 
         # Called six times because yaml_config5 has four sites plus the
         #   previous two
@@ -240,6 +248,7 @@ class TestMonitorManager(unittest.TestCase):
         manager = MonitorManager()
         manager.parse_config()
         manager.check_sites()
+        manager.outbox.wait()
 
         self.assertEqual(1, mock_slack.call_count)
 
@@ -302,7 +311,7 @@ class TestMonitorManager(unittest.TestCase):
     def test_malformed_config_file_raises_composer_error(self, mock_open):
         """Attempts to read from a malformed config file
         """
-        mock_open.return_value.__enter__.return_value = \
+        mock_open.return_value.__enter__.return_value.read.return_value = \
             self.yaml_config_malformed
 
         self.assertRaises(ComposerError, yaml.load, self.yaml_config_malformed)
@@ -313,7 +322,7 @@ class TestMonitorManager(unittest.TestCase):
     def test_malformed_config_file_raises_scanner_error(self, mock_open):
         """Attempts to read from a malformed config file
         """
-        mock_open.return_value.__enter__.return_value = \
+        mock_open.return_value.__enter__.return_value.read.return_value = \
             self.yaml_config_malformed2
 
         self.assertRaises(ScannerError, yaml.load, self.yaml_config_malformed2)
@@ -324,7 +333,7 @@ class TestMonitorManager(unittest.TestCase):
     def test_malformed_config_file_raises_parser_error(self, mock_open):
         """Attempts to read from a malformed config file
         """
-        mock_open.return_value.__enter__.return_value = \
+        mock_open.return_value.__enter__.return_value.read.return_value = \
             self.yaml_config_malformed3
 
         self.assertRaises(ParserError, yaml.load, self.yaml_config_malformed3)
@@ -346,6 +355,7 @@ class TestMonitorManager(unittest.TestCase):
         response_status_code = manager.sites[0].expected_status_code
         mock_requests.return_value.status_code = response_status_code
         manager.check_sites()
+        manager.outbox.wait()
 
         mock_slack_post_message.assert_not_called()
 
@@ -364,6 +374,7 @@ class TestMonitorManager(unittest.TestCase):
         response_status_code = manager.sites[0].expected_status_code + 1
         mock_requests.return_value.status_code = response_status_code
         manager.check_sites()
+        manager.outbox.wait()
 
         mock_slack_post_message.assert_called_once()
 
@@ -388,6 +399,7 @@ class TestMonitorManager(unittest.TestCase):
         mock_requests.return_value.status_code = response_status_code
 
         manager.check_sites()
+        manager.outbox.wait()
 
         mock_slack_post_message.assert_not_called()
 
@@ -408,6 +420,7 @@ class TestMonitorManager(unittest.TestCase):
         response_status_code = manager.sites[0].expected_status_code + 1
         mock_requests.get.return_value.status_code = response_status_code
         manager.check_sites()
+        manager.outbox.wait()
 
         self.assertEqual(2, mock_slack_post_message.call_count)
 
@@ -430,6 +443,7 @@ class TestMonitorManager(unittest.TestCase):
             response_status_code
 
         manager.check_sites()
+        manager.outbox.wait()
 
         mock_slack_post_message.assert_not_called()
 
@@ -453,6 +467,7 @@ class TestMonitorManager(unittest.TestCase):
             response_status_code
 
         manager.check_sites()
+        manager.outbox.wait()
 
         mock_slack_post_message.assert_not_called()
 
@@ -476,6 +491,7 @@ class TestMonitorManager(unittest.TestCase):
             response_status_code
 
         manager.check_sites()
+        manager.outbox.wait()
 
         mock_slack_post_message.assert_not_called()
 
@@ -499,9 +515,169 @@ class TestMonitorManager(unittest.TestCase):
             response_status_code
 
         manager.check_sites()
+        manager.outbox.wait()
 
         self.assertEqual(1, mock_slack_post_message.call_count)
 
+    @patch('monitor.monitor_manager.Slack.post_message')
+    @patch('monitor.monitor_manager.get_yaml_config')
+    @patch('monitor.monitor_site.get')
+    def test_site_errors_are_isolated(self, mock_requests,
+                                      mock_get_yaml_config,
+                                      mock_slack_post_message):
+        """A site raising an error must not stop the remaining sites being
+        checked, and every failing site is reported.
+        """
+        mock_get_yaml_config.side_effect = [
+            yaml.load(self.yaml_config5), self.slack_config]
+
+        ok_response = mock_requests.return_value
+        ok_response.status_code = 200
+        ok_response.history = []
+        mock_requests.side_effect = [ConnectionError("refused"),
+                                     MissingSchema("no schema"),
+                                     ok_response,
+                                     ConnectTimeout("slow")]
+
+        manager = MonitorManager()
+        manager.parse_config()
+        manager.pool.workers = 1
+
+        self.assertEqual(3, manager.check_sites())
+        manager.outbox.wait()
+        self.assertEqual(3, mock_slack_post_message.call_count)
+
+        results = manager.site_results
+        self.assertEqual([CONNECTION_ERROR, INVALID_URL, OK, TIMEOUT],
+                         [result.error_type for result in results])
+        self.assertEqual("Error at example.fr. refused", results[0].message)
+        self.assertEqual(manager.sites, [result.target for result in results])
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    @patch('monitor.monitor_manager.get_yaml_config')
+    @patch('monitor.monitor_site.get')
+    def test_site_unexpected_status_result(self, mock_requests,
+                                           mock_get_yaml_config,
+                                           mock_slack_post_message):
+        mock_get_yaml_config.side_effect = [
+            yaml.load(self.yaml_config_single_site), self.slack_config]
+        mock_requests.return_value.status_code = 503
+
+        manager = MonitorManager()
+        manager.parse_config()
+
+        self.assertEqual(1, manager.check_sites())
+        manager.outbox.wait()
+        self.assertEqual(UNEXPECTED, manager.site_results[0].error_type)
+        mock_slack_post_message.assert_called_once_with(
+            "Error at example.com. Expected status code expected: 200 | "
+            "Actual status code: 503")
+
+    @patch('monitor.monitor_manager.get_yaml_config')
+    def test_sites_share_session(self, mock_get_yaml_config):
+        config = yaml.load(self.yaml_config_multiple_sites)
+        config['pool_size'] = 4
+        config['sites'][1]['keep_alive'] = False
+        mock_get_yaml_config.side_effect = [config, self.slack_config]
+
+        manager = MonitorManager()
+        manager.parse_config()
+        session = manager.session
+
+        self.assertIs(session, manager.sites[0].session)
+        self.assertEqual(None, manager.sites[1].session)
+        self.assertEqual(
+            4, session.get_adapter('http://example.com')._pool_maxsize)
+
+        # The session survives a reparse, so connections stay warm.
+        manager.parse_config()
+        self.assertIs(session, manager.sites[0].session)
+
+        manager.close()
+        self.assertEqual(None, manager.session)
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    @patch('monitor.monitor_manager.get_yaml_config')
+    def test_site_timings(self, mock_get_yaml_config, mock_slack):
+        """Sites use their own interval and timeouts when set, and the global
+        defaults otherwise.
+        """
+        config = yaml.load(self.yaml_config_multiple_sites)
+        config.update({'interval': 300, 'read_timeout': 20})
+        config['sites'][0].update({'interval': 15, 'connect_timeout': 1,
+                                   'read_timeout': 2.5})
+        mock_get_yaml_config.side_effect = [config, self.slack_config]
+
+        manager = MonitorManager()
+        manager.parse_config()
+
+        self.assertEqual(15, manager.sites[0].interval)
+        self.assertEqual((1, 2.5), manager.sites[0].timeout)
+        self.assertEqual(300, manager.sites[1].interval)
+        self.assertEqual((10, 20), manager.sites[1].timeout)
+        self.assertEqual(0, mock_slack.call_count)
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    @patch('monitor.monitor_manager.get_yaml_config')
+    def test_site_body_checks(self, mock_get_yaml_config, mock_slack):
+        mock_get_yaml_config.side_effect = [yaml.load(
+            "---\n"
+            "sites:\n"
+            "- url: http://example.com\n"
+            "  body_contains: Welcome\n"
+            "  body_max_bytes: 4096\n"
+            "- url: http://example.org\n"
+            "- url: http://example.net\n"
+            "  probe: head\n"
+            "  body_lacks: Error\n"), self.slack_config]
+
+        manager = MonitorManager()
+        manager.parse_config()
+
+        self.assertEqual(2, len(manager.sites))
+        self.assertEqual(['Welcome'], manager.sites[0].body.contains)
+        self.assertEqual(4096, manager.sites[0].body.max_bytes)
+        self.assertEqual(None, manager.sites[1].body)
+        mock_slack.assert_called_once_with(
+            u"ValueError: Check the probe field in your config.yaml, it must "
+            u"be stream or get to check the body!")
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    @patch('monitor.monitor_manager.get_yaml_config')
+    def test_site_invalid_timings(self, mock_get_yaml_config, mock_slack):
+        config = yaml.load(self.yaml_config_multiple_sites)
+        config['sites'][0]['interval'] = 'often'
+        config['sites'][1]['read_timeout'] = -1
+        mock_get_yaml_config.side_effect = [config, self.slack_config]
+
+        manager = MonitorManager()
+        manager.parse_config()
+
+        self.assertEqual([], manager.sites)
+        self.assertEqual(2, mock_slack.call_count)
+        mock_slack.assert_called_with(
+            u"ValueError: Check the read_timeout field in your config.yaml, "
+            u"it must be a positive number of seconds!")
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    @patch('monitor.monitor_manager.get_yaml_config')
+    @patch('monitor.monitor_site.get')
+    def test_site_timeout_reported_once(self, mock_requests,
+                                        mock_get_yaml_config,
+                                        mock_slack_post_message):
+        mock_get_yaml_config.side_effect = [
+            yaml.load(self.yaml_config_single_site), self.slack_config]
+        mock_requests.side_effect = ReadTimeout("Read timed out.")
+
+        manager = MonitorManager()
+        manager.parse_config()
+
+        self.assertEqual(1, manager.check_sites())
+        manager.outbox.wait()
+        mock_slack_post_message.assert_called_once_with(
+            u"Error at example.com. Read timed out.")
+        self.assertEqual(TIMEOUT, manager.site_results[0].error_type)
+
 
 class TestMonitorManagerDomains(unittest.TestCase):
     slack_config = {
@@ -547,7 +723,10 @@ class TestMonitorManagerDomains(unittest.TestCase):
             self.assertTrue(isinstance(domain, MonitorDomain))
 
         # 0 errors expected
-        self.assertEqual(0, manager.check_domains())
+        error_count = manager.check_domains()
+        manager.outbox.wait()
+
+        self.assertEqual(0, error_count)
         self.assertEqual(1, len(manager.domains))
         self.assertEqual(0, mock_slack.call_count)
         self.assertEqual('8.8.8.8', domains[0].url)
@@ -561,7 +740,10 @@ class TestMonitorManagerDomains(unittest.TestCase):
         manager.parse_config()
 
         # 0 errors expected
-        self.assertEqual(0, manager.check_domains())
+        error_count = manager.check_domains()
+        manager.outbox.wait()
+
+        self.assertEqual(0, error_count)
         self.assertEqual(3, len(manager.domains))
         self.assertEqual(0, mock_slack.call_count)
 
@@ -578,6 +760,85 @@ class TestMonitorManagerDomains(unittest.TestCase):
 
         self.assertEqual([], domains)
 
+    @patch('monitor.monitor_manager.Slack.post_message')
+    @patch('monitor.monitor_manager.get_yaml_config')
+    def test_domain_invalid_min_ttl(self, mock_get_yaml_config, mock_slack):
+        config = yaml.load(self.yaml_config_multi)
+        config['domains'][0]['min_ttl'] = 'long'
+        config['domains'][1]['min_ttl'] = 300
+        mock_get_yaml_config.side_effect = [config, self.slack_config]
+
+        manager = MonitorManager()
+        manager.parse_config()
+
+        self.assertEqual(2, len(manager.domains))
+        self.assertEqual(300, manager.domains[0].min_ttl)
+        mock_slack.assert_called_once_with(
+            u"ValueError: Check the min_ttl field in your config.yaml, "
+            u"it must be a positive number of seconds!")
+
+    @patch('monitor.monitor_manager.get_yaml_config')
+    def test_domains_share_resolver(self, mock_get_yaml_config):
+        config = yaml.load(self.yaml_config_multi)
+        config.update({'dns_nameservers': ['10.0.0.1', '10.0.0.2'],
+                       'dns_timeout': 1, 'dns_lifetime': 3,
+                       'dns_workers': 7})
+        mock_get_yaml_config.side_effect = [config, self.slack_config]
+
+        manager = MonitorManager()
+        manager.parse_config()
+        resolver = manager.resolver
+
+        self.assertEqual([u'10.0.0.1', u'10.0.0.2'], resolver.nameservers)
+        self.assertEqual(1.0, resolver.timeout)
+        self.assertEqual(3.0, resolver.lifetime)
+        self.assertEqual(7, manager.dns_pool.workers)
+
+        for domain in manager.domains:
+            self.assertIs(resolver, domain.resolver)
+
+    @patch('monitor.monitor_domain.Resolver.query')
+    @patch('monitor.monitor_manager.get_yaml_config')
+    def test_domain_records_are_recorded(self, mock_get_yaml_config,
+                                         mock_query):
+        mock_get_yaml_config.side_effect = [yaml.load(self.yaml_config_multi),
+                                            self.slack_config]
+        answer = MagicMock()
+        answer.__iter__.return_value = [MagicMock(**{'to_text.return_value':
+                                                     '93.184.216.34'})]
+        answer.rrset.ttl = 300
+        mock_query.return_value = answer
+
+        manager = MonitorManager()
+        manager.parse_config()
+
+        self.assertEqual(0, manager.check_domains())
+        mock_query.assert_called_with('example.org', 'A')
+
+        for domain in manager.domains:
+            self.assertEqual(['93.184.216.34'], domain.records)
+            self.assertEqual(300, domain.ttl)
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    @patch('monitor.monitor_domain.query')
+    @patch('monitor.monitor_manager.get_yaml_config')
+    def test_domain_errors_are_isolated(self, mock_get_yaml_config,
+                                        mock_query, mock_slack):
+        mock_get_yaml_config.side_effect = [yaml.load(self.yaml_config_multi),
+                                            self.slack_config]
+        mock_query.side_effect = [DNSTimeout(), MagicMock(), NXDOMAIN()]
+
+        manager = MonitorManager()
+        manager.parse_config()
+        manager.dns_pool.workers = 1
+
+        self.assertEqual(2, manager.check_domains())
+        manager.outbox.wait()
+        self.assertEqual(2, mock_slack.call_count)
+        self.assertEqual([TIMEOUT, OK, NXDOMAIN_ERROR],
+                         [result.error_type
+                          for result in manager.domain_results])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,12 +1,58 @@
+import threading
 import unittest
 
-from mock import patch
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+from mock import MagicMock, PropertyMock, patch
 from requests.exceptions import MissingSchema, ReadTimeout
 
-from monitor.monitor_site import MonitorSite
+from monitor.http_session import build_session
+from monitor.monitor_site import MonitorSite, DRAIN_LIMIT
 from slack.slack import Slack
 
 
+class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    clients = set()
+
+    def do_GET(self):
+        self.clients.add(self.client_address)
+        threading.Event().wait(0.05)
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class RedirectHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    clients = set()
+    redirects = {'/a': (301, '/b'), '/b': (302, '/c')}
+
+    def do_GET(self):
+        self.clients.add(self.client_address)
+        status_code, location = self.redirects.get(self.path, (200, None))
+
+        self.send_response(status_code)
+
+        if location is not None:
+            self.send_header('Location', location)
+
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write('ok')
+
+    def log_message(self, *args):
+        pass
+
+
 class TestMonitorSite(unittest.TestCase):
     slack_config = {
         'slack_api_token': '',
@@ -134,6 +180,9 @@ class TestMonitorSite(unittest.TestCase):
     @patch('monitor.monitor_site.get')
     def test_get_status_code_timeout(self, mock_requests,
                                      mock_slack_post_message):
+        """A timeout is raised for the manager to report, rather than being
+        posted to Slack by the site itself.
+        """
         mock_requests.side_effect = ReadTimeout
 
         url = "http://example.com"
@@ -143,13 +192,195 @@ class TestMonitorSite(unittest.TestCase):
                               expected_status_code=expected_status_code,
                               slack=Slack(self.slack_config))
 
-        monitor.get_status_code()
-        self.assertEqual(1, mock_slack_post_message.call_count)
+        self.assertRaises(ReadTimeout, monitor.get_status_code)
 
         status_code = monitor.status_code
         self.assertNotEqual(expected_status_code, status_code)
 
-        output = monitor.check_status_code()
-        self.assertEqual(False, output)
+        self.assertRaises(ReadTimeout, monitor.check_status_code)
+
+        mock_slack_post_message.assert_not_called()
+
+    @patch('monitor.monitor_site.get')
+    def test_get_uses_shared_session(self, mock_requests):
+        mock_requests.return_value.status_code = 200
+        session = build_session()
+
+        monitor = MonitorSite(url="http://example.com", session=session)
+        monitor.get_status_code()
+
+        mock_requests.assert_called_once_with(url="http://example.com",
+                                              session=session,
+                                              timeout=(10.0, 10.0),
+                                              stream=True)
+
+    @patch('monitor.monitor_site.get')
+    def test_get_without_keep_alive_is_cold(self, mock_requests):
+        mock_requests.return_value.status_code = 200
+
+        monitor = MonitorSite(url="http://example.com",
+                              session=build_session(), keep_alive=False)
+        monitor.get_status_code()
+
+        self.assertEqual(None, monitor.session)
+        mock_requests.assert_called_once_with(url="http://example.com",
+                                              session=None,
+                                              timeout=(10.0, 10.0),
+                                              stream=True)
 
-        self.assertEqual(2, mock_slack_post_message.call_count)
+    @patch('monitor.monitor_site.get')
+    def test_large_body_is_not_downloaded(self, mock_requests):
+        response = MagicMock(status_code=200, history=[],
+                             headers={'Content-Length': '5000000'})
+        content = PropertyMock()
+        type(response).content = content
+        mock_requests.return_value = response
+
+        self.assertTrue(MonitorSite("http://example.com").check_status_code())
+        self.assertTrue(mock_requests.call_args[1]['stream'])
+        response.close.assert_called_once_with()
+        content.assert_not_called()
+
+    @patch('monitor.monitor_site.get')
+    def test_small_body_is_read_to_reuse_connection(self, mock_requests):
+        response = MagicMock(status_code=200, history=[],
+                             headers={'Content-Length': str(DRAIN_LIMIT)})
+        content = PropertyMock()
+        type(response).content = content
+        mock_requests.return_value = response
+
+        self.assertTrue(MonitorSite("http://example.com").check_status_code())
+        content.assert_called_once_with()
+        response.close.assert_not_called()
+
+    @patch('monitor.monitor_site.get')
+    @patch('monitor.monitor_site.head')
+    def test_head_probe(self, mock_head, mock_get):
+        mock_head.return_value.status_code = 200
+
+        monitor = MonitorSite("http://example.com", probe='HEAD')
+
+        self.assertTrue(monitor.check_status_code())
+        mock_head.assert_called_once_with(url="http://example.com",
+                                          session=None, timeout=(10.0, 10.0))
+        mock_get.assert_not_called()
+
+    @patch('monitor.monitor_site.get')
+    def test_range_probe(self, mock_requests):
+        mock_requests.return_value.status_code = 206
+
+        monitor = MonitorSite("http://example.com", probe='range')
+
+        self.assertTrue(monitor.check_status_code())
+        self.assertEqual(200, monitor.status_code)
+        self.assertEqual({'Range': 'bytes=0-0'},
+                         mock_requests.call_args[1]['headers'])
+
+    @patch('monitor.monitor_site.get')
+    def test_get_probe_downloads_body(self, mock_requests):
+        mock_requests.return_value.status_code = 200
+
+        MonitorSite("http://example.com", probe='get').check_status_code()
+
+        self.assertNotIn('stream', mock_requests.call_args[1])
+        mock_requests.return_value.close.assert_not_called()
+
+    def test_invalid_probe(self):
+        with self.assertRaises(ValueError) as raised:
+            MonitorSite("http://example.com", probe='options')
+
+        self.assertEqual(
+            u"ValueError: Check the probe field in your config.yaml, it must "
+            u"be one of stream, head, range, get!", unicode(raised.exception))
+
+    def test_build_session_pool_sizes(self):
+        session = build_session(pool_hosts=5, pool_size=3)
+
+        for prefix in ('http://', 'https://'):
+            adapter = session.get_adapter(prefix + 'example.com')
+            self.assertEqual(5, adapter._pool_connections)
+            self.assertEqual(3, adapter._pool_maxsize)
+
+        self.assertEqual((), session.cookies._policy.allowed_domains())
+
+    def test_session_limits_connections_per_host(self):
+        """More concurrent checks than the pool size share its connections
+        instead of opening extra ones.
+        """
+        server = ThreadedHTTPServer(('127.0.0.1', 0), SlowHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        session = build_session(pool_size=2)
+        url = "http://127.0.0.1:{port}/".format(port=server.server_port)
+
+        try:
+            checks = [threading.Thread(
+                target=MonitorSite(url, session=session).check_status_code)
+                for _ in range(6)]
+
+            for check in checks:
+                check.start()
+            for check in checks:
+                check.join(5)
+
+            self.assertEqual(2, len(SlowHandler.clients))
+        finally:
+            session.close()
+            server.shutdown()
+            server.server_close()
+
+    def test_redirect_chain(self):
+        """Each hop is fetched once over the same kept-alive connection, and
+        checking stops at the first hop which isn't as expected.
+        """
+        server = ThreadedHTTPServer(('127.0.0.1', 0), RedirectHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        session = build_session()
+        base = "http://127.0.0.1:{port}".format(port=server.server_port)
+
+        try:
+            site = MonitorSite(base + "/a", session=session, redirects=[
+                301, {'status_code': 302, 'location': base + "/c"}])
+
+            self.assertTrue(site.check_status_code())
+            self.assertEqual([301, 302, 200],
+                             [hop['status_code'] for hop in site.hops])
+            self.assertEqual([base + "/b", base + "/c", None],
+                             [hop['location'] for hop in site.hops])
+            self.assertEqual(1, len(RedirectHandler.clients))
+
+            site = MonitorSite(base + "/a", session=session,
+                               redirects=[302, 302])
+
+            self.assertFalse(site.check_status_code())
+            self.assertEqual(1, len(site.hops))
+            self.assertEqual(
+                u"Error at {base}/a. Expected redirect 1: 302 | Actual "
+                u"redirect 1: 301 to {base}/b".format(base=base),
+                site.create_slack_message())
+
+            site = MonitorSite(base + "/a", session=session, max_redirects=3)
+            self.assertTrue(site.check_status_code())
+            self.assertEqual(3, len(site.hops))
+
+            site = MonitorSite(base + "/a", session=session, max_redirects=1)
+            self.assertFalse(site.check_status_code())
+            self.assertEqual(
+                u"Error at {base}/a. Expected at most 1 redirects | Actual "
+                u"redirects: more".format(base=base),
+                site.create_slack_message())
+        finally:
+            session.close()
+            server.shutdown()
+            server.server_close()
+
+    def test_invalid_redirects(self):
+        self.assertRaises(ValueError, MonitorSite, "http://example.com",
+                          redirects=[[301]])
+        self.assertRaises(ValueError, MonitorSite, "http://example.com",
+                          redirects=[301, 302], max_redirects=1)
+        self.assertRaises(ValueError, MonitorSite, "http://example.com",
+                          max_redirects='lots')
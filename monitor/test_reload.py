@@ -0,0 +1,203 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import yaml
+
+from mock import MagicMock, patch
+from monitor import parse_yaml
+from monitor.check_result import CheckResult
+from monitor.monitor_manager import MonitorManager
+from monitor.parse_yaml import get_yaml_config
+
+
+class TestReload(unittest.TestCase):
+    slack_config = (
+        "---\n"
+        "slack_api_token: ''\n"
+        "slack_channel: ''\n"
+        "slack_emote: ''\n"
+        "slack_shoutout: ''\n"
+        "slack_username: ''\n")
+
+    yaml_config = (
+        "---\n"
+        "sites:\n"
+        "- url: http://example.com\n"
+        "- url: http://example.org\n"
+        "  status_code: 301\n"
+        "domains:\n"
+        "- domain: example.com\n")
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.config_file = os.path.join(self.directory, 'config.yaml')
+        self.slack_config_file = os.path.join(self.directory,
+                                              'slack_config.yaml')
+        self.write(self.slack_config_file, self.slack_config)
+        self.write(self.config_file, self.yaml_config)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, path, content):
+        with open(path, 'w') as config_file:
+            config_file.write(content)
+
+    def manager(self):
+        manager = MonitorManager(config_file=self.config_file,
+                                 slack_config_file=self.slack_config_file)
+        manager.parse_config()
+
+        return manager
+
+    @patch('monitor.parse_yaml.load', wraps=yaml.load)
+    def test_unchanged_file_is_not_parsed_again(self, mock_load):
+        first = get_yaml_config(self.config_file)
+        second = get_yaml_config(self.config_file)
+
+        self.assertIs(first, second)
+        self.assertEqual(1, mock_load.call_count)
+        self.assertIs(parse_yaml.SafeLoader, mock_load.call_args[1]['Loader'])
+
+        self.write(self.config_file, self.yaml_config + "workers: 5\n")
+
+        self.assertEqual(5, get_yaml_config(self.config_file)['workers'])
+        self.assertEqual(2, mock_load.call_count)
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    def test_reload_unchanged(self, mock_slack):
+        manager = self.manager()
+        targets = list(manager.targets.values())
+
+        self.assertEqual([], manager.reload())
+        self.assertEqual(targets, list(manager.targets.values()))
+        manager.close()
+
+        mock_slack.assert_not_called()
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    def test_reload_only_touches_changed_targets(self, mock_slack):
+        manager = self.manager()
+        com, org = manager.sites
+        domain = manager.domains[0]
+        manager.metrics.record(CheckResult(com))
+        manager.metrics.record(CheckResult(org))
+
+        self.write(self.config_file, (
+            "---\n"
+            "sites:\n"
+            "- url: http://example.org\n"
+            "  status_code: 301\n"
+            "- url: http://example.net\n"
+            "domains:\n"
+            "- domain: example.com\n"))
+        added = manager.reload()
+        manager.close()
+
+        self.assertEqual(["http://example.net"],
+                         [target.url for target in added])
+        self.assertEqual([org, added[0]], manager.sites)
+        self.assertEqual([domain], manager.domains)
+        self.assertEqual(set([org, added[0], domain]), manager.active)
+        self.assertEqual([('site', "http://example.org", 301)],
+                         list(manager.metrics.targets))
+        mock_slack.assert_not_called()
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    def test_reload_rebuilds_targets_inheriting_changed_settings(
+            self, mock_slack):
+        manager = self.manager()
+        sites = list(manager.sites)
+
+        self.write(self.config_file,
+                   self.yaml_config.replace("---\n", "---\ninterval: 30\n"))
+        added = manager.reload()
+        manager.close()
+
+        self.assertEqual(3, len(added))
+        self.assertEqual([30, 30], [site.interval for site in manager.sites])
+        self.assertFalse(set(sites) & manager.active)
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    def test_malformed_reload_keeps_targets(self, mock_slack):
+        manager = self.manager()
+        sites = list(manager.sites)
+
+        self.write(self.config_file, "sites: [\n")
+
+        self.assertEqual([], manager.reload())
+        self.assertEqual(sites, manager.sites)
+        manager.close()
+
+        mock_slack.assert_called_once_with(
+            u"A malformed config file has been found. Please check the "
+            u"formatting of your config.yaml file.")
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    def test_invalid_entries(self, mock_slack):
+        self.write(self.config_file, (
+            "---\n"
+            "sites:\n"
+            "- http://example.com\n"
+            "- url: http://example.org\n"))
+        manager = self.manager()
+        manager.close()
+
+        self.assertEqual(["http://example.org"],
+                         [site.url for site in manager.sites])
+        mock_slack.assert_called_once_with(
+            u"ValueError: Check the sites field in your config.yaml, each "
+            u"entry must be a mapping!")
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    @patch('monitor.monitor_site.get')
+    def test_daemon_reloads_changed_config(self, mock_requests, mock_slack):
+        self.write(self.config_file, (
+            "---\n"
+            "interval: 0.05\n"
+            "reload_interval: 0.05\n"
+            "sites:\n"
+            "- url: http://example.com\n"))
+        lock = threading.Lock()
+        stop = threading.Event()
+        calls = []
+
+        def check(url, **kwargs):
+            with lock:
+                calls.append(url)
+
+                if url == "http://example.com" and \
+                        calls.count(url) == 2:
+                    self.write(self.config_file, (
+                        "---\n"
+                        "interval: 0.05\n"
+                        "reload_interval: 0.05\n"
+                        "sites:\n"
+                        "- url: http://example.org\n"))
+                elif calls.count("http://example.org") == 3:
+                    stop.set()
+
+            return MagicMock(status_code=200, history=[])
+
+        mock_requests.side_effect = check
+
+        manager = self.manager()
+        timer = threading.Timer(10, stop.set)
+        timer.start()
+        manager.run(stop)
+        manager.close()
+        timer.cancel()
+
+        self.assertEqual(["http://example.org"],
+                         [site.url for site in manager.sites])
+        self.assertGreaterEqual(calls.count("http://example.org"), 3)
+        # A check already due when the config changed may still run.
+        self.assertLessEqual(calls.count("http://example.com"), 4)
+        self.assertEqual(calls[-1], "http://example.org")
+        mock_slack.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
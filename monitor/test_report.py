@@ -0,0 +1,109 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from StringIO import StringIO
+from monitor.check_result import CheckResult, TIMEOUT
+from monitor.history import DAY, MINUTE, History, connect
+from monitor.monitor_domain import MonitorDomain
+from monitor.monitor_site import MonitorSite
+from monitor.report import build_report, format_text, main, parse_window
+
+
+class TestReport(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'history.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def record(self, start, minutes):
+        """Records a check of a site and a domain every minute, with the
+        site failing one check in a hundred.
+        """
+        now = [start]
+        history = History(self.path, clock=lambda: now[0])
+        site = MonitorSite("http://example.com")
+        site.timings = {'total': 0.1}
+        domain = MonitorDomain("example.com")
+
+        for minute in range(minutes):
+            now[0] = start + minute * MINUTE
+            history.record(CheckResult(
+                site, TIMEOUT if minute % 100 == 99 else 'ok'))
+            history.record(CheckResult(domain))
+
+        history.close()
+
+    def test_parse_window(self):
+        self.assertEqual(30 * DAY, parse_window('30d'))
+        self.assertEqual(5400, parse_window('90m'))
+        self.assertEqual(45, parse_window('45'))
+        self.assertRaises(ValueError, parse_window, 'soon')
+        self.assertRaises(ValueError, parse_window, '-1h')
+
+    def test_build_report(self):
+        start = 1000 * DAY
+        self.record(start, 1000)
+        connection = connect(self.path)
+
+        rows = build_report(connection, start, start + DAY, slo=99.5)
+        connection.close()
+
+        self.assertEqual([u"site:http://example.com:200",
+                          u"domain:example.com:A"],
+                         [row['target'] for row in rows])
+        site, domain = rows
+        self.assertEqual(1000, site['checks'])
+        self.assertEqual(10, site['failures'])
+        self.assertEqual(99.0, site['availability'])
+        self.assertEqual(200.0, site['error_budget_used'])
+        self.assertAlmostEqual(0.1, site['latency_p99'], delta=0.02)
+        self.assertEqual(100.0, domain['availability'])
+        self.assertEqual(0.0, domain['error_budget_used'])
+        self.assertEqual(None, domain['latency_p50'])
+
+        text = format_text(rows, start, start + DAY, 99.5)
+
+        self.assertIn(u"SLO of 99.5%", text)
+        self.assertIn(u"99.000", text)
+        self.assertIn(u"200.0", text)
+
+    def test_main_json(self):
+        self.record(time.time() - 100 * MINUTE, 100)
+        out = StringIO()
+
+        main(['-c', os.path.join(self.directory, 'missing.yaml'),
+              '-f', self.path, '-w', '1d', '-o', '99', '-j'], out)
+        report = json.loads(out.getvalue())
+
+        self.assertEqual(99, report['slo'])
+        self.assertEqual(2, len(report['targets']))
+        self.assertEqual(100.0, report['targets'][0]['error_budget_used'])
+
+    def test_main_reads_the_config(self):
+        self.record(time.time() - 10 * MINUTE, 10)
+        config = os.path.join(self.directory, 'config.yaml')
+
+        with open(config, 'w') as config_file:
+            config_file.write("history_file: {0}\nslo: 99.99\n".format(
+                self.path))
+
+        out = StringIO()
+        main(['-c', config, '-w', '1h'], out)
+
+        self.assertIn("SLO of 99.99%", out.getvalue())
+        self.assertIn("http://example.com", out.getvalue())
+
+    def test_no_history(self):
+        self.assertRaises(SystemExit, main, [
+            '-c', os.path.join(self.directory, 'missing.yaml'),
+            '-f', self.path], StringIO())
+
+
+if __name__ == '__main__':
+    unittest.main()
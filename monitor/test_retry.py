@@ -0,0 +1,160 @@
+import threading
+import unittest
+import yaml
+
+from mock import MagicMock, patch
+from requests.exceptions import ReadTimeout
+from monitor.monitor_manager import MonitorManager
+from monitor.retry import RetryPolicy
+
+
+class TestRetry(unittest.TestCase):
+    slack_config = {
+        'slack_api_token': '',
+        'slack_channel': '',
+        'slack_emote': '',
+        'slack_shoutout': '',
+        'slack_username': ''}
+
+    yaml_config = (
+        "---\n"
+        "confirm_retries: 2\n"
+        "retry_backoff: 0.01\n"
+        "sites:\n"
+        "- url: http://example.com\n"
+        "- url: http://example.org\n")
+
+    def setUp(self):
+        self.ok = MagicMock(status_code=200, history=[])
+
+    def responses(self, *flaky):
+        """Responds to example.com with each of `flaky` in turn, then OK, and
+        to every other site with OK.
+        """
+        lock = threading.Lock()
+        flaky = list(flaky)
+        self.calls = []
+
+        def get(url, **kwargs):
+            with lock:
+                self.calls.append(url)
+                response = flaky.pop(0) if url == "http://example.com" and \
+                    flaky else self.ok
+
+            if isinstance(response, Exception):
+                raise response
+
+            return response
+
+        return get
+
+    def test_delay_doubles_with_jitter(self):
+        policy = RetryPolicy(retries=3, backoff=2, jitter=0.1,
+                             rand=lambda: 0.5)
+
+        self.assertEqual([2, 4, 8], [policy.delay(attempt)
+                                     for attempt in range(3)])
+        self.assertAlmostEqual(1.8, RetryPolicy(backoff=2,
+                                                rand=lambda: 0).delay(0))
+        self.assertAlmostEqual(2.2, RetryPolicy(backoff=2,
+                                                rand=lambda: 1).delay(0))
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    @patch('monitor.monitor_manager.get_yaml_config')
+    @patch('monitor.monitor_site.get')
+    def test_transient_failure_is_not_reported(self, mock_requests,
+                                               mock_get_yaml_config,
+                                               mock_slack_post_message):
+        mock_get_yaml_config.side_effect = [yaml.load(self.yaml_config),
+                                            self.slack_config]
+        mock_requests.side_effect = self.responses(ReadTimeout())
+
+        manager = MonitorManager()
+        manager.parse_config()
+
+        self.assertEqual(0, manager.check_sites())
+        manager.close()
+
+        self.assertEqual(2, self.calls.count("http://example.com"))
+        self.assertEqual(1, self.calls.count("http://example.org"))
+        self.assertEqual({}, manager.retrying)
+        mock_slack_post_message.assert_not_called()
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    @patch('monitor.monitor_manager.get_yaml_config')
+    @patch('monitor.monitor_site.get')
+    def test_confirmed_failure_is_reported_once(self, mock_requests,
+                                                mock_get_yaml_config,
+                                                mock_slack_post_message):
+        mock_get_yaml_config.side_effect = [yaml.load(self.yaml_config),
+                                            self.slack_config]
+        mock_requests.side_effect = self.responses(*[ReadTimeout()] * 4)
+
+        manager = MonitorManager()
+        manager.parse_config()
+
+        self.assertEqual(1, manager.check_sites())
+        manager.outbox.wait()
+
+        self.assertEqual(3, self.calls.count("http://example.com"))
+        mock_slack_post_message.assert_called_once_with(
+            u"Error at http://example.com. timeout")
+
+        # Already down, so the next failure is reported without retrying.
+        self.assertEqual(1, manager.check_sites())
+        manager.close()
+
+        self.assertEqual(4, self.calls.count("http://example.com"))
+        self.assertEqual(1, mock_slack_post_message.call_count)
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    @patch('monitor.monitor_manager.get_yaml_config')
+    @patch('monitor.monitor_site.get')
+    def test_daemon_retries_without_reporting(self, mock_requests,
+                                              mock_get_yaml_config,
+                                              mock_slack_post_message):
+        config = yaml.load(self.yaml_config)
+        config['interval'] = 0.05
+        mock_get_yaml_config.side_effect = [config, self.slack_config]
+        get = self.responses(ReadTimeout(), ReadTimeout())
+        stop = threading.Event()
+
+        def check(url, **kwargs):
+            try:
+                return get(url, **kwargs)
+            finally:
+                if self.calls.count("http://example.com") >= 4:
+                    stop.set()
+
+        mock_requests.side_effect = check
+
+        manager = MonitorManager()
+        manager.parse_config()
+        timer = threading.Timer(10, stop.set)
+        timer.start()
+        manager.run(stop)
+        manager.close()
+        timer.cancel()
+
+        self.assertGreaterEqual(self.calls.count("http://example.com"), 4)
+        self.assertEqual({}, manager.retrying)
+        mock_slack_post_message.assert_not_called()
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    @patch('monitor.monitor_manager.get_yaml_config')
+    def test_invalid_retries(self, mock_get_yaml_config, mock_slack):
+        config = yaml.load(self.yaml_config)
+        config['confirm_retries'] = -1
+        mock_get_yaml_config.side_effect = [config, self.slack_config]
+
+        manager = MonitorManager()
+        manager.parse_config()
+
+        self.assertEqual(0, manager.retry.retries)
+        mock_slack.assert_called_once_with(
+            u"ValueError: Check the confirm_retries field in your "
+            u"config.yaml, it must be a whole number!")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import threading
+import unittest
+import yaml
+
+from mock import patch
+from monitor.monitor_manager import MonitorManager
+from monitor.scheduler import Scheduler
+
+
+class FakeClock(object):
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestScheduler(unittest.TestCase):
+    slack_config = {
+        'slack_api_token': '',
+        'slack_channel': '',
+        'slack_emote': '',
+        'slack_shoutout': '',
+        'slack_username': ''}
+
+    yaml_config = (
+        "---\n"
+        "interval: 0.05\n"
+        "sites:\n"
+        "- url: http://example.com\n"
+        "  status_code: 200\n"
+        "- url: http://example.org\n"
+        "  status_code: 200\n")
+
+    def test_first_checks_spread_across_interval(self):
+        clock = FakeClock()
+        spread = iter([0.0, 0.5, 0.9])
+        scheduler = Scheduler(clock=clock, rand=lambda: next(spread))
+
+        scheduler.add('a', 60)
+        scheduler.add('b', 60)
+        scheduler.add('c', 60)
+
+        self.assertEqual(['a'], scheduler.pop_due())
+
+        clock.now += 30
+        self.assertEqual(['b'], scheduler.pop_due())
+        self.assertEqual(24.0, scheduler.time_until_next())
+
+        clock.now += 30
+        self.assertEqual(['c'], scheduler.pop_due())
+        self.assertEqual(None, scheduler.time_until_next())
+        self.assertEqual(0, len(scheduler))
+
+    def test_due_targets_come_out_in_order(self):
+        clock = FakeClock()
+        scheduler = Scheduler(clock=clock)
+
+        scheduler.push('late', clock.now + 2)
+        scheduler.push('early', clock.now + 1)
+        scheduler.push('tie', clock.now + 2)
+
+        clock.now += 5
+        self.assertEqual(['early', 'late', 'tie'], scheduler.pop_due())
+
+    def test_reschedule_is_within_jitter(self):
+        clock = FakeClock()
+
+        for rand, expected in ((0.0, 54.0), (0.5, 60.0), (1.0, 66.0)):
+            scheduler = Scheduler(jitter=0.1, clock=clock, rand=lambda: rand)
+            scheduler.reschedule('a', 60)
+            self.assertAlmostEqual(expected, scheduler.time_until_next())
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    @patch('monitor.monitor_manager.get_yaml_config')
+    @patch('monitor.monitor_site.get')
+    def test_run_checks_until_stopped(self, mock_requests,
+                                      mock_get_yaml_config,
+                                      mock_slack_post_message):
+        """The daemon keeps rechecking every site until it is told to stop.
+        """
+        mock_get_yaml_config.side_effect = [yaml.load(self.yaml_config),
+                                            self.slack_config]
+        mock_requests.return_value.status_code = 200
+        stop = threading.Event()
+
+        def check(*args, **kwargs):
+            if mock_requests.call_count >= 6:
+                stop.set()
+            return mock_requests.return_value
+
+        mock_requests.side_effect = check
+
+        manager = MonitorManager()
+        manager.parse_config()
+        manager.run(stop)
+        manager.close()
+
+        called = [call[1]['url'] for call in mock_requests.call_args_list]
+        self.assertGreaterEqual(called.count('http://example.com'), 2)
+        self.assertGreaterEqual(called.count('http://example.org'), 2)
+        mock_slack_post_message.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,232 @@
+import threading
+import unittest
+import yaml
+
+from mock import MagicMock, patch
+from requests import Response
+from requests.exceptions import HTTPError
+
+from monitor.monitor_manager import MonitorManager
+from slack.slack import Slack, SlackDigest, AlertQueue, BLOCK
+
+
+class FakeClock(object):
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestSlackDigest(unittest.TestCase):
+    slack_config = {
+        'slack_api_token': '',
+        'slack_channel': '',
+        'slack_emote': '',
+        'slack_shoutout': '',
+        'slack_username': ''}
+
+    @patch('slack.slack.Slack.post_message')
+    def test_disabled_posts_straight_away(self, mock_slack_post_message):
+        digest = SlackDigest(Slack(self.slack_config))
+
+        digest.post_message("Error at http://example.com.")
+
+        mock_slack_post_message.assert_called_once_with(
+            "Error at http://example.com.")
+
+    @patch('slack.slack.Slack.post_message')
+    def test_flush_posts_one_digest(self, mock_slack_post_message):
+        digest = SlackDigest(Slack(self.slack_config), enabled=True)
+
+        digest.post_message("Error at http://example.com.")
+        digest.post_message("Error at http://example.org.")
+        mock_slack_post_message.assert_not_called()
+
+        digest.flush()
+        mock_slack_post_message.assert_called_once_with(
+            u"2 issues detected:\n"
+            u"\u2022 Error at http://example.com.\n"
+            u"\u2022 Error at http://example.org.")
+
+        # Nothing is left to post.
+        digest.flush()
+        self.assertEqual(1, mock_slack_post_message.call_count)
+
+    @patch('slack.slack.Slack.post_message')
+    def test_single_message_is_posted_as_is(self, mock_slack_post_message):
+        digest = SlackDigest(Slack(self.slack_config), enabled=True)
+
+        digest.post_message("Error at http://example.com.")
+        digest.flush()
+
+        mock_slack_post_message.assert_called_once_with(
+            "Error at http://example.com.")
+
+    def test_long_digest_is_chunked(self):
+        slack = MagicMock()
+        digest = SlackDigest(slack, enabled=True, max_length=100)
+        messages = ["Error at http://example{0}.com.".format(i)
+                    for i in range(10)]
+
+        for message in messages:
+            digest.post_message(message)
+        digest.flush()
+
+        texts = [call[0][0] for call in slack.post_message.call_args_list]
+        self.assertEqual(4, len(texts))
+        self.assertTrue(texts[0].startswith(
+            u"10 issues detected (part 1 of 4):\n"))
+        self.assertEqual(messages, [line[2:] for text in texts
+                                    for line in text.split(u"\n")[1:]])
+
+        for text in texts:
+            body = text.split(u"\n", 1)[1]
+            self.assertLessEqual(len(body), 100)
+
+    def test_flush_due_waits_for_window(self):
+        slack = MagicMock()
+        clock = FakeClock()
+        digest = SlackDigest(slack, enabled=True, window=30, clock=clock)
+
+        digest.flush_due()
+        digest.post_message("Error at http://example.com.")
+        clock.now += 29
+        digest.flush_due()
+        slack.post_message.assert_not_called()
+
+        clock.now += 1
+        digest.flush_due()
+        slack.post_message.assert_called_once_with(
+            "Error at http://example.com.")
+
+    @patch('monitor.monitor_manager.Slack.post_message')
+    @patch('monitor.monitor_manager.get_yaml_config')
+    @patch('monitor.monitor_site.get')
+    def test_sweep_posts_one_digest(self, mock_requests, mock_get_yaml_config,
+                                    mock_slack_post_message):
+        slack_config = dict(self.slack_config, slack_digest=True)
+        mock_get_yaml_config.side_effect = [yaml.load(
+            "---\n"
+            "sites:\n"
+            "- url: http://example.com\n"
+            "- url: http://example.org\n"), slack_config]
+        mock_requests.return_value.status_code = 500
+
+        manager = MonitorManager()
+        manager.parse_config()
+
+        self.assertEqual(2, manager.check_sites())
+        manager.outbox.wait()
+        mock_slack_post_message.assert_called_once()
+        self.assertTrue(mock_slack_post_message.call_args[0][0].startswith(
+            u"2 issues detected:"))
+
+
+
+def http_error(status_code, retry_after=None):
+    response = Response()
+    response.status_code = status_code
+
+    if retry_after is not None:
+        response.headers['Retry-After'] = retry_after
+
+    return HTTPError(response=response)
+
+
+class TestAlertQueue(unittest.TestCase):
+    def test_messages_are_sent_in_background(self):
+        slack = MagicMock()
+        alerts = AlertQueue(slack)
+
+        alerts.post_message("one")
+        alerts.post_message("two")
+        alerts.wait()
+
+        self.assertEqual(["one", "two"], [
+            call[0][0] for call in slack.post_message.call_args_list])
+        alerts.close()
+
+    def test_post_does_not_wait_for_slack(self):
+        release = threading.Event()
+        slack = MagicMock()
+        slack.post_message.side_effect = lambda text: release.wait(5)
+        alerts = AlertQueue(slack)
+
+        alerts.post_message("one")
+        alerts.post_message("two")
+        self.assertFalse(release.is_set())
+
+        release.set()
+        alerts.close()
+        self.assertEqual(2, slack.post_message.call_count)
+
+    def test_rate_limit_and_server_errors_are_retried(self):
+        slack = MagicMock()
+        slack.post_message.side_effect = [http_error(429, '7'),
+                                          http_error(503), None]
+        sleep = MagicMock()
+        alerts = AlertQueue(slack, backoff=1.0, sleep=sleep)
+
+        alerts.post_message("one")
+        alerts.close()
+
+        self.assertEqual(3, slack.post_message.call_count)
+        self.assertEqual(7.0, sleep.call_args_list[0][0][0])
+        self.assertTrue(1.0 <= sleep.call_args_list[1][0][0] <= 2.0)
+
+    def test_client_errors_and_exhausted_retries_give_up(self):
+        slack = MagicMock()
+        slack.post_message.side_effect = http_error(400)
+        alerts = AlertQueue(slack, sleep=MagicMock())
+
+        alerts.post_message("bad")
+        alerts.wait()
+        self.assertEqual(1, slack.post_message.call_count)
+
+        slack.post_message.reset_mock()
+        slack.post_message.side_effect = http_error(500)
+        alerts.retries = 2
+
+        alerts.post_message("down")
+        alerts.close()
+        self.assertEqual(3, slack.post_message.call_count)
+
+    def test_full_queue_drops_or_blocks(self):
+        sending = threading.Event()
+        release = threading.Event()
+        slack = MagicMock()
+
+        def post_message(text):
+            sending.set()
+            release.wait(5)
+
+        slack.post_message.side_effect = post_message
+
+        alerts = AlertQueue(slack, max_size=1)
+        alerts.post_message("sending")
+        self.assertTrue(sending.wait(5))
+        alerts.post_message("queued")
+        alerts.post_message("dropped")
+        self.assertEqual(1, alerts.dropped)
+        release.set()
+        alerts.close()
+
+        release.clear()
+        alerts = AlertQueue(slack, max_size=1, when_full=BLOCK)
+        alerts.post_message("sending")
+        alerts.post_message("queued")
+        blocked = threading.Thread(target=alerts.post_message,
+                                   args=("blocked",))
+        blocked.start()
+        blocked.join(0.1)
+        self.assertTrue(blocked.is_alive())
+
+        release.set()
+        blocked.join(5)
+        alerts.close()
+        self.assertEqual(0, alerts.dropped)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,11 @@
+#!/usr/bin/env python
+"""Prints the availability, error budget and latency of each site and domain
+over a window, from the history kept by the monitor.
+"""
+import sys
+
+from monitor.report import main
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
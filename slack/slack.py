@@ -3,10 +3,31 @@
 
 Sends a message to Slack using the chat.postMessage API call.
 """
+import logging
+import random
+import threading
+import time
 
+from Queue import Queue, Full
+from requests.exceptions import ConnectionError, HTTPError, Timeout
 from slacker import Slacker
 
 
+# Slack truncates messages at 4000 characters, so digests are split into
+#   chunks comfortably below that.
+DIGEST_MAX_LENGTH = 3500
+DEFAULT_DIGEST_WINDOW = 60
+
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+
+# What to do with a message when the alert queue is full.
+DROP = 'drop'
+BLOCK = 'block'
+
+
 class Slack(object):
     def __init__(self, config):
         self.slack_api_token = config['slack_api_token']
@@ -28,6 +49,190 @@ class Slack(object):
                                      icon_emoji=self.slack_emote)
 
 
+class AlertQueue(object):
+    """Posts messages to Slack from a background thread.
+
+    Messages wait in a bounded queue so a slow Slack API never holds up the
+    checks. Rate limiting (429) and server errors (5xx) are retried with
+    exponential backoff. When the queue is full a message is either dropped
+    (and logged) or the caller blocks until there is room, depending on
+    `when_full`.
+    """
+    def __init__(self, slack, max_size=DEFAULT_QUEUE_SIZE, when_full=DROP,
+                 retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+                 sleep=time.sleep):
+        self.slack = slack
+        self.when_full = when_full
+        self.retries = retries
+        self.backoff = backoff
+        self.sleep = sleep
+
+        self.queue = Queue(max_size)
+        self.dropped = 0
+        self.logger = logging.getLogger(__name__)
+
+        self._stop = object()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def post_message(self, text):
+        self._start()
+
+        try:
+            self.queue.put(text, block=self.when_full == BLOCK)
+        except Full:
+            self.dropped += 1
+            self.logger.error(u"Alert queue full, dropped: {text}".format(
+                text=text))
+
+    def wait(self):
+        """Blocks until every queued message has been sent or given up on."""
+        if self._thread is not None:
+            self.queue.join()
+
+    def close(self, timeout=None):
+        """Sends the remaining messages, then stops the background thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+
+        if thread is not None:
+            self.queue.put(self._stop)
+            thread.join(timeout)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._drain,
+                                                name='slack-alerts')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _drain(self):
+        while True:
+            text = self.queue.get()
+
+            try:
+                if text is self._stop:
+                    return
+
+                self._send(text)
+            finally:
+                self.queue.task_done()
+
+    def _send(self, text):
+        for attempt in range(self.retries + 1):
+            try:
+                self.slack.post_message(text)
+                return
+            except (HTTPError, ConnectionError, Timeout) as e:
+                response = getattr(e, 'response', None)
+                status_code = getattr(response, 'status_code', None)
+
+                if (status_code is not None and status_code != 429 and
+                        status_code < 500) or attempt == self.retries:
+                    self.logger.error(
+                        u"Failed to post to Slack: {error}: {text}".format(
+                            error=unicode(e), text=text))
+                    return
+
+                self.sleep(self._delay(attempt, response))
+            except Exception as e:
+                self.logger.error(
+                    u"Failed to post to Slack: {error}: {text}".format(
+                        error=unicode(e), text=text))
+                return
+
+    def _delay(self, attempt, response):
+        """Seconds to wait before the next attempt, honouring Slack's
+        Retry-After header when it is rate limiting us.
+        """
+        try:
+            return float(response.headers['Retry-After'])
+        except (AttributeError, KeyError, TypeError, ValueError):
+            delay = min(MAX_BACKOFF, self.backoff * 2 ** attempt)
+            return delay * (0.5 + random.random() / 2)
+
+
+class SlackDigest(object):
+    """Gathers messages and posts them to Slack together as a digest.
+
+    Messages are held until `flush` is called (at the end of a sweep) or, in
+    daemon mode, until `window` seconds have passed since the first one. A
+    digest too long for one Slack message is split into several. When not
+    enabled every message is posted straight away.
+    """
+    def __init__(self, slack, enabled=False, window=DEFAULT_DIGEST_WINDOW,
+                 max_length=DIGEST_MAX_LENGTH, clock=time.time):
+        self.slack = slack
+        self.enabled = enabled
+        self.window = window
+        self.max_length = max_length
+        self.clock = clock
+
+        self.messages = []
+        self.first_message_at = None
+        self._lock = threading.Lock()
+
+    def post_message(self, text):
+        if not self.enabled:
+            self.slack.post_message(text)
+            return
+
+        with self._lock:
+            if not self.messages:
+                self.first_message_at = self.clock()
+
+            self.messages.append(text)
+
+    def flush_due(self):
+        """Flushes the digest if its time window has passed."""
+        if (self.first_message_at is not None and
+                self.clock() - self.first_message_at >= self.window):
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            messages, self.messages = self.messages, []
+            self.first_message_at = None
+
+        for chunk in self.chunk(messages):
+            self.slack.post_message(chunk)
+
+    def chunk(self, messages):
+        """Joins the messages into as few texts as fit within `max_length`.
+        """
+        if len(messages) <= 1:
+            return messages
+
+        chunks = [[]]
+        length = 0
+
+        for message in messages:
+            line = u"\u2022 {message}".format(message=message)
+
+            if chunks[-1] and length + len(line) + 1 > self.max_length:
+                chunks.append([])
+                length = 0
+
+            chunks[-1].append(line)
+            length += len(line) + 1
+
+        texts = []
+
+        for part, lines in enumerate(chunks, 1):
+            if len(chunks) == 1:
+                header = u"{count} issues detected:".format(
+                    count=len(messages))
+            else:
+                header = u"{count} issues detected (part {part} of " \
+                         u"{parts}):".format(count=len(messages), part=part,
+                                             parts=len(chunks))
+
+            texts.append(u"\n".join([header] + lines))
+
+        return texts
+
+
 def main():
     slack = Slack()
     slack.post_message('This is a test system state message, '